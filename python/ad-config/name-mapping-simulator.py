@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Offline evaluator for ONTAP name-mapping rules
+
+Loads every name mapping of an SVM with one query (or from a saved rules file),
+compiles each direction into an ordered chain of precompiled regular expressions and
+resolves a batch of principals (e.g., an AD export) win->unix and unix->win the way
+ONTAP does: rules are tried in index order, the first rule whose pattern matches the
+whole name wins and its replacement (with \\1-style back references) is the result.
+
+Also reports rules that can never be reached because an earlier rule of the same
+direction already matches everything they match.
+"""
+
+import argparse
+import contextlib
+import csv
+import getpass
+import ipaddress
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from netapp_ontap import config, HostConnection, NetAppRestError
+from netapp_ontap.resources import NameMapping
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAPPING_FIELDS = "direction,index,pattern,replacement,client_match"
+DIRECTIONS = ("win_unix", "unix_win")
+# Patterns that match any name, shadowing every later rule of the direction
+CATCH_ALL = re.compile(r"^\(?\.[*+]\)?$")
+REGEX_SPECIALS = re.compile(r"(?<!\\)[.^$*+?()\[\]{}|]")
+
+
+def literal_text(pattern):
+    """Return the name a pattern matches if it contains no regex syntax, else None"""
+    if REGEX_SPECIALS.search(pattern):
+        return None
+    # \. or \\ stand for the character itself; \d, \w, \s, \1 ... are regex syntax
+    if any(escaped.isalnum() for escaped in re.findall(r"\\(.)", pattern)):
+        return None
+    return re.sub(r"\\(.)", r"\1", pattern)
+
+
+def client_matches(client_match, client):
+    """Whether a rule restricted to a hostname or subnet applies to the client"""
+    if not client_match:
+        return True
+    if client is None:
+        return False
+    try:
+        return ipaddress.ip_address(client) in ipaddress.ip_network(client_match, strict=False)
+    except ValueError:
+        return client_match.lower() == client.lower()
+
+
+class MappingChain:
+    """
+    The rules of one direction, compiled once and tried in index order
+
+    Names are matched case-insensitively against the whole pattern, as ONTAP does.
+    Rules restricted with client_match only take part for a matching --client.
+    """
+
+    def __init__(self, direction, rules, client=None):
+        self.direction = direction
+        self.rules = sorted((rule for rule in rules if rule["direction"] == direction
+                             and client_matches(rule.get("client_match"), client)),
+                            key=lambda rule: rule["index"])
+        self.compiled = []
+        for rule in self.rules:
+            try:
+                compiled = re.compile(rule["pattern"], re.IGNORECASE)
+            except re.error as err:
+                logger.warning(f"{direction} rule {rule['index']} has an invalid pattern "
+                               f"'{rule['pattern']}': {err}")
+                continue
+            try:
+                # Parses the replacement even though nothing matches, so \2 on a one-group pattern fails here
+                compiled.sub(rule["replacement"], "")
+            except re.error as err:
+                logger.warning(f"{direction} rule {rule['index']} has an invalid replacement "
+                               f"'{rule['replacement']}': {err}")
+                continue
+            fullmatch = compiled.fullmatch
+            # Python's expand() reads \1 like ONTAP; a literal backslash stays a pair
+            self.compiled.append((rule["index"], rule["pattern"], fullmatch, rule["replacement"]))
+
+    def resolve(self, name):
+        """Return (rule index, mapped name), or (None, None) when no rule matches"""
+        for index, _pattern, fullmatch, replacement in self.compiled:
+            match = fullmatch(name)
+            if match:
+                return index, match.expand(replacement)
+        return None, None
+
+    def shadowed(self):
+        """
+        Return [(rule index, shadowing rule index, reason)] for unreachable rules
+
+        A rule is unreachable when an earlier rule is a catch-all, has the same pattern,
+        or (for rules that match one literal name) already matches that name.
+        """
+        result = []
+        seen = {}
+        catch_all = None
+        for index, pattern, _fullmatch, _replacement in self.compiled:
+            if catch_all is not None:
+                result.append((index, catch_all, "after a catch-all rule"))
+            elif pattern.lower() in seen:
+                result.append((index, seen[pattern.lower()], "same pattern as an earlier rule"))
+            else:
+                literal = literal_text(pattern)
+                earlier = None if literal is None else next(
+                    (other for other, _, other_match, _ in self.compiled
+                     if other < index and other_match(literal)), None)
+                if earlier is not None:
+                    result.append((index, earlier, f"'{literal}' is matched by an earlier rule"))
+            seen.setdefault(pattern.lower(), index)
+            if catch_all is None and CATCH_ALL.match(pattern):
+                catch_all = index
+        return result
+
+
+def load_rules(svm_name):
+    """Read all name mappings of an SVM with one collection query"""
+    return [record.resource_data for record in NameMapping.fast_get_collection(
+        **{"svm.name": svm_name}, fields=MAPPING_FIELDS)]
+
+
+def load_principals(path, column=None):
+    """Read principals from a text file (one per line) or a column of a CSV export"""
+    with open(path, encoding="utf-8-sig", newline="") as handle:
+        if column:
+            return [row[column].strip() for row in csv.DictReader(handle) if row.get(column, "").strip()]
+        return [line.strip() for line in handle if line.strip()]
+
+
+def simulate(chains, principals, domain=None, output=None):
+    """
+    Resolve every principal through each chain
+
+    Bare Windows names get the domain prefix before win_unix evaluation. Returns a
+    summary with per-rule hit counts and the throughput in principals per second.
+    """
+    with contextlib.ExitStack() as stack:
+        writer = None
+        if output:
+            writer = csv.writer(stack.enter_context(open(output, "w", encoding="utf-8", newline="")))
+            writer.writerow(["direction", "principal", "rule_index", "result"])
+        return {chain.direction: _simulate_chain(chain, principals, domain, writer) for chain in chains}
+
+
+def _simulate_chain(chain, principals, domain, writer):
+    hits = {}
+    unmatched = 0
+    resolve = chain.resolve
+    started = time.perf_counter()
+    for principal in principals:
+        name = principal
+        if chain.direction == "win_unix" and domain and "\\" not in name:
+            name = f"{domain}\\{name}"
+        index, result = resolve(name)
+        if index is None:
+            unmatched += 1
+        else:
+            hits[index] = hits.get(index, 0) + 1
+        if writer:
+            writer.writerow([chain.direction, name, "" if index is None else index, result or ""])
+    elapsed = time.perf_counter() - started
+    return {"rules": len(chain.compiled), "principals": len(principals), "unmatched": unmatched,
+            "hits": hits, "never_matched": [rule[0] for rule in chain.compiled if rule[0] not in hits],
+            "shadowed": chain.shadowed(), "seconds": round(elapsed, 4),
+            "principals_per_second": round(len(principals) / elapsed) if elapsed else 0}
+
+
+def report(summary):
+    for direction, result in summary.items():
+        logger.info(f"{direction}: {result['rules']} rule(s), {result['principals']} principal(s) resolved in "
+                    f"{result['seconds']:.3f}s ({result['principals_per_second']:,} principals/s), "
+                    f"{result['unmatched']} matched no rule")
+        for index, count in sorted(result["hits"].items()):
+            logger.info(f"  rule {index}: {count} principal(s)")
+        for index, earlier, reason in result["shadowed"]:
+            logger.warning(f"  rule {index} is unreachable, shadowed by rule {earlier} ({reason})")
+        never = [index for index in result["never_matched"]
+                 if index not in {shadowed for shadowed, _, _ in result["shadowed"]}]
+        if never:
+            logger.info(f"  rule(s) not used by any principal in this batch: {', '.join(map(str, never))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate ONTAP name-mapping rules offline')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--host', help='ONTAP management hostname or IP (rules are read from the SVM)')
+    source.add_argument('--rules', help='Rules file saved with --save-rules (no connection needed)')
+    parser.add_argument('--user', default='fsxadmin', help='ONTAP username')
+    parser.add_argument('--svm', help='SVM whose name mappings are evaluated (required with --host)')
+    parser.add_argument('--save-rules', help='Write the rules read from ONTAP to this JSON file')
+    parser.add_argument('--principals', help='Principals to resolve: one name per line, or a CSV with --column')
+    parser.add_argument('--column', help='CSV column holding the principal (e.g., sAMAccountName)')
+    parser.add_argument('--domain', help='Domain prefixed to bare Windows names for win_unix (e.g., AD)')
+    parser.add_argument('--direction', default='both', choices=DIRECTIONS + ('both',), help='Directions to evaluate')
+    parser.add_argument('--client', help='Client IP or hostname, to include rules restricted with client_match')
+    parser.add_argument('--output', help='Write every resolution to this CSV file')
+    parser.add_argument('--format', default='table', choices=['table', 'json'], help='Summary format')
+    args = parser.parse_args()
+
+    if args.host:
+        if not args.svm:
+            parser.error('--svm is required with --host')
+        password = os.environ.get('ONTAP_PASSWORD') or getpass.getpass(f"Password for {args.user}: ")
+        config.CONNECTION = throttle_connection(HostConnection(
+            args.host, username=args.user, password=password, verify=False))
+        try:
+            rules = load_rules(args.svm)
+        except NetAppRestError as err:
+            logger.error(f"Error reading name mappings: {err}")
+            sys.exit(1)
+        logger.info(f"Loaded {len(rules)} name mapping(s) from SVM '{args.svm}'")
+        if args.save_rules:
+            with open(args.save_rules, "w", encoding="utf-8") as handle:
+                json.dump(rules, handle, indent=2)
+    else:
+        with open(args.rules, encoding="utf-8") as handle:
+            rules = json.load(handle)
+
+    directions = DIRECTIONS if args.direction == 'both' else (args.direction,)
+    chains = [MappingChain(direction, rules, client=args.client) for direction in directions]
+    principals = load_principals(args.principals, args.column) if args.principals else []
+    summary = simulate(chains, principals, domain=args.domain, output=args.output)
+
+    if args.format == 'json':
+        print(json.dumps(summary, indent=2))
+    else:
+        report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,58 @@
 #!/usr/bin/env python3
 
 from netapp_ontap import config, HostConnection, NetAppRestError
-from netapp_ontap.resources import NfsService, LdapService, NameMapping, CifsShare, UnixUser, UnixGroup, CifsShareAcl, Svm
+from netapp_ontap.resources import NfsService, LdapService, NameMapping, CifsShare, UnixUser, UnixGroup, CifsShareAcl, Svm, Volume
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import fnmatch
+import json
 import logging
+import os
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_checkpoint import CheckpointJournal  # pylint: disable=wrong-import-position
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# On/off share properties accepted in a share's "properties" list
+SHARE_FLAGS = ("access_based_enumeration", "allow_unencrypted_access", "browsable", "change_notify",
+               "continuously_available", "encryption", "home_directory", "namespace_caching",
+               "no_strict_security", "oplocks", "show_previous_versions", "show_snapshot")
+DEFAULT_SHARE_PROPERTIES = ["browsable", "show_snapshot"]
+
+
+def share_properties(properties):
+    """
+    Turn a share's properties into CifsShare attributes
+
+    A list names the flags to switch on (e.g. ["browsable", "oplocks"]); a dict is
+    passed through as attributes (e.g. {"comment": "...", "offline_files": "manual"}).
+    """
+    if isinstance(properties, dict):
+        return dict(properties)
+    unknown = [flag for flag in properties if flag not in SHARE_FLAGS]
+    if unknown:
+        raise ValueError(f"Unknown share properties: {', '.join(unknown)}")
+    return {flag: True for flag in properties}
+
+
+def load_share_manifest(path):
+    """
+    Load a share manifest
+
+    {"acl_templates": {"hpc": [{"user_or_group": "AD\\hpc", "permission": "full_control"}]},
+     "defaults": {"properties": ["browsable"], "acl_template": "hpc"},
+     "shares": [{"name": "proj1", "path": "/proj1", "acl_template": "hpc"}]}
+    """
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
 class OntapHPCConfig:
     def __init__(self, hostname, username, password, vserver_name, domain, base_dn, bind_dn,
                  volume_share_name, volume_path,
@@ -27,10 +71,10 @@ class OntapHPCConfig:
         self.unix_group_name = unix_group_name
         self.unix_group_id = unix_group_id
         
-        # Configure connection
-        config.CONNECTION = HostConnection(
+        # Configure connection, throttled by the shared per-host limiter and circuit breaker
+        config.CONNECTION = throttle_connection(HostConnection(
             hostname, username=username, password=password, verify=False
-        )
+        ))
     
     def modify_nfs_service(self):
         """Modify NFS service settings"""
@@ -41,10 +85,11 @@ class OntapHPCConfig:
             # Modify NFS settings
             nfs_service.v4_id_domain = f"{self.domain}"
             nfs_service.protocol.v4_enabled = True  
-            nfs_service.protocol.v3_enabled = True  2
+            nfs_service.protocol.v3_enabled = True
             
             nfs_service.patch()
             logger.info("✓ NFS service modified successfully")
+            return {"svm": self.vserver_name, "v4_id_domain": self.domain}
             
         except NetAppRestError as err:
             logger.error(f"Error modifying NFS service: {err}")
@@ -89,6 +134,7 @@ class OntapHPCConfig:
             
             # Wait for LDAP service to be ready
             time.sleep(5)
+            return {"svm": self.vserver_name, "base_dn": self.base_dn}
             
         except NetAppRestError as err:
             logger.error(f"Error configuring LDAP service: {err}")
@@ -115,6 +161,7 @@ class OntapHPCConfig:
             
             svm.patch()
             logger.info("✓ Name service switch modified successfully")
+            return {"svm_uuid": svm.uuid}
             
         except NetAppRestError as err:
             logger.error(f"Error modifying name service switch: {err}")
@@ -168,44 +215,114 @@ class OntapHPCConfig:
                 logger.info("✓ UNIX to Windows name mapping created")
             else:
                 logger.info("UNIX to Windows mapping already exists")
+            return {"patterns": [win_unix_pattern, unix_win_pattern]}
             
         except NetAppRestError as err:
             logger.error(f"Error creating name mappings: {err}")
     
     def create_cifs_share(self):
         """Create CIFS share"""
+        logger.info("Creating CIFS share...")
+        summary = self.provision_cifs_shares([{"name": self.volume_share_name, "path": self.volume_path}])
+        if summary is None or summary["failed"]:
+            return None
+        return {"share": self.volume_share_name, "path": self.volume_path}
+
+    def acl_templates(self):
+        """Built-in ACL templates; manifests can add or override templates by name"""
+        return {
+            # The permissions configure_share_permissions applies, without Everyone
+            "group_full_control": [
+                {"user_or_group": self.unix_group_name, "permission": "full_control"},
+                {"user_or_group": "BUILTIN\\Administrators", "permission": "full_control"},
+            ],
+        }
+
+    def shares_from_volumes(self, name_glob="*", junction_prefix=None):
+        """
+        Derive one share per junctioned volume from a single volume query
+
+        The share is named after the volume and points at its junction path.
+        """
+        query = {"svm.name": self.vserver_name, "is_svm_root": False, "nas.path": f"{junction_prefix or ''}*"}
+        shares = []
+        for record in Volume.fast_get_collection(**query, fields="name,nas.path"):
+            volume = record.resource_data
+            path = volume.get("nas", {}).get("path")
+            if path and path != "/" and fnmatch.fnmatchcase(volume["name"], name_glob):
+                shares.append({"name": volume["name"], "path": path})
+        logger.info(f"Derived {len(shares)} share(s) from the junctioned volumes")
+        return shares
+
+    def provision_cifs_shares(self, shares, acl_templates=None, defaults=None, workers=8, dry_run=False):
+        """
+        Create the missing shares with their properties and ACLs
+
+        Existing shares are read with one collection query. Each missing share is created
+        with a single POST carrying its properties and the ACL entries of its template, so
+        no follow-up ACL requests or re-reads are needed. Shares that exist are left as
+        they are.
+
+        Args:
+            shares: Share dicts with name, path and optionally properties and acl_template
+            acl_templates: {template name: [{"user_or_group", "permission"[, "type"]}]}
+            defaults: properties and acl_template used by shares that do not set them
+            workers: Concurrent share creations
+            dry_run: Only report the shares that would be created
+        """
+        templates = dict(self.acl_templates(), **(acl_templates or {}))
+        defaults = defaults or {}
         try:
-            logger.info("Creating CIFS share...")
-            
-            # Check if share exists
-            existing_shares = list(CifsShare.get_collection(
-                **{"svm.name": self.vserver_name, "name": self.volume_share_name}
-            ))
-            
-            if not existing_shares:
-                # Create share
-                share = CifsShare(
-                    svm={"name": self.vserver_name},
-                    name=self.volume_share_name,
-                    path=self.volume_path,
-                    properties=["browsable", "showsnapshot"]
-                )
-                share.post()
-                logger.info(f"✓ CIFS share '{self.volume_share_name}' created successfully")
-            else:
-                logger.info(f"CIFS share '{self.volume_share_name}' already exists")
-            
-            # Show share details
-            shares = list(CifsShare.get_collection(
-                **{"svm.name": self.vserver_name, "name": self.volume_share_name}
-            ))
-            
-            for share in shares:
-                share.get()
-                logger.info(f"Share details: Name={share.name}, Path={share.path}")
-                
+            existing = {record.resource_data["name"].lower() for record in CifsShare.fast_get_collection(
+                **{"svm.name": self.vserver_name}, fields="name")}
         except NetAppRestError as err:
-            logger.error(f"Error creating CIFS share: {err}")
+            logger.error(f"Error reading CIFS shares: {err}")
+            return None
+
+        # Build every body first so a bad property or template fails before any request
+        bodies = []
+        try:
+            for share in shares:
+                if share["name"].lower() in existing:
+                    logger.info(f"CIFS share '{share['name']}' already exists")
+                    continue
+                template = share.get("acl_template", defaults.get("acl_template"))
+                if template is not None and template not in templates:
+                    raise ValueError(f"Unknown ACL template '{template}' for share '{share['name']}'")
+                body = share_properties(share.get("properties", defaults.get("properties", DEFAULT_SHARE_PROPERTIES)))
+                if template is not None:
+                    body["acls"] = [dict({"type": "windows"}, **entry) for entry in templates[template]]
+                bodies.append((share["name"], share["path"], body))
+        except (KeyError, ValueError) as err:
+            logger.error(f"Invalid share definition: {err}")
+            return None
+
+        summary = {"created": 0, "failed": 0, "existing": len(shares) - len(bodies)}
+        if dry_run:
+            for name, path, body in bodies:
+                logger.info(f"[dry-run] Create CIFS share '{name}' -> {path} "
+                            f"({len(body.get('acls', []))} ACL entries)")
+            return summary
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(lambda name=name, path=path, body=body: CifsShare(
+                svm={"name": self.vserver_name}, name=name, path=path, **body).post()): name
+                for name, path, body in bodies}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    summary["created"] += 1
+                    logger.info(f"✓ CIFS share '{futures[future]}' created successfully")
+                except NetAppRestError as err:
+                    logger.error(f"Error creating CIFS share '{futures[future]}': {err}")
+                    summary["failed"] += 1
+
+        elapsed = time.monotonic() - started
+        logger.info(f"CIFS shares: {summary['created']} created, {summary['existing']} existing, "
+                    f"{summary['failed']} failed in {elapsed:.2f}s "
+                    f"({summary['created'] / elapsed if elapsed else 0:.1f} shares/s)")
+        return summary
     
     def create_unix_user(self):
         """Create UNIX user"""
@@ -226,6 +343,7 @@ class OntapHPCConfig:
                 )
                 user.post()
                 logger.info(f"✓ UNIX user '{self.unix_user_name}' created successfully")
+            return {"name": self.unix_user_name, "id": self.unix_user_id}
             
         except NetAppRestError as err:
             logger.error(f"Error creating UNIX user: {err}")
@@ -248,6 +366,7 @@ class OntapHPCConfig:
                 )
                 group.post()
                 logger.info(f"✓ UNIX group '{self.unix_group_name}' created successfully")
+            return {"name": self.unix_group_name, "id": self.unix_group_id}
             
         except NetAppRestError as err:
             logger.error(f"Error creating UNIX group: {err}")
@@ -282,6 +401,7 @@ class OntapHPCConfig:
                 logger.info("✓ AD group mapping created successfully")
             else:
                 logger.info("AD group mapping already exists")
+            return {"pattern": pattern}
             
         except NetAppRestError as err:
             logger.error(f"Error creating AD group mapping: {err}")
@@ -340,23 +460,64 @@ class OntapHPCConfig:
         except NetAppRestError as err:
             logger.error(f"Error configuring share permissions: {err}")
     
-    def run_all_configurations(self):
-        """Execute all configurations in sequence"""
+    def run_all_configurations(self, journal=None):
+        """Execute all configurations in sequence
+
+        Each step returns the identifiers it configured, or None on failure. Completed
+        steps are recorded in the checkpoint journal, so a resumed run skips them
+        without probing ONTAP again.
+        """
         logger.info(f"Starting ONTAP configuration for vserver: {self.vserver_name}")
+        journal = journal or CheckpointJournal(None)
         
         # Execute configurations in order
-        self.modify_nfs_service()
-        self.create_ldap_configuration()
-        self.modify_ns_switch()  
-        self.create_name_mappings()
-        self.create_unix_user()
-        self.create_unix_group()
-        self.create_ad_group_mapping()
-        self.create_cifs_share()
+        steps = [
+            ("nfs_service", self.modify_nfs_service),
+            ("ldap", self.create_ldap_configuration),
+            ("ns_switch", self.modify_ns_switch),
+            ("name_mappings", self.create_name_mappings),
+            ("unix_user", self.create_unix_user),
+            ("unix_group", self.create_unix_group),
+            ("ad_group_mapping", self.create_ad_group_mapping),
+            ("cifs_share", self.create_cifs_share),
+        ]
+        failed = []
+        for name, step in steps:
+            key = f"{self.vserver_name}:{name}"
+            if journal.done(key):
+                logger.info(f"Skipping {name}, completed in a previous run: {journal.get(key)}")
+                continue
+            ids = step()
+            if ids is None:
+                failed.append(name)
+            else:
+                journal.record(key, **ids)
         
+        if failed:
+            logger.error(f"Configuration incomplete, failed steps: {', '.join(failed)}. "
+                         "Re-run to resume from the checkpoint.")
+            return False
+        journal.complete()
         logger.info("✓ All configurations completed!")
+        return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Configure an SVM for multiprotocol (NFS/CIFS) access")
+    parser.add_argument("--checkpoint", default="ontap-ad-config.checkpoint",
+                        help="Checkpoint journal used to resume an interrupted run")
+    parser.add_argument("--fresh", action="store_true", help="Ignore any existing checkpoint and start over")
+    shares_group = parser.add_mutually_exclusive_group()
+    shares_group.add_argument("--shares-manifest", metavar="FILE",
+                              help="Only provision the CIFS shares, properties and ACLs listed in a JSON manifest")
+    shares_group.add_argument("--shares-from-volumes", metavar="GLOB",
+                              help="Only provision one CIFS share per junctioned volume whose name matches")
+    parser.add_argument("--junction-prefix", help="With --shares-from-volumes, only volumes under this path")
+    parser.add_argument("--acl-template", default="group_full_control",
+                        help="ACL template for shares derived from volumes (default: group_full_control)")
+    parser.add_argument("--share-workers", type=int, default=8, help="Concurrent share creations")
+    parser.add_argument("--dry-run", action="store_true", help="Only show the shares that would be created")
+    args = parser.parse_args()
+
     # Configuration - Update these values for your environment
     HOSTNAME = "---ManagementEndpoint---"
     USERNAME = "fsxadmin"
@@ -396,8 +557,26 @@ def main():
         unix_group_id=UNIX_GROUP_ID
     )
     
-    # Run all configurations
-    configurator.run_all_configurations()
+    # Share provisioning stage on its own
+    if args.shares_manifest or args.shares_from_volumes:
+        if args.shares_manifest:
+            manifest = load_share_manifest(args.shares_manifest)
+        else:
+            manifest = {"shares": configurator.shares_from_volumes(args.shares_from_volumes, args.junction_prefix),
+                        "defaults": {"acl_template": args.acl_template}}
+        summary = configurator.provision_cifs_shares(
+            manifest["shares"],
+            acl_templates=manifest.get("acl_templates"),
+            defaults=manifest.get("defaults"),
+            workers=args.share_workers,
+            dry_run=args.dry_run
+        )
+        sys.exit(1 if summary is None or summary["failed"] else 0)
+    
+    # Run all configurations, resuming from the checkpoint if a previous run was interrupted
+    journal = CheckpointJournal(args.checkpoint, fresh=args.fresh)
+    if not configurator.run_all_configurations(journal):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
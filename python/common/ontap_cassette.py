@@ -0,0 +1,295 @@
+""" Record and replay ONTAP REST traffic for offline regression benchmarks """
+from collections import Counter, deque
+import argparse
+import atexit
+import datetime
+import gzip
+import hashlib
+from http import HTTPStatus
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth keeping (request headers, and with them credentials, are never stored); everything else is dropped to keep cassettes small
+KEPT_HEADERS = ("content-type", "location", "retry-after")
+# Body keys whose values are replaced by REDACTED, matched case-insensitively anywhere in the key
+SECRET_KEYS = re.compile(r"password|passphrase|secret|access_key|private_key|token|keytab")
+REDACTED = "REDACTED"
+# Path segments that identify one object (UUIDs and numeric ids), folded together by compare
+ID_SEGMENT = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+)$", re.I)
+
+
+class CassetteMissError(requests.exceptions.ConnectionError):
+    """Raised during replay for a request the cassette has no response for"""
+
+
+def redact(value):
+    """Return a copy of a JSON value with every secret-looking key's value replaced"""
+    if isinstance(value, dict):
+        return {key: REDACTED if SECRET_KEYS.search(key.lower()) else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def _redact_text(text):
+    try:
+        return json.dumps(redact(json.loads(text)), separators=(",", ":"))
+    except ValueError:
+        return text
+
+
+def request_key(method, url, body):
+    """
+    Identify a request independently of host, query parameter order and credentials
+
+    The body is redacted before hashing so a replay run with a different password
+    still finds the recorded responses.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    digest = ""
+    if body:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        try:
+            body = json.dumps(redact(json.loads(body)), sort_keys=True, separators=(",", ":"))
+        except ValueError:
+            pass
+        digest = hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+    return f"{method} {parts.path}?{query} {digest}"
+
+
+def path_template(key):
+    """Fold object ids out of a request key: 'GET /api/storage/volumes/{id}'"""
+    method, target = key.split(" ", 2)[:2]
+    path = target.split("?", 1)[0]
+    return f"{method} " + "/".join("{id}" if ID_SEGMENT.match(segment) else segment
+                                   for segment in path.split("/"))
+
+
+class Cassette:
+    """
+    A gzip-compressed JSON lines file of request/response pairs
+
+    Each line holds the request key, status, kept response headers, redacted response
+    body and the latency observed while recording. In replay mode the responses of
+    each request key are served in recorded order, so concurrent callers may interleave
+    freely; a GET asked for more often than recorded gets its last response again.
+    """
+
+    def __init__(self, path, mode="record", latency_scale=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.handle = None
+        self.entries = {}
+        self.last = {}
+        if mode == "record":
+            self.handle = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            for entry in load(path):
+                self.entries.setdefault(entry["k"], deque()).append(entry)
+                self.counters["recorded"] += 1
+
+    def recorder(self, send):
+        """Wrap an adapter's send() to write every exchange to the cassette"""
+
+        def recording_send(request, **kwargs):
+            started = time.monotonic()
+            response = send(request, **kwargs)
+            latency = time.monotonic() - started
+            entry = {"k": request_key(request.method, request.url, request.body),
+                     "s": response.status_code,
+                     "h": {name: value for name, value in response.headers.items()
+                           if name.lower() in KEPT_HEADERS},
+                     "d": _redact_text(response.text),
+                     "t": round(latency, 4)}
+            line = json.dumps(entry, separators=(",", ":"))
+            with self.lock:
+                self.handle.write(line + "\n")
+                self.counters["recorded"] += 1
+            return response
+
+        return recording_send
+
+    def replayer(self, _send):
+        """Replace an adapter's send() with one answering from the cassette"""
+
+        def replaying_send(request, **_kwargs):
+            key = request_key(request.method, request.url, request.body)
+            with self.lock:
+                queue = self.entries.get(key)
+                if queue:
+                    entry = queue.popleft()
+                    self.last[key] = entry
+                    self.counters["replayed"] += 1
+                elif request.method == "GET" and key in self.last:
+                    entry = self.last[key]
+                    self.counters["repeated"] += 1
+                else:
+                    self.counters["missed"] += 1
+                    raise CassetteMissError(f"No recorded response for {key}")
+            if self.latency_scale:
+                time.sleep(entry["t"] * self.latency_scale)
+            return self._response(request, entry)
+
+        return replaying_send
+
+    @staticmethod
+    def _response(request, entry):
+        response = requests.Response()
+        response.status_code = entry["s"]
+        response.headers = CaseInsensitiveDict(entry["h"])
+        response._content = entry["d"].encode("utf-8")  # pylint: disable=protected-access
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        try:
+            response.reason = HTTPStatus(entry["s"]).phrase
+        except ValueError:
+            response.reason = ""
+        response.elapsed = datetime.timedelta(seconds=entry["t"])
+        return response
+
+    def wrap(self, send):
+        return self.recorder(send) if self.mode == "record" else self.replayer(send)
+
+    def summary(self):
+        with self.lock:
+            result = dict(self.counters)
+        if self.mode == "replay":
+            result["unused"] = sum(len(queue) for queue in self.entries.values())
+        return result
+
+    def close(self):
+        """Flush a recording, or log how closely a replay followed the cassette"""
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+            logger.info(f"Recorded {self.counters['recorded']} request(s) to {self.path}")
+        elif self.mode == "replay":
+            result = self.summary()
+            message = (f"Replayed {result.get('replayed', 0)} of {result['recorded']} recorded request(s) "
+                       f"from {self.path}: {result.get('repeated', 0)} repeated, "
+                       f"{result.get('missed', 0)} missed, {result['unused']} unused")
+            if result.get("missed") or result["unused"]:
+                logger.warning(message)
+            else:
+                logger.info(message)
+
+
+def load(path):
+    """Yield the entries of a cassette, ignoring a torn final line"""
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        try:
+            for line in handle:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+        except EOFError:
+            return
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def active_cassette():
+    """
+    Return the cassette configured by the environment, opening it on first use
+
+    ONTAP_CASSETTE names the file, ONTAP_CASSETTE_MODE is "record" (default) or
+    "replay", and ONTAP_CASSETTE_LATENCY scales the recorded latencies on replay
+    (1 = original, 0 = as fast as possible).
+    """
+    global _active  # pylint: disable=global-statement
+    path = os.environ.get("ONTAP_CASSETTE")
+    if not path:
+        return None
+    with _active_lock:
+        if _active is None:
+            _active = Cassette(path, mode=os.environ.get("ONTAP_CASSETTE_MODE", "record"),
+                               latency_scale=float(os.environ.get("ONTAP_CASSETTE_LATENCY", 1.0)))
+            atexit.register(_active.close)
+        return _active
+
+
+def cassette_session(session):
+    """
+    Record or replay every request sent through a requests.Session
+
+    Does nothing unless ONTAP_CASSETTE is set. Adapters are wrapped in place, like
+    throttle_session does, so the limiter and retries sit on top of the cassette and
+    behave the same when replaying. Calling it again on the same session is a no-op.
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return session
+    for adapter in session.adapters.values():
+        if not getattr(adapter, "cassette", False):
+            adapter.send = cassette.wrap(adapter.send)
+            adapter.cassette = True
+    return session
+
+
+def profile(path):
+    """Requests, total and mean recorded latency per method and path template"""
+    result = {}
+    for entry in load(path):
+        stats = result.setdefault(path_template(entry["k"]), {"requests": 0, "seconds": 0.0})
+        stats["requests"] += 1
+        stats["seconds"] += entry["t"]
+    return result
+
+
+def compare(baseline, candidate):
+    """Print a request-for-request comparison of two cassettes"""
+    before, after = profile(baseline), profile(candidate)
+    empty = {"requests": 0, "seconds": 0.0}
+    print(f"{'REQUEST':60} {'BEFORE':>8} {'AFTER':>8} {'SECONDS BEFORE':>15} {'SECONDS AFTER':>14}")
+    for template in sorted(set(before) | set(after)):
+        old, new = before.get(template, empty), after.get(template, empty)
+        if old != new:
+            print(f"{template[:60]:60} {old['requests']:>8} {new['requests']:>8} "
+                  f"{old['seconds']:>15.2f} {new['seconds']:>14.2f}")
+    print(f"{'TOTAL':60} {sum(s['requests'] for s in before.values()):>8} "
+          f"{sum(s['requests'] for s in after.values()):>8} "
+          f"{sum(s['seconds'] for s in before.values()):>15.2f} "
+          f"{sum(s['seconds'] for s in after.values()):>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compare ONTAP REST cassettes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show", help="Requests and latency per endpoint in a cassette")
+    show_parser.add_argument("cassette")
+    compare_parser = subparsers.add_parser("compare", help="Compare the requests of two cassettes")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for template, stats in sorted(profile(args.cassette).items(), key=lambda item: -item[1]["requests"]):
+            print(f"{template[:60]:60} {stats['requests']:>8} {stats['seconds']:>10.2f}s")
+    else:
+        compare(args.baseline, args.candidate)
+
+
+if __name__ == "__main__":
+    main()
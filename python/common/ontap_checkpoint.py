@@ -0,0 +1,70 @@
+""" Append-only checkpoint journal shared by the ONTAP scripts """
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointJournal:
+    """
+    Records completed steps, with the ONTAP identifiers they produced, in a JSON lines file
+
+    Each completed step is appended and flushed to disk immediately, so a run that dies
+    midway can be resumed: steps already in the journal are skipped and their recorded
+    identifiers (UUIDs, names) are reused instead of being queried again. Once the whole
+    run succeeds, complete() removes the journal so the next run starts fresh.
+    """
+
+    def __init__(self, path, fresh=False):
+        """
+        Args:
+            path: Journal file; None disables checkpointing (every step runs)
+            fresh: Discard any existing journal and start over
+        """
+        self.path = path
+        self.steps = {}
+        self.lock = threading.Lock()
+        if not path:
+            return
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write is ignored
+                        continue
+                    self.steps[entry["step"]] = entry.get("ids", {})
+            if self.steps:
+                logger.info(f"Resuming from checkpoint '{path}' ({len(self.steps)} completed step(s))")
+
+    def done(self, step):
+        """Return True if the step completed in this or a previous run"""
+        return step in self.steps
+
+    def get(self, step, default=None):
+        """Return the identifiers recorded for a completed step"""
+        return self.steps.get(step, default)
+
+    def record(self, step, **ids):
+        """Mark a step as completed along with the identifiers it produced"""
+        with self.lock:
+            self.steps[step] = ids
+            if not self.path:
+                return
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps({"step": step, "time": time.time(), "ids": ids}) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def complete(self):
+        """Remove the journal after a fully successful run"""
+        with self.lock:
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+            self.steps = {}
@@ -0,0 +1,216 @@
+""" Compact columnar volume inventory for large fleets """
+from array import array
+from fnmatch import fnmatchcase
+import sys
+
+# Missing integer values are stored as this sentinel
+MISSING = -1
+
+
+class StringPool:
+    """Interned strings addressed by small integer codes; code 0 is None"""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sys.getsizeof(self.codes) + sum(
+            sys.getsizeof(value) for value in self.values[1:])
+
+
+class TextColumn:
+    """Mostly unique strings packed into one UTF-8 buffer with an offsets array"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])
+        self.present = bytearray()
+
+    def append(self, value):
+        self.present.append(value is not None)
+        if value is not None:
+            self.buffer += value.encode("utf-8")
+        self.offsets.append(len(self.buffer))
+
+    def __getitem__(self, index):
+        if not self.present[index]:
+            return None
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets) + len(self.present)
+
+
+class VolumeRecord:
+    """One volume materialised from a VolumeTable row"""
+    __slots__ = ("uuid", "name", "svm", "svm_uuid", "state", "size", "used", "junction_path",
+                 "security_style", "unix_permissions", "uid", "gid", "export_policy")
+
+    def __init__(self, uuid=None, name=None, svm=None, svm_uuid=None, state=None, size=None, used=None,
+                 junction_path=None, security_style=None, unix_permissions=None, uid=None, gid=None,
+                 export_policy=None):
+        self.uuid = uuid
+        self.name = name
+        self.svm = svm
+        self.svm_uuid = svm_uuid
+        self.state = state
+        self.size = size
+        self.used = used
+        self.junction_path = junction_path
+        self.security_style = security_style
+        self.unix_permissions = unix_permissions
+        self.uid = uid
+        self.gid = gid
+        self.export_policy = export_policy
+
+    def __repr__(self):
+        return f"VolumeRecord({self.svm}:{self.name})"
+
+
+class VolumeTable:
+    """
+    Column-oriented storage for volume records decoded straight from REST pages
+
+    Low-cardinality strings (SVM, state, security style, export policy) are interned and
+    stored as 4-byte codes, numbers live in array('q') columns and names, UUIDs and
+    junction paths are packed into UTF-8 buffers. A volume costs roughly 100 bytes plus
+    its name and path, against several kilobytes for a netapp_ontap Volume object.
+
+    filter(), sort() and group() work on row indices, so they can be chained without
+    materialising records; record() and records() build VolumeRecord objects on demand.
+    """
+
+    # REST fields decoded by append(); request them when reading volumes
+    FIELDS = ("uuid,name,svm.name,svm.uuid,state,size,space.used,nas.path,nas.security_style,"
+              "nas.unix_permissions,nas.uid,nas.gid,nas.export_policy.name")
+    POOLED = ("svm", "svm_uuid", "state", "security_style", "export_policy")
+    NUMERIC = ("size", "used", "unix_permissions", "uid", "gid")
+    TEXT = ("uuid", "name", "junction_path")
+
+    def __init__(self, records=()):
+        self.pools = {column: StringPool() for column in self.POOLED}
+        self.columns = {column: array('I') for column in self.POOLED}
+        self.columns.update({column: array('q') for column in self.NUMERIC})
+        self.columns.update({column: TextColumn() for column in self.TEXT})
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.columns["name"].present)
+
+    def append(self, record):
+        """Decode one volume record (a REST JSON dict) into the columns"""
+        svm = record.get("svm", {})
+        nas = record.get("nas", {})
+        values = {"uuid": record.get("uuid"), "name": record.get("name"),
+                  "svm": svm.get("name"), "svm_uuid": svm.get("uuid"), "state": record.get("state"),
+                  "size": record.get("size", record.get("space", {}).get("size")),
+                  "used": record.get("space", {}).get("used"), "junction_path": nas.get("path"),
+                  "security_style": nas.get("security_style"), "unix_permissions": nas.get("unix_permissions"),
+                  "uid": nas.get("uid"), "gid": nas.get("gid"),
+                  "export_policy": nas.get("export_policy", {}).get("name")}
+        for column in self.POOLED:
+            self.columns[column].append(self.pools[column].code(values[column]))
+        for column in self.NUMERIC:
+            value = values[column]
+            self.columns[column].append(MISSING if value is None else value)
+        for column in self.TEXT:
+            self.columns[column].append(values[column])
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+        return self
+
+    def value(self, column, index):
+        if column in self.pools:
+            return self.pools[column].values[self.columns[column][index]]
+        value = self.columns[column][index]
+        return None if column in self.NUMERIC and value == MISSING else value
+
+    def record(self, index):
+        return VolumeRecord(**{column: self.value(column, index) for column in self.columns})
+
+    def records(self, indices=None):
+        for index in range(len(self)) if indices is None else indices:
+            yield self.record(index)
+
+    def to_rest(self, index):
+        """Rebuild the nested REST shape of one row, for code written against JSON records"""
+        record = self.record(index)
+        nas = {key: value for key, value in (
+            ("path", record.junction_path), ("security_style", record.security_style),
+            ("unix_permissions", record.unix_permissions), ("uid", record.uid), ("gid", record.gid))
+            if value is not None}
+        if record.export_policy is not None:
+            nas["export_policy"] = {"name": record.export_policy}
+        return {"uuid": record.uuid, "name": record.name, "state": record.state, "size": record.size,
+                "svm": {"name": record.svm, "uuid": record.svm_uuid}, "nas": nas}
+
+    def filter(self, indices=None, **conditions):
+        """
+        Return the row indices matching every condition
+
+        A condition is a value to compare with, a glob for text columns (name="proj_*")
+        or a callable taking the column value. Pooled columns are compared by code, so
+        filtering on SVM or export policy never touches the strings.
+        """
+        rows = range(len(self)) if indices is None else indices
+        for column, condition in conditions.items():
+            data = self.columns[column]
+            if column in self.pools and not callable(condition):
+                code = self.pools[column].codes.get(condition)
+                rows = [index for index in rows if data[index] == code]
+            elif callable(condition):
+                rows = [index for index in rows if condition(self.value(column, index))]
+            elif column in self.TEXT and isinstance(condition, str) and any(c in condition for c in "*?["):
+                rows = [index for index in rows if data[index] is not None and fnmatchcase(data[index], condition)]
+            else:
+                rows = [index for index in rows if self.value(column, index) == condition]
+        return array('I', rows)
+
+    def sort(self, column, indices=None, reverse=False):
+        """Return row indices ordered by a column; missing values sort first"""
+        rows = range(len(self)) if indices is None else indices
+        data = self.columns[column]
+        if column in self.pools:
+            # Sort the few distinct strings once, then order rows by the rank of their code
+            values = self.pools[column].values
+            ranks = {code: rank for rank, code in enumerate(
+                sorted(range(len(values)), key=lambda code: values[code] or ""))}
+            return array('I', sorted(rows, key=lambda index: ranks[data[index]], reverse=reverse))
+        if column in self.NUMERIC:
+            return array('I', sorted(rows, key=data.__getitem__, reverse=reverse))
+        return array('I', sorted(rows, key=lambda index: data[index] or "", reverse=reverse))
+
+    def group(self, column, indices=None):
+        """Return {column value: row indices}"""
+        rows = range(len(self)) if indices is None else indices
+        groups = {}
+        if column in self.pools:
+            data = self.columns[column]
+            for index in rows:
+                groups.setdefault(data[index], array('I')).append(index)
+            values = self.pools[column].values
+            return {values[code]: members for code, members in groups.items()}
+        for index in rows:
+            groups.setdefault(self.value(column, index), array('I')).append(index)
+        return groups
+
+    def index(self, *columns):
+        """Return {(column values...): row index} for lookups by a unique key"""
+        return {tuple(self.value(column, row) for column in columns): row for row in range(len(self))}
+
+    def nbytes(self):
+        """Approximate memory held by the table"""
+        total = sum(pool.nbytes() for pool in self.pools.values())
+        for column, data in self.columns.items():
+            total += data.nbytes() if column in self.TEXT else data.itemsize * len(data)
+        return total
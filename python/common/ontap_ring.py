@@ -0,0 +1,79 @@
+""" Fixed-capacity sample history per object, for long-running collectors """
+from array import array
+import argparse
+
+
+class SampleRing:
+    """
+    Ring buffer holding the most recent fixed-width samples of many objects
+
+    Each key (a volume or relationship UUID, for instance) gets one flat array('d') of
+    capacity * width doubles, so memory is bounded by keys * capacity regardless of
+    how long the collector runs. Samples are tuples of floats; use NaN for gaps.
+    """
+
+    def __init__(self, width, capacity=60):
+        if capacity < 1:
+            raise ValueError(f"A ring needs a capacity of at least one sample, got {capacity}")
+        self.width = width
+        self.capacity = capacity
+        self.slots = {}      # key -> slot number
+        self.samples = []    # slot -> array('d') ring
+        self.heads = array('l')
+        self.counts = array('l')
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.samples)
+            self.samples.append(array('d', bytes(8 * self.capacity * self.width)))
+            self.heads.append(0)
+            self.counts.append(0)
+        return slot
+
+    def add(self, key, sample):
+        """Append one sample for a key, overwriting its oldest once the ring is full"""
+        slot = self._slot(key)
+        head = self.heads[slot]
+        self.samples[slot][head * self.width:(head + 1) * self.width] = array('d', sample)
+        self.heads[slot] = (head + 1) % self.capacity
+        self.counts[slot] = min(self.counts[slot] + 1, self.capacity)
+
+    def last(self, key):
+        """Return the newest sample of a key, or None if it has none"""
+        slot = self.slots.get(key)
+        if slot is None or not self.counts[slot]:
+            return None
+        offset = ((self.heads[slot] - 1) % self.capacity) * self.width
+        return tuple(self.samples[slot][offset:offset + self.width])
+
+    def history(self, key):
+        """Return the buffered samples of a key, oldest first"""
+        slot = self.slots.get(key)
+        if slot is None:
+            return []
+        ring = self.samples[slot]
+        count = self.counts[slot]
+        start = (self.heads[slot] - count) % self.capacity
+        result = []
+        for i in range(count):
+            offset = ((start + i) % self.capacity) * self.width
+            result.append(tuple(ring[offset:offset + self.width]))
+        return result
+
+
+def window_arg(value):
+    """argparse type for a sample window; rates and trends need at least two samples"""
+    try:
+        window = int(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(f"invalid window '{value}'") from err
+    if window < 2:
+        raise argparse.ArgumentTypeError(f"window must be at least 2 samples, got {window}")
+    return window
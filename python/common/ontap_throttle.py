@@ -0,0 +1,271 @@
+""" Adaptive concurrency limiter and circuit breaker for the ONTAP management endpoint """
+from collections import deque
+import atexit
+import email.utils
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from ontap_cassette import cassette_session
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the management LIF is overloaded rather than the request being wrong
+THROTTLE_STATUS = (429, 503)
+# A 503 may come after the request was processed, so only these are resent on 503
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+LATENCY_WINDOW = 1024
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while a host's circuit is open"""
+
+
+class AimdLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests
+
+    Every fast, successful response raises the limit by 1/limit, so roughly one extra
+    concurrent request is allowed per round of responses. A throttled (429/503), failed
+    or slower-than-target response multiplies the limit by `decrease`, at most once per
+    cooldown so that one congestion burst only backs off once.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, latency_target=2.0, decrease=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.last_decrease = 0.0
+        self.started = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"requests": 0, "errors": 0, "throttled": 0, "slow": 0,
+                         "decreases": 0, "waited": 0, "peak_in_flight": 0}
+
+    def acquire(self):
+        """Block until another request may be sent"""
+        with self.cond:
+            if self.started is None:
+                self.started = time.monotonic()
+            if self.in_flight >= int(self.limit):
+                self.counters["waited"] += 1
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.in_flight)
+
+    def release(self, latency, outcome):
+        """
+        Record a finished request and adjust the limit
+
+        Args:
+            latency: Seconds the request took
+            outcome: "ok", "throttled" or "error"
+        """
+        with self.cond:
+            self.in_flight -= 1
+            self.counters["requests"] += 1
+            self.latencies.append(latency)
+            slow = latency > self.latency_target
+            if outcome == "ok" and not slow:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                self.counters[{"ok": "slow", "throttled": "throttled"}.get(outcome, "errors")] += 1
+                now = time.monotonic()
+                if now - self.last_decrease >= max(self.latency_target, latency):
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+                    self.counters["decreases"] += 1
+            self.cond.notify_all()
+
+    def metrics(self):
+        with self.cond:
+            latencies = sorted(self.latencies)
+            elapsed = time.monotonic() - self.started if self.started else 0
+            result = dict(self.counters, limit=round(self.limit, 2), in_flight=self.in_flight,
+                          requests_per_second=round(self.counters["requests"] / elapsed, 2) if elapsed else 0.0)
+        if latencies:
+            result["latency_p50"] = round(latencies[len(latencies) // 2], 3)
+            result["latency_p95"] = round(latencies[int(len(latencies) * 0.95)], 3)
+        return result
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker
+
+    After `threshold` consecutive failures the circuit opens and requests fail fast with
+    CircuitOpenError for `reset_timeout` seconds. A single probe request is then let
+    through (half-open); its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"opened": 0, "rejected": 0}
+
+    def before(self, host):
+        """Raise CircuitOpenError unless a request to the host may be sent"""
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                logger.info(f"Circuit for {host} half-open, sending a probe request")
+                return
+            self.counters["rejected"] += 1
+        raise CircuitOpenError(f"Circuit for {host} is open after {self.failures} consecutive failures")
+
+    def record(self, host, success):
+        """Record the final outcome of a request; None (rate limited) counts neither way"""
+        if success is None:
+            return
+        with self.lock:
+            if success:
+                self.state = "closed"
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.counters["opened"] += 1
+                logger.warning(f"Circuit for {host} opened for {self.reset_timeout}s "
+                               f"after {self.failures} consecutive failures")
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.counters, state=self.state, consecutive_failures=self.failures)
+
+
+class HostGuard:
+    """Limiter and breaker shared by every session talking to one host"""
+
+    def __init__(self, host):
+        self.host = host
+        self.limiter = AimdLimiter(
+            initial=int(os.environ.get("ONTAP_INITIAL_IN_FLIGHT", 4)),
+            maximum=int(os.environ.get("ONTAP_MAX_IN_FLIGHT", 16)),
+            latency_target=float(os.environ.get("ONTAP_LATENCY_TARGET", 2.0)))
+        self.breaker = CircuitBreaker(
+            threshold=int(os.environ.get("ONTAP_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("ONTAP_BREAKER_RESET", 30)))
+        self.retries = int(os.environ.get("ONTAP_THROTTLE_RETRIES", 3))
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def guard_for(host):
+    """Return the HostGuard for a host, creating it on first use"""
+    with _guards_lock:
+        if host not in _guards:
+            _guards[host] = HostGuard(host)
+        return _guards[host]
+
+
+def _retry_after(response, attempt):
+    """Seconds to wait before retrying a throttled response"""
+    value = response.headers.get("Retry-After")
+    if value:
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return min(30.0, 0.5 * 2 ** attempt)
+
+
+def _guarded(send):
+    """Wrap an adapter's send() with the host's breaker, limiter and 429/503 retries"""
+
+    def guarded_send(request, **kwargs):
+        host = urlsplit(request.url).netloc
+        guard = guard_for(host)
+        attempt = 0
+        while True:
+            guard.breaker.before(host)
+            guard.limiter.acquire()
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                response = send(request, **kwargs)
+                if response.status_code in THROTTLE_STATUS:
+                    outcome = "throttled"
+                elif response.status_code < 500:
+                    outcome = "ok"
+            except Exception:
+                guard.breaker.record(host, False)
+                raise
+            finally:
+                guard.limiter.release(time.monotonic() - started, outcome)
+            # 429 is a rejection before processing, so any request can be resent; a 503 may
+            # come from a backend that already applied the change, so only reads are resent
+            retry = outcome == "throttled" and (response.status_code == 429
+                                                or request.method in IDEMPOTENT_METHODS)
+            if not retry or attempt >= guard.retries:
+                # The breaker only sees final outcomes; 429 means "slow down", not "down"
+                guard.breaker.record(host, None if response.status_code == 429 else outcome == "ok")
+                return response
+            delay = _retry_after(response, attempt)
+            logger.debug(f"{host} returned {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    return guarded_send
+
+
+def throttle_session(session):
+    """
+    Route every request sent through a requests.Session via the per-host guards
+
+    Adapters mounted on the session (including the one netapp_ontap's HostConnection
+    mounts for its origin) are wrapped in place, so their own retry and logging
+    behaviour is kept. Calling it again on the same session is a no-op. When
+    ONTAP_CASSETTE is set the traffic is also recorded or replayed underneath the guards.
+    """
+    cassette_session(session)
+    for adapter in session.adapters.values():
+        if not getattr(adapter, "throttled", False):
+            adapter.send = _guarded(adapter.send)
+            adapter.throttled = True
+    return session
+
+
+def throttle_connection(connection):
+    """Throttle every API call made through a netapp_ontap HostConnection"""
+    throttle_session(connection.session)
+    return connection
+
+
+def metrics():
+    """Return limiter and breaker metrics for every host contacted so far"""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.host: {"limiter": guard.limiter.metrics(), "breaker": guard.breaker.metrics()}
+            for guard in guards}
+
+
+def write_metrics(path):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(metrics(), handle, indent=2)
+
+
+if os.environ.get("ONTAP_THROTTLE_METRICS"):
+    # Dump the metrics when the script exits, to tune the limits for the management LIF
+    atexit.register(write_metrics, os.environ["ONTAP_THROTTLE_METRICS"])
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Configuration snapshots of FSx for ONTAP file systems
+
+snapshot: pulls SVM, volume, export policy, NFS, LDAP, name-mapping, UNIX user/group,
+CIFS share/ACL, S3 and SnapMirror configuration from one or more file systems
+concurrently and writes every object to a content-addressed store: each object is
+stored once, compressed, under the SHA-256 of its canonical JSON, and a snapshot is
+a small manifest mapping object keys to hashes.
+
+diff: compares two manifests by hash and decodes only the objects whose hash changed.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+import argparse
+import getpass
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+from netapp_ontap import HostConnection, NetAppRestError
+from netapp_ontap.resources import (CifsShare, ExportPolicy, LdapService, NameMapping, NfsService, S3Bucket,
+                                    S3Service, SnapmirrorRelationship, Svm, UnixGroup, UnixUser, Volume)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# kind -> (resource, fields, identifying fields besides the SVM name)
+KINDS = {
+    "svm": (Svm, "uuid,name,state,subtype,language,comment,ipspace.name,nsswitch,dns,nis,ldap,nfs,cifs,s3,"
+                 "snapshot_policy.name", ("name",)),
+    "volume": (Volume, "uuid,name,svm.name,type,style,state,size,nas,snapshot_policy.name,qos,tiering,autosize,"
+                       "guarantee,snapmirror.is_protected", ("name",)),
+    "export_policy": (ExportPolicy, "id,name,svm.name,rules", ("name",)),
+    "nfs": (NfsService, "*", ()),
+    "ldap": (LdapService, "*", ()),
+    "name_mapping": (NameMapping, "*", ("direction", "index")),
+    "unix_user": (UnixUser, "*", ("name",)),
+    "unix_group": (UnixGroup, "*", ("name",)),
+    "cifs_share": (CifsShare, "*,acls", ("name",)),
+    "s3_service": (S3Service, "*", ()),
+    "s3_bucket": (S3Bucket, "*", ("name",)),
+    "snapmirror": (SnapmirrorRelationship, "uuid,source.path,destination.path,policy.name,state,throttle,"
+                                           "group_type", ("destination.path",)),
+}
+
+# Keys that change without a configuration change; dropped anywhere in a record
+VOLATILE_KEYS = {"_links", "statistics", "metric", "space", "status", "logical_used_size", "lag_time",
+                 "transfer", "unhealthy_reason", "healthy"}
+
+SNAPSHOT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def field(record, path):
+    """Return a dotted field of a REST record, or None"""
+    for part in path.split("."):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(part)
+    return record
+
+
+def strip_volatile(value):
+    if isinstance(value, dict):
+        return {key: strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(item) for item in value]
+    return value
+
+
+def object_key(kind, record):
+    """Stable key of one configuration object, e.g. volume/svm1/vol1"""
+    _resource, _fields, identity = KINDS[kind]
+    parts = [kind, field(record, "svm.name") or ""] if kind != "svm" else [kind]
+    parts += [str(field(record, path)) for path in identity]
+    return "/".join(parts)
+
+
+def canonical(record):
+    return json.dumps(record, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def flatten(value, prefix=""):
+    """Flatten nested dicts into {dotted path: value}; lists are compared whole"""
+    if isinstance(value, dict) and value:
+        result = {}
+        for key, item in value.items():
+            result.update(flatten(item, f"{prefix}{key}."))
+        return result
+    return {prefix[:-1]: value}
+
+
+class SnapshotStore:
+    """
+    Content-addressed, compressed object store plus per-cluster snapshot manifests
+
+    objects/ab/cdef...  zlib-compressed canonical JSON, named by its SHA-256
+    snapshots/<cluster>/<UTC time>.json.gz  {"objects": {key: hash}, ...}
+
+    Objects are immutable, so an unchanged object costs nothing in the next snapshot.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put(self, record):
+        """Store a record if it is new; returns (hash, bytes written)"""
+        data = canonical(record)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        # Unique per thread: two file systems may hold the same object and store it concurrently
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as handle:
+            handle.write(compressed)
+        os.replace(temporary, path)
+        return digest, len(compressed)
+
+    def get(self, digest):
+        with open(self.object_path(digest), "rb") as handle:
+            return json.loads(zlib.decompress(handle.read()))
+
+    def write_manifest(self, manifest):
+        """
+        Write a manifest under its UTC time and return its snapshot id
+
+        A second snapshot taken in the same second gets a -02, -03, ... suffix instead
+        of replacing the first; the file is created exclusively, so concurrent runs
+        cannot overwrite each other either.
+        """
+        directory = os.path.join(self.snapshots_dir, manifest["cluster"])
+        os.makedirs(directory, exist_ok=True)
+        taken = manifest["taken"]
+        for attempt in range(1, 100):
+            name = taken if attempt == 1 else f"{taken}-{attempt:02d}"
+            try:
+                handle = gzip.open(os.path.join(directory, f"{name}.json.gz"), "xt", encoding="utf-8")
+            except FileExistsError:
+                continue
+            with handle:
+                manifest["taken"] = name
+                json.dump(manifest, handle, separators=(",", ":"))
+            return f"{manifest['cluster']}/{name}"
+        raise FileExistsError(f"Too many snapshots of {manifest['cluster']} taken at {taken}")
+
+    def snapshots(self, cluster=None):
+        """Return snapshot ids (cluster/time), oldest first per cluster"""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        clusters = [cluster] if cluster else sorted(os.listdir(self.snapshots_dir))
+        # Sorted without the extension, so that 20250101T000000Z comes before 20250101T000000Z-02
+        return [f"{name}/{taken}" for name in clusters
+                if os.path.isdir(os.path.join(self.snapshots_dir, name))
+                for taken in sorted(entry[:-len('.json.gz')]
+                                    for entry in os.listdir(os.path.join(self.snapshots_dir, name))
+                                    if entry.endswith(".json.gz"))]
+
+    def resolve(self, reference):
+        """Accept cluster/time, cluster/latest or cluster/previous"""
+        cluster, _, name = reference.rpartition("/")
+        if name in ("latest", "previous"):
+            taken = self.snapshots(cluster)
+            position = -1 if name == "latest" else -2
+            if len(taken) < -position:
+                raise ValueError(f"No {name} snapshot for cluster '{cluster}'")
+            return taken[position]
+        return reference
+
+    def load_manifest(self, reference):
+        snapshot_id = self.resolve(reference)
+        with gzip.open(os.path.join(self.snapshots_dir, f"{snapshot_id}.json.gz"), "rt", encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def prune(self, keep):
+        """Keep the newest `keep` snapshots per cluster and drop objects no snapshot references"""
+        if keep < 0:
+            raise ValueError(f"Cannot keep a negative number of snapshots ({keep})")
+        if not os.path.isdir(self.snapshots_dir):
+            return
+        removed = 0
+        for cluster in os.listdir(self.snapshots_dir):
+            for snapshot_id in self.snapshots(cluster)[:-keep] if keep else self.snapshots(cluster):
+                os.remove(os.path.join(self.snapshots_dir, f"{snapshot_id}.json.gz"))
+                removed += 1
+        referenced = set()
+        for snapshot_id in self.snapshots():
+            referenced.update(self.load_manifest(snapshot_id)["objects"].values())
+        orphaned = 0
+        for prefix in os.listdir(self.objects_dir) if os.path.isdir(self.objects_dir) else []:
+            for name in os.listdir(os.path.join(self.objects_dir, prefix)):
+                # Temporary files belong to a put() still in progress
+                if not name.endswith(".tmp") and prefix + name not in referenced:
+                    os.remove(os.path.join(self.objects_dir, prefix, name))
+                    orphaned += 1
+        logger.info(f"Removed {removed} snapshot(s) and {orphaned} unreferenced object(s)")
+
+
+def cluster_label(host):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", host)
+
+
+def pull(store, connection, kind, page_size):
+    """Read one kind of configuration and store its objects; returns ({key: hash}, bytes written)"""
+    resource, fields, _identity = KINDS[kind]
+    objects = {}
+    written = 0
+    for record in resource.fast_get_collection(connection=connection, fields=fields, max_records=page_size):
+        data = strip_volatile(record.resource_data)
+        digest, size = store.put(data)
+        objects[object_key(kind, data)] = digest
+        written += size
+    return objects, written
+
+
+def take_snapshots(store, hosts, user, password, kinds=tuple(KINDS), workers=8, page_size=1000):
+    """
+    Snapshot every host concurrently, one task per (host, kind)
+
+    A kind that cannot be read (e.g. S3 not configured) is recorded in the manifest's
+    errors and the snapshot continues.
+    """
+    connections = {host: throttle_connection(HostConnection(host, username=user, password=password, verify=False))
+                   for host in hosts}
+    taken = datetime.now(timezone.utc).strftime(SNAPSHOT_TIME_FORMAT)
+    manifests = {host: {"cluster": cluster_label(host), "host": host, "taken": taken, "objects": {}, "errors": {}}
+                 for host in hosts}
+    written = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(pull, store, connections[host], kind, page_size): (host, kind)
+                   for host in hosts for kind in kinds}
+        for future in as_completed(futures):
+            host, kind = futures[future]
+            try:
+                objects, size = future.result()
+            except NetAppRestError as err:
+                logger.warning(f"{host}: could not read {kind}: {err}")
+                manifests[host]["errors"][kind] = str(err)
+                continue
+            manifests[host]["objects"].update(objects)
+            written += size
+
+    elapsed = time.monotonic() - started
+    ids = []
+    for manifest in manifests.values():
+        manifest["seconds"] = round(elapsed, 3)
+        ids.append(store.write_manifest(manifest))
+        logger.info(f"✓ Snapshot {ids[-1]}: {len(manifest['objects'])} object(s), "
+                    f"{len(manifest['errors'])} kind(s) unavailable")
+    total = sum(len(manifest["objects"]) for manifest in manifests.values())
+    logger.info(f"{total} object(s) from {len(hosts)} file system(s) in {elapsed:.2f}s, "
+                f"{written / 1024:.1f} KiB of new objects written")
+    return ids
+
+
+def diff_snapshots(store, old_reference, new_reference):
+    """
+    Compare two snapshots; only objects whose hashes differ are decoded
+
+    Kinds that failed to be read in either snapshot are left out rather than reported
+    as added or removed.
+
+    Returns {"added": [keys], "removed": [keys], "changed": {key: [(path, old, new)]},
+    "not_compared": {kind: error}}
+    """
+    old_manifest = store.load_manifest(old_reference)
+    new_manifest = store.load_manifest(new_reference)
+    not_compared = {**old_manifest.get("errors", {}), **new_manifest.get("errors", {})}
+    old = {key: digest for key, digest in old_manifest["objects"].items()
+           if key.split("/", 1)[0] not in not_compared}
+    new = {key: digest for key, digest in new_manifest["objects"].items()
+           if key.split("/", 1)[0] not in not_compared}
+    result = {"added": sorted(new.keys() - old.keys()), "removed": sorted(old.keys() - new.keys()), "changed": {},
+              "not_compared": dict(sorted(not_compared.items()))}
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == new[key]:
+            continue
+        before, after = flatten(store.get(old[key])), flatten(store.get(new[key]))
+        result["changed"][key] = [(path, before.get(path), after.get(path))
+                                  for path in sorted(before.keys() | after.keys())
+                                  if before.get(path) != after.get(path)]
+    return result
+
+
+def print_diff(result, output_format):
+    if output_format == "json":
+        print(json.dumps(result, indent=2))
+        return
+    for key in result["added"]:
+        print(f"+ {key}")
+    for key in result["removed"]:
+        print(f"- {key}")
+    for key, changes in result["changed"].items():
+        print(f"~ {key}")
+        for path, before, after in changes:
+            print(f"    {path}: {json.dumps(before)} -> {json.dumps(after)}")
+    for kind, error in result["not_compared"].items():
+        print(f"! {kind} not compared: {error}")
+    print(f"{len(result['added'])} added, {len(result['removed'])} removed, {len(result['changed'])} changed"
+          + (f", {len(result['not_compared'])} kind(s) not compared" if result["not_compared"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot and diff FSx for ONTAP configuration')
+    parser.add_argument('--store', default='config-snapshots', help='Snapshot store directory')
+    subparsers = parser.add_subparsers(dest='command', required=True, help='Command to execute')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Take a configuration snapshot of file systems')
+    snapshot_parser.add_argument('--host', action='append', default=[], help='Management endpoint (repeatable)')
+    snapshot_parser.add_argument('--hosts-file', help='File with one management endpoint per line')
+    snapshot_parser.add_argument('--user', default='fsxadmin', help='ONTAP username')
+    snapshot_parser.add_argument('--kinds', help=f"Comma-separated kinds (default: all of {', '.join(KINDS)})")
+    snapshot_parser.add_argument('--workers', type=int, default=8, help='Concurrent collection reads')
+    snapshot_parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
+
+    list_parser = subparsers.add_parser('list', help='List snapshots')
+    list_parser.add_argument('--cluster', help='Only snapshots of this cluster')
+
+    diff_parser = subparsers.add_parser('diff', help='Compare two snapshots')
+    diff_parser.add_argument('old', help='Snapshot id (cluster/time), cluster/latest or cluster/previous')
+    diff_parser.add_argument('new', help='Snapshot id (cluster/time), cluster/latest or cluster/previous')
+    diff_parser.add_argument('--format', default='table', choices=['table', 'json'], help='Output format')
+
+    prune_parser = subparsers.add_parser('prune', help='Remove old snapshots and unreferenced objects')
+    prune_parser.add_argument('--keep', type=int, required=True, help='Snapshots kept per cluster')
+
+    args = parser.parse_args()
+    store = SnapshotStore(args.store)
+
+    if args.command == 'snapshot':
+        hosts = list(args.host)
+        if args.hosts_file:
+            with open(args.hosts_file, encoding="utf-8") as handle:
+                hosts += [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+        if not hosts:
+            parser.error('give --host or --hosts-file')
+        kinds = args.kinds.split(',') if args.kinds else list(KINDS)
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            parser.error(f"unknown kinds: {', '.join(unknown)}")
+        password = os.environ.get("ONTAP_PASSWORD") or getpass.getpass(f"Enter the password for {args.user}: ")
+        take_snapshots(store, hosts, args.user, password, kinds=kinds, workers=args.workers,
+                       page_size=args.page_size)
+
+    elif args.command == 'list':
+        for snapshot_id in store.snapshots(args.cluster):
+            print(snapshot_id)
+
+    elif args.command == 'diff':
+        try:
+            result = diff_snapshots(store, args.old, args.new)
+        except (OSError, ValueError) as err:
+            logger.error(f"Error reading snapshots: {err}")
+            sys.exit(1)
+        print_diff(result, args.format)
+        sys.exit(1 if result["added"] or result["removed"] or result["changed"] else 0)
+
+    elif args.command == 'prune':
+        if args.keep < 0:
+            parser.error('--keep must be 0 or more')
+        store.prune(args.keep)
+
+
+if __name__ == "__main__":
+    main()
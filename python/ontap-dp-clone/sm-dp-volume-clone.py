@@ -1,9 +1,15 @@
 # pylint: disable=invalid-name
 """ Create Clone from a DP Volume in a non-prod environment """
+import os
+import sys
 import time
 from netapp_ontap import config, HostConnection, NetAppRestError
 from netapp_ontap.resources import SnapmirrorRelationship, Volume
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_checkpoint import CheckpointJournal  # pylint: disable=wrong-import-position
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
+
 FSXN_MANAGEMENT_ENDPOINT = "<FILESYSTEM MANAGMENT ENDPOINT>"
 FSXN_USER = "fsxadmin"
 FSXN_USER_PWD = "<PASSWORD>"
@@ -12,8 +18,11 @@ SVM_NAME = "fsx0svm1"
 VOL_NAME = "vol_secondary"
 CLONE_NAME = "vol_clone"
 CLONE_JUNCTION_PATH = "/vol_clone"
+# Checkpoint journal; a refresh that dies midway resumes after the last completed step
+CHECKPOINT_FILE = "sm-dp-volume-clone.checkpoint"
 
-config.CONNECTION = HostConnection(FSXN_MANAGEMENT_ENDPOINT, FSXN_USER, FSXN_USER_PWD, verify=False)
+config.CONNECTION = throttle_connection(
+    HostConnection(FSXN_MANAGEMENT_ENDPOINT, FSXN_USER, FSXN_USER_PWD, verify=False))
 
 def print_snapmirror_details(snapmirror):
     """ Prints SnapMirror Relationship Info """
@@ -41,12 +50,25 @@ def search_snapmirror_relationships():
 
 def delete_volume_clones(vol_name):
     """ Delete Volume Clones """
+    deleted = []
     for volume in Volume.get_collection(**{"clone.is_flexclone": True,
                                            "clone.parent_volume.name": vol_name}):
         print("Parent Volume: " + vol_name + " --> Clone: " +
               volume.name + ", Cloned Volume UUID: " + volume.uuid)
         print("Deleting Clone: " + volume.name)
         volume.delete(force=True)
+        deleted.append(volume.uuid)
+    return deleted
+
+def wait_for_resync(uuid, attempts=12):
+    """ Poll a relationship until a resync started earlier leaves broken_off; return its state """
+    state = SnapmirrorRelationship.find(uuid=uuid).state
+    while state == "broken_off" and attempts > 0:
+        print("Relationship is still broken_off. Waiting 5 seconds..")
+        time.sleep(5)
+        state = SnapmirrorRelationship.find(uuid=uuid).state
+        attempts -= 1
+    return state
 
 def create_clone(svm_uuid, vol_name, clone_name):
     """ Create Volume Clone """
@@ -71,36 +93,68 @@ def create_clone(svm_uuid, vol_name, clone_name):
     dataobj['clone'] = clone_volume_json
     volume = Volume.from_dict(dataobj)
     volume.post(poll=True)
-
-
-print("Searching for SnapMirror Relationship for Destination SVM: " +
-      SVM_NAME + " and Volume: " + VOL_NAME)
-snapmirrorRelationship = handle_netapp_error(search_snapmirror_relationships,
-                            "searching for SnapMirror Relationships")
-print_snapmirror_details(snapmirrorRelationship)
-
-svmUUID = snapmirrorRelationship.destination.svm.uuid
-print("Searching for Clones of volume: " + snapmirrorRelationship.destination.path)
-handle_netapp_error(delete_volume_clones, "searching for clones", VOL_NAME)
-
-
-print("Resuming the SnapMirror Relationship")
-if snapmirrorRelationship.state == "broken_off":
-    update_snapmirror_state(snapmirrorRelationship, "snapmirrored")
-
-print("Checking the sync status")
-time.sleep(5)
-smStatus = SnapmirrorRelationship.find(uuid=snapmirrorRelationship.uuid)
-while smStatus.state == "snapmirrored" and smStatus.transfer.state == "transferring":
-    print("Data is being synced from source. Waiting 5 seconds..")
+    return volume
+
+
+journal = CheckpointJournal(CHECKPOINT_FILE)
+
+if journal.done("search"):
+    found = journal.get("search")
+    print("Resuming from checkpoint, SnapMirror Relationship UUID: " + found["uuid"])
+    snapmirrorRelationship = SnapmirrorRelationship(uuid=found["uuid"], state=found["state"])
+    svmUUID = found["svm_uuid"]
+else:
+    print("Searching for SnapMirror Relationship for Destination SVM: " +
+          SVM_NAME + " and Volume: " + VOL_NAME)
+    snapmirrorRelationship = handle_netapp_error(search_snapmirror_relationships,
+                                "searching for SnapMirror Relationships")
+    print_snapmirror_details(snapmirrorRelationship)
+    svmUUID = snapmirrorRelationship.destination.svm.uuid
+    journal.record("search", uuid=snapmirrorRelationship.uuid,
+                   svm_uuid=svmUUID, state=snapmirrorRelationship.state)
+
+if not journal.done("delete_clones"):
+    print("Searching for Clones of volume: " + SVM_NAME + ":" + VOL_NAME)
+    deletedClones = handle_netapp_error(delete_volume_clones, "searching for clones", VOL_NAME)
+    journal.record("delete_clones", uuids=deletedClones)
+
+# A resync that already completed must not be triggered a second time
+if not journal.done("resync"):
+    if journal.done("resync_started"):
+        # The PATCH of the previous run may have been applied; read the state instead of resending it
+        print("Resync was started by a previous run, checking the SnapMirror Relationship state")
+        snapmirrorRelationship.state = handle_netapp_error(
+            wait_for_resync, "checking the SnapMirror Relationship state", snapmirrorRelationship.uuid)
+    if snapmirrorRelationship.state == "broken_off":
+        print("Resuming the SnapMirror Relationship")
+        journal.record("resync_started", uuid=snapmirrorRelationship.uuid)
+        update_snapmirror_state(snapmirrorRelationship, "snapmirrored")
+    journal.record("resync", uuid=snapmirrorRelationship.uuid, state=snapmirrorRelationship.state)
+else:
+    snapmirrorRelationship.state = journal.get("resync")["state"]
+
+if not journal.done("sync"):
+    print("Checking the sync status")
     time.sleep(5)
     smStatus = SnapmirrorRelationship.find(uuid=snapmirrorRelationship.uuid)
-    if (smStatus.state == "snapmirrored" and smStatus.transfer.state == "success"):
-        print("Data Sync complete from source")
-
-print("Breaking the SnapMirror Relationship")
-if snapmirrorRelationship.state == "snapmirrored":
-    update_snapmirror_state(snapmirrorRelationship, "broken_off")
-
-handle_netapp_error(
-    create_clone, "retrieving parent volume details", svmUUID, VOL_NAME, CLONE_NAME)
+    while smStatus.state == "snapmirrored" and smStatus.transfer.state == "transferring":
+        print("Data is being synced from source. Waiting 5 seconds..")
+        time.sleep(5)
+        smStatus = SnapmirrorRelationship.find(uuid=snapmirrorRelationship.uuid)
+        if (smStatus.state == "snapmirrored" and smStatus.transfer.state == "success"):
+            print("Data Sync complete from source")
+    journal.record("sync", uuid=snapmirrorRelationship.uuid)
+
+if not journal.done("break"):
+    print("Breaking the SnapMirror Relationship")
+    if snapmirrorRelationship.state == "snapmirrored":
+        update_snapmirror_state(snapmirrorRelationship, "broken_off")
+    journal.record("break", uuid=snapmirrorRelationship.uuid)
+
+if not journal.done("clone"):
+    cloneVolume = handle_netapp_error(
+        create_clone, "retrieving parent volume details", svmUUID, VOL_NAME, CLONE_NAME)
+    journal.record("clone", name=CLONE_NAME, uuid=getattr(cloneVolume, "uuid", None))
+
+# Refresh complete; the next run starts from the beginning
+journal.complete()
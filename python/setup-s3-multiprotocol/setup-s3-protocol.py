@@ -1,14 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import base64
+from datetime import datetime, timedelta, timezone
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from InquirerPy import inquirer
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.markdown import Markdown
-
 from rich.live import Live
-from rich.table import Table
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_checkpoint import CheckpointJournal  # pylint: disable=wrong-import-position
+from ontap_inventory import VolumeTable  # pylint: disable=wrong-import-position
+from ontap_throttle import throttle_session  # pylint: disable=wrong-import-position
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -17,6 +35,13 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 AGGREGATE = 'aggr1'
 S3_USER = 's3user'
 REQUEST_TIMEOUT = 60
+MAX_WORKERS = 8
+PAGE_SIZE = 500
+PICKER_PAGE_SIZE = 20
+CERT_MIN_VALIDITY_DAYS = 30
+BUCKET_PAGE_SIZE = 25
+FRAME_BUDGET = 0.05  # seconds allowed to build one dashboard frame
+KEY_FILE_ITERATIONS = 600000
 
 # API Configuration
 HEADERS = {'Content-Type': 'application/json', 'Accept': 'application/json'}
@@ -32,40 +57,88 @@ class ONTAPS3:
     def __init__(self, base_url, auth):
         self.BASE_URL = base_url
         self.AUTH = auth
+        self.ORIGIN = base_url[:-len("/api")] if base_url.endswith("/api") else base_url
+
+        # Pooled session so concurrent requests reuse connections; the shared limiter
+        # adapts how many of them are in flight to what the management LIF sustains
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+        throttle_session(self.session)
+
+    def get_all_records(self, url):
+        """
+        Retrieve every record of a collection, following the next links page by page
+
+        A page that fails raises requests.HTTPError, so callers never mistake a
+        truncated collection for a complete one.
+        """
+        while url:
+            response = self.session.get(url, headers=HEADERS,
+                                        auth=self.AUTH, verify=False)
+            if not response.ok:
+                raise requests.exceptions.HTTPError(
+                    f"GET {url} failed with {response.status_code}: {response.text}", response=response)
+            body = response.json()
+            yield from body.get('records', [])
+            next_link = body.get('_links', {}).get('next', {}).get('href')
+            url = f"{self.ORIGIN}{next_link}" if next_link else None
+
+    def get_page(self, url):
+        """Retrieve one page of a collection, returning (records, next page url)"""
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
+        if not response.ok:
+            return [], None
+        body = response.json()
+        next_link = body.get('_links', {}).get('next', {}).get('href')
+        return body.get('records', []), f"{self.ORIGIN}{next_link}" if next_link else None
+
+    def svm_page_url(self, term=None, page_size=PICKER_PAGE_SIZE):
+        """First page URL for SVMs, optionally filtered by name on the server"""
+        url = f"{self.BASE_URL}/svm/svms?fields=cifs.ad_domain.fqdn,cifs.enabled,cifs.allowed&order_by=name" \
+            f"&max_records={page_size}&return_timeout={REQUEST_TIMEOUT}"
+        return f"{url}&name={quote(f'*{term}*', safe='*')}" if term else url
+
+    def volume_page_url(self, svm_uuid, term=None):
+        """First page URL for the NAS volumes of an SVM, optionally filtered by name on the server"""
+        url = f"{self.BASE_URL}/storage/volumes?svm.uuid={svm_uuid}&is_constituent=false&is_object_store=false" \
+            f"&is_svm_root=false&fields=nas.path,svm.uuid&order_by=name&max_records={PICKER_PAGE_SIZE}" \
+            f"&return_timeout={REQUEST_TIMEOUT}"
+        return f"{url}&name={quote(f'*{term}*', safe='*')}" if term else url
 
     def get_svms(self):
         """Retrieve SVMs"""
         url = f"{self.BASE_URL}/svm/svms?fields=cifs.ad_domain.fqdn,cifs.enabled,cifs.allowed&return_records=true&return_timeout={REQUEST_TIMEOUT}"
-        response = requests.get(url, headers=HEADERS,
-                                auth=self.AUTH, verify=False)
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
         return response.json().get('records', [{}]) if response.ok else None
 
     def get_svm_cifs_info(self):
         """Retrieve SVM CIFS Information"""
         url = f"{self.BASE_URL}/svm/svms?fields=cifs.ad_domain.fqdn,cifs.enabled,cifs.allowed&return_records=true&return_timeout={REQUEST_TIMEOUT}"
-        response = requests.get(url, headers=HEADERS,
-                                auth=self.AUTH, verify=False)
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
         return response.json() if response.ok else None
 
     def get_svm_uuid(self, svm_name):
         """Retrieve SVM UUID by name"""
         url = f"{self.BASE_URL}/svm/svms?name={svm_name}"
-        response = requests.get(url, headers=HEADERS,
-                                auth=self.AUTH, verify=False)
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
         return response.json().get('records', [{}])[0].get('uuid') if response.ok else None
 
     def get_volumes_by_svm(self, svm_uuid):
         """Retrieve list of volumes for a specified SVM UUID"""
         url = f"{self.BASE_URL}/storage/volumes?svm.uuid={svm_uuid}&is_constituent=false&is_object_store=false&is_svm_root=false&fields=nas.path&return_records=true&return_timeout={REQUEST_TIMEOUT}"
-        response = requests.get(url, headers=HEADERS,
-                                auth=self.AUTH, verify=False)
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
         return response.json().get('records', []) if response.ok else []
 
     def get_svm_domain_info(self, svm_uuid):
         """Retrieve SVM CIFS Information"""
         url = f"{self.BASE_URL}/protocols/cifs/services/{svm_uuid}"
-        response = requests.get(url, headers=HEADERS,
-                                auth=self.AUTH, verify=False)
+        response = self.session.get(url, headers=HEADERS,
+                                    auth=self.AUTH, verify=False)
         return response.json() if response.ok else None
 
     def create_s3_certificate(self, svm_uuid, common_name):
@@ -76,7 +149,7 @@ class ONTAPS3:
             "type": "server",           # Certificate type for S3 service
             "svm": {"uuid": svm_uuid}   # Ties certificate to SVM
         }
-        response = requests.post(
+        response = self.session.post(
             url, json=payload, headers=HEADERS, auth=self.AUTH, verify=False)
         return response.json().get('records', [])[0] if response.ok else []
 
@@ -84,15 +157,21 @@ class ONTAPS3:
         """Get certificate for S3"""
         url = f"{self.BASE_URL}/security/certificates?svm.uuid={svm_uuid}&type=server&fields=uuid,common-name,serial_number"
 
-        response = requests.get(
+        response = self.session.get(
             url, headers=HEADERS, auth=self.AUTH, verify=False)
         return response.json().get('records', []) if response.ok else []
 
+    def get_all_server_certificates(self):
+        """Get all server certificates cluster-wide in one paged query"""
+        url = f"{self.BASE_URL}/security/certificates?type=server&fields=uuid,name,common_name,serial_number," \
+            f"svm.uuid,svm.name,expiry_time&max_records={PAGE_SIZE}&return_timeout={REQUEST_TIMEOUT}"
+        return self.get_all_records(url)
+
     def get_s3_certificate(self, cert_uuid):
         """Get certificate for S3"""
         url = f"{self.BASE_URL}/security/certificates?uuid={cert_uuid}&type=server&fields=uuid,common-name,serial_number"
 
-        response = requests.get(
+        response = self.session.get(
             url, headers=HEADERS, auth=self.AUTH, verify=False)
         return response.json().get('records', [{}])[0] if response.ok else []
 
@@ -115,7 +194,7 @@ class ONTAPS3:
             }
         }
 
-        response = requests.post(
+        response = self.session.post(
             url, json=payload, headers=HEADERS, auth=self.AUTH, verify=False)
         if response.ok:
             console.print(Panel.fit(
@@ -132,7 +211,7 @@ class ONTAPS3:
             "svm.uuid,svm.name,certificate.uuid,certificate.name,buckets.nas_path,buckets.name,buckets.uuid," \
             f"buckets.volume.name,buckets.volume.uuid,buckets.type,buckets.comment&return_records=true&return_timeout={REQUEST_TIMEOUT}"
 
-        response = requests.get(
+        response = self.session.get(
             url, headers=HEADERS, auth=self.AUTH, verify=False)
         return response.json().get('records', []) if response.ok else []
 
@@ -140,7 +219,7 @@ class ONTAPS3:
         """Get S3 Object Server"""
         url = f"{self.BASE_URL}/protocols/s3/services?svm.uuid={svm_uuid}&fields=name,enabled&return_records=true&return_timeout={REQUEST_TIMEOUT}"
 
-        response = requests.get(
+        response = self.session.get(
             url, headers=HEADERS, auth=self.AUTH, verify=False)
         return response.json().get('records', [])[0] if response.ok else []
 
@@ -158,10 +237,634 @@ class ONTAPS3:
             "type": "nas"
         }
 
-        response = requests.post(
+        response = self.session.post(
             url, json=payload, headers=HEADERS, auth=self.AUTH, verify=False)
 
-        return response.json().get('records', [])[0] if response.ok else []
+        # With return_timeout=0 the bucket may still be in a job and no record is returned
+        return next(iter(response.json().get('records', [])), payload) if response.ok else []
+
+    def get_all_volumes(self):
+        """Retrieve all NAS volumes cluster-wide in one paged query"""
+        url = f"{self.BASE_URL}/storage/volumes?is_constituent=false&is_object_store=false&is_svm_root=false" \
+            f"&fields=uuid,name,svm.uuid,svm.name,nas.path&max_records={PAGE_SIZE}&return_timeout={REQUEST_TIMEOUT}"
+        return self.get_all_records(url)
+
+
+    def get_all_buckets(self):
+        """Retrieve every S3 bucket cluster-wide with its volume and policy in one paged query"""
+        url = f"{self.BASE_URL}/protocols/s3/buckets?fields=name,uuid,type,nas_path,svm.uuid,svm.name,volume.uuid," \
+            f"volume.name,logical_used_size,policy.statements&max_records={PAGE_SIZE}&return_timeout={REQUEST_TIMEOUT}"
+        return self.get_all_records(url)
+
+    def get_volume_space(self):
+        """Retrieve space usage of all volumes cluster-wide in one paged query"""
+        url = f"{self.BASE_URL}/storage/volumes?is_constituent=false&fields=uuid,space.size,space.used,space.available" \
+            f"&max_records={PAGE_SIZE}&return_timeout={REQUEST_TIMEOUT}"
+        return self.get_all_records(url)
+
+    def get_s3_users(self, svm_uuid):
+        """Retrieve the S3 users of an SVM's object server"""
+        url = f"{self.BASE_URL}/protocols/s3/services/{svm_uuid}/users?fields=name&max_records={PAGE_SIZE}"
+        return self.get_all_records(url)
+
+
+    def get_svm_buckets(self, svm_uuid):
+        """Retrieve the buckets of an SVM's object server with their policies"""
+        url = f"{self.BASE_URL}/protocols/s3/services/{svm_uuid}/buckets?fields=name,uuid,policy.statements" \
+            f"&max_records={PAGE_SIZE}"
+        return self.get_all_records(url)
+
+    def create_s3_user(self, svm_uuid, user_name):
+        """Create an S3 user; the returned record holds its access and secret keys"""
+        url = f"{self.BASE_URL}/protocols/s3/services/{svm_uuid}/users?return_records=true"
+        response = self.session.post(
+            url, json={"name": user_name, "comment": "Created by setup-s3-protocol"},
+            headers=HEADERS, auth=self.AUTH, verify=False)
+        return next(iter(response.json().get('records', [])), {}) if response.ok else None
+
+    def set_bucket_policy(self, svm_uuid, bucket_uuid, statements):
+        """Replace a bucket's policy statements"""
+        url = f"{self.BASE_URL}/protocols/s3/services/{svm_uuid}/buckets/{bucket_uuid}"
+        response = self.session.patch(
+            url, json={"policy": {"statements": statements}}, headers=HEADERS, auth=self.AUTH, verify=False)
+        return response.ok
+
+
+INVENTORY_COLUMNS = ("svm", "bucket", "type", "nas_path", "volume", "volume_uuid", "volume_size",
+                     "volume_used", "volume_available", "bucket_logical_used", "policy_statements",
+                     "svm_s3_users", "buckets_on_volume", "shared_volume")
+
+
+def bucket_inventory(s3):
+    """
+    Yield one inventory row per bucket
+
+    Buckets, volume space and per-SVM S3 users are each read with collection queries and
+    joined locally; no per-bucket requests are made. Volumes backing more than one bucket
+    are flagged with shared_volume.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        buckets_future = pool.submit(lambda: [
+            (b.get('svm', {}).get('uuid'), b.get('svm', {}).get('name'), b.get('name'), b.get('type'),
+             b.get('nas_path'), b.get('volume', {}).get('uuid'), b.get('volume', {}).get('name'),
+             b.get('logical_used_size'), len(b.get('policy', {}).get('statements', [])))
+            for b in s3.get_all_buckets()])
+        space_future = pool.submit(lambda: {
+            v['uuid']: (v.get('space', {}).get('size'), v.get('space', {}).get('used'),
+                        v.get('space', {}).get('available'))
+            for v in s3.get_volume_space()})
+        buckets, space = buckets_future.result(), space_future.result()
+
+    svm_uuids = {bucket[0] for bucket in buckets}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        users = dict(zip(svm_uuids, pool.map(lambda uuid: sum(1 for _ in s3.get_s3_users(uuid)), svm_uuids)))
+
+    per_volume = {}
+    for bucket in buckets:
+        per_volume[bucket[5]] = per_volume.get(bucket[5], 0) + 1
+
+    for svm_uuid, svm_name, name, bucket_type, nas_path, volume_uuid, volume_name, logical_used, statements in buckets:
+        size, used, available = space.get(volume_uuid, (None, None, None))
+        yield dict(zip(INVENTORY_COLUMNS, (
+            svm_name, name, bucket_type, nas_path, volume_name, volume_uuid, size, used, available,
+            logical_used, statements, users.get(svm_uuid, 0), per_volume.get(volume_uuid, 0),
+            per_volume.get(volume_uuid, 0) > 1)))
+
+
+def write_inventory(rows, output_format, output=None):
+    """Write inventory rows as CSV or JSON lines, returning the number of rows written"""
+    handle = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+    count = 0
+    try:
+        writer = None
+        if output_format == "csv":
+            writer = csv.DictWriter(handle, fieldnames=INVENTORY_COLUMNS)
+            writer.writeheader()
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                handle.write(json.dumps(row) + "\n")
+            count += 1
+    finally:
+        if handle is not sys.stdout:
+            handle.close()
+    return count
+
+
+class KeyStore:
+    """
+    Passphrase-encrypted local file holding S3 access keys
+
+    The file is JSON with the PBKDF2 salt and iteration count and a Fernet token of the
+    key records, so secrets never touch disk in clear text.
+    """
+
+    def __init__(self, path, passphrase):
+        self.path = path
+        self.passphrase = passphrase.encode()
+
+    def _fernet(self, salt, iterations):
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(self.passphrase)))
+
+    def load(self):
+        """Return the stored key records, or an empty list if the file does not exist"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        fernet = self._fernet(base64.b64decode(data['salt']), data['iterations'])
+        return json.loads(fernet.decrypt(data['token'].encode()))
+
+    def add(self, records):
+        """Merge new key records into the file and re-encrypt it with a fresh salt"""
+        existing = self.load()
+        salt = os.urandom(16)
+        token = self._fernet(salt, KEY_FILE_ITERATIONS).encrypt(json.dumps(existing + records).encode())
+        tmp_path = f"{self.path}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as handle:
+            json.dump({"salt": base64.b64encode(salt).decode(), "iterations": KEY_FILE_ITERATIONS,
+                       "token": token.decode()}, handle)
+        os.replace(tmp_path, self.path)
+
+
+class IdentityProvisioner:
+    """
+    Bulk S3 user and bucket policy provisioning
+
+    For each SVM the manifest lists the S3 users to create (default: S3_USER) and the
+    bucket policies to attach. Existing users and buckets are read once per SVM, users
+    are created concurrently with their keys captured in a KeyStore, and bucket policies
+    are applied afterwards so statements may reference the new users.
+
+        {"svms": [{"name": "fsx", "users": ["s3user", "analytics"],
+                   "bucket_policies": [{"bucket": "vol1-bucket", "statements": [
+                       {"effect": "allow", "actions": ["GetObject", "ListBucket"],
+                        "principals": ["analytics"], "resources": ["vol1-bucket", "vol1-bucket/*"]}]}]}]}
+    """
+
+    def __init__(self, s3, manifest, key_store):
+        self.s3 = s3
+        self.manifest = manifest
+        self.key_store = key_store
+
+    def read_state(self, svm_uuid):
+        """Return (existing user names, {bucket name: bucket}) for one SVM"""
+        users = {user.get('name') for user in self.s3.get_s3_users(svm_uuid)}
+        buckets = {bucket.get('name'): bucket for bucket in self.s3.get_svm_buckets(svm_uuid)}
+        return users, buckets
+
+    def run(self):
+        """Provision users and policies; returns the report, or None if the key file or state cannot be read"""
+        started = time.monotonic()
+        # Secret keys are only returned once, so make sure they can be saved before creating anyone
+        try:
+            self.key_store.load()
+        except (InvalidToken, ValueError, KeyError) as err:
+            console.print(Panel.fit(f"Cannot open key file {self.key_store.path} (wrong passphrase or damaged "
+                                    f"file): {err!r}", title="Operation Status"))
+            return None
+        svms = {svm['name']: svm['uuid'] for svm in (self.s3.get_svms() or []) if svm.get('name')}
+        entries = [entry for entry in self.manifest['svms'] if entry['name'] in svms]
+        for entry in self.manifest['svms']:
+            if entry['name'] not in svms:
+                console.print(Panel.fit(f"SVM '{entry['name']}' not found", title="Operation Status"))
+
+        report = {"users_created": 0, "users_existing": 0, "users_failed": 0,
+                  "policies_applied": 0, "policies_unchanged": 0, "policies_failed": 0}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            try:
+                states = dict(zip((e['name'] for e in entries),
+                                  pool.map(lambda e: self.read_state(svms[e['name']]), entries)))
+            except requests.exceptions.RequestException as err:
+                console.print(Panel.fit(f"Cannot read existing S3 users and buckets: {err}",
+                                        title="Operation Status"))
+                return None
+
+            # Users first, so that policies can reference them
+            user_tasks = {}
+            for entry in entries:
+                existing, _ = states[entry['name']]
+                for user_name in entry.get('users', [S3_USER]):
+                    if user_name in existing:
+                        report["users_existing"] += 1
+                    else:
+                        future = pool.submit(self.s3.create_s3_user, svms[entry['name']], user_name)
+                        user_tasks[future] = (entry['name'], user_name)
+
+            keys = []
+            try:
+                for future in as_completed(user_tasks):
+                    svm_name, user_name = user_tasks[future]
+                    try:
+                        record = future.result()
+                        reason = "request rejected" if record is None else "no keys returned"
+                    except (requests.exceptions.RequestException, ValueError) as err:
+                        record, reason = None, str(err)
+                    if not record:
+                        # An empty record means the user may exist but its keys were not returned
+                        report["users_failed"] += 1
+                        console.print(Panel.fit(f"Failed to create S3 user {user_name} on {svm_name} "
+                                                f"or capture its keys: {reason}", title="Operation Status"))
+                        continue
+                    report["users_created"] += 1
+                    keys.append({"svm": svm_name, "user": user_name, "access_key": record.get('access_key'),
+                                 "secret_key": record.get('secret_key')})
+            finally:
+                # Save whatever was created, even if collecting the remaining results failed
+                if keys:
+                    self.key_store.add(keys)
+
+            policy_tasks = {}
+            for entry in entries:
+                _, buckets = states[entry['name']]
+                for policy in entry.get('bucket_policies', []):
+                    bucket = buckets.get(policy['bucket'])
+                    if not bucket:
+                        report["policies_failed"] += 1
+                        console.print(Panel.fit(f"Bucket {policy['bucket']} not found on {entry['name']}",
+                                                title="Operation Status"))
+                    elif bucket.get('policy', {}).get('statements') == policy['statements']:
+                        report["policies_unchanged"] += 1
+                    else:
+                        future = pool.submit(self.s3.set_bucket_policy, svms[entry['name']],
+                                             bucket['uuid'], policy['statements'])
+                        policy_tasks[future] = (entry['name'], policy['bucket'])
+
+            for future in as_completed(policy_tasks):
+                svm_name, bucket_name = policy_tasks[future]
+                try:
+                    applied = future.result()
+                    reason = "request rejected"
+                except requests.exceptions.RequestException as err:
+                    applied, reason = False, str(err)
+                if applied:
+                    report["policies_applied"] += 1
+                else:
+                    report["policies_failed"] += 1
+                    console.print(Panel.fit(f"Failed to apply the policy of bucket {bucket_name} on {svm_name}: "
+                                            f"{reason}", title="Operation Status"))
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        return report
+
+
+class CertificatePlanner:
+    """
+    Reuses existing server certificates and creates only the missing ones
+
+    All server certificates are loaded with a single cluster-wide query and indexed by
+    SVM UUID and common name. Certificates expiring within CERT_MIN_VALIDITY_DAYS are
+    not reused.
+    """
+
+    def __init__(self, s3, min_validity_days=CERT_MIN_VALIDITY_DAYS):
+        self.s3 = s3
+        self.min_validity = timedelta(days=min_validity_days)
+        self.index = {}
+
+    def load(self):
+        """Index all valid server certificates by (svm uuid, common name)"""
+        cutoff = datetime.now(timezone.utc) + self.min_validity
+        self.index = {}
+        for cert in self.s3.get_all_server_certificates():
+            expiry = cert.get('expiry_time')
+            if expiry and datetime.fromisoformat(expiry.replace('Z', '+00:00')) < cutoff:
+                continue
+            svm_uuid = cert.get('svm', {}).get('uuid')
+            self.index.setdefault((svm_uuid, cert.get('common_name')), cert)
+        return self
+
+    def find(self, svm_uuid, common_name):
+        return self.index.get((svm_uuid, common_name))
+
+    def plan(self, wanted):
+        """
+        Split wanted (svm uuid, common name) pairs into reusable and missing certificates
+
+        Returns ({svm uuid: certificate}, [(svm uuid, common name)])
+        """
+        reuse, missing = {}, []
+        for svm_uuid, common_name in wanted:
+            cert = self.find(svm_uuid, common_name)
+            if cert:
+                reuse[svm_uuid] = cert
+            else:
+                missing.append((svm_uuid, common_name))
+        return reuse, missing
+
+    def provision(self, wanted):
+        """Return {svm uuid: certificate}, creating missing certificates concurrently"""
+        certificates, missing = self.plan(wanted)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {pool.submit(self.s3.create_s3_certificate, svm_uuid, common_name): (svm_uuid, common_name)
+                       for svm_uuid, common_name in missing}
+            for future in as_completed(futures):
+                svm_uuid, common_name = futures[future]
+                created = future.result()
+                if created:
+                    # The POST response already holds the certificate, no need to read it back
+                    created.setdefault('common_name', common_name)
+                    self.index[(svm_uuid, common_name)] = created
+                    certificates[svm_uuid] = created
+        return certificates
+
+
+def create_object_servers(s3, servers):
+    """
+    Create object servers concurrently
+
+    Args:
+        s3: ONTAPS3 instance
+        servers: List of (object server name, certificate uuid, svm uuid)
+
+    Returns {svm uuid: object server record} for the servers created
+    """
+    created = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {pool.submit(s3.create_object_server, name, cert_uuid, svm_uuid): svm_uuid
+                   for name, cert_uuid, svm_uuid in servers}
+        for future in as_completed(futures):
+            if server := future.result():
+                created[futures[future]] = server
+    return created
+
+
+def enable_s3_bulk(s3, display, svms, object_servers):
+    """Enable S3 on several SVMs with one set of decisions"""
+    enabled = {server['svm']['uuid'] for server in object_servers}
+    candidates = [svm for svm in svms if svm['uuid'] not in enabled]
+    if not candidates:
+        console.print(Panel("[yellow]All SVMs already have an object server[/yellow]",
+                            title="Empty Result"))
+        return
+
+    selected = display.prompt_multi_options(
+        "[?] Select the SVMs to enable S3 on:", [f"{svm['uuid']} ({svm['name']})" for svm in candidates])
+    selected_svms = [svm for svm in candidates if f"{svm['uuid']} ({svm['name']})" in selected]
+    if not selected_svms:
+        return
+
+    cert_template = display.prompt(
+        "[?] Certificate Common Name template ({svm} is replaced by the SVM name) [s3.{svm}]:") or "s3.{svm}"
+    server_template = display.prompt(
+        "[?] Object Server Name template ({svm} is replaced by the SVM name) [s3.{svm}]:") or "s3.{svm}"
+
+    try:
+        planner = CertificatePlanner(s3).load()
+    except requests.exceptions.RequestException as err:
+        console.print(Panel.fit(f"Cannot read server certificates: {err}", title="Operation Status"))
+        return
+    wanted = [(svm['uuid'], cert_template.format(svm=svm['name'])) for svm in selected_svms]
+    reuse, missing = planner.plan(wanted)
+    console.print(Panel.fit(f"Reusing {len(reuse)} certificate(s), creating {len(missing)}",
+                            title="Certificate Plan"))
+
+    certificates = planner.provision(wanted)
+    servers = [(server_template.format(svm=svm['name']), certificates[svm['uuid']].get('uuid'), svm['uuid'])
+               for svm in selected_svms if svm['uuid'] in certificates]
+    for svm in selected_svms:
+        if svm['uuid'] not in certificates:
+            console.print(Panel.fit(f"Certificate creation failed for {svm['name']}",
+                                    title="Operation Status"))
+
+    created = create_object_servers(s3, servers)
+    console.print(Panel.fit(f"[green]{len(created)} of {len(selected_svms)} object server(s) created[/green]",
+                            title="Completion Status"))
+
+
+class ManifestRunner:
+    """
+    Declarative S3 enablement
+
+    The manifest lists, per SVM, the certificate common name, the object server name and
+    the buckets to expose (bucket name and backing volume name). Current state is read
+    with a handful of collection queries, only missing objects are created, and SVMs are
+    processed in parallel while each SVM follows certificate -> server -> buckets order.
+    Every completed step is written to the checkpoint journal, so a resumed run reuses
+    the recorded certificate and skips buckets whose creation was already accepted.
+
+        {"svms": [{"name": "fsx", "certificate_common_name": "s3.fsx",
+                   "object_server": "s3.fsx",
+                   "buckets": [{"name": "vol1-bucket", "volume": "vol1"}]}]}
+    """
+
+    def __init__(self, s3, manifest, journal=None):
+        self.s3 = s3
+        self.manifest = manifest
+        self.journal = journal or CheckpointJournal(None)
+        self.svms = {}
+        self.servers = {}
+        self.volumes = VolumeTable()
+        self.volume_rows = {}
+        self.planner = CertificatePlanner(s3)
+
+    def read_state(self):
+        """Load SVMs, object servers with buckets, certificates and volumes"""
+        self.svms = {svm['name']: svm for svm in (self.s3.get_svms() or []) if svm.get('name')}
+        self.servers = {server['svm']['uuid']: server for server in self.s3.get_s3_object_servers()}
+        self.planner.load()
+        # Decoded page by page into compact columns instead of keeping every volume's JSON
+        self.volumes = VolumeTable(self.s3.get_all_volumes())
+        self.volume_rows = self.volumes.index("svm_uuid", "name")
+
+    def plan(self, entry):
+        """Return the list of actions needed for one manifest SVM entry"""
+        svm = self.svms.get(entry['name'])
+        if not svm:
+            return [("error", f"SVM '{entry['name']}' not found")]
+        actions = []
+        server = self.servers.get(svm['uuid'])
+        if not server:
+            if not self.planner.find(svm['uuid'], entry['certificate_common_name']):
+                actions.append(("certificate", entry['certificate_common_name']))
+            actions.append(("object_server", entry['object_server']))
+        existing = {bucket.get('name') for bucket in (server or {}).get('buckets', [])}
+        for bucket in entry.get('buckets', []):
+            if bucket['name'] not in existing:
+                actions.append(("bucket", bucket['name']))
+        return actions
+
+    def apply(self, entry):
+        """Create the missing objects for one SVM in dependency order and return its report"""
+        report = {"svm": entry['name'], "steps": []}
+        svm = self.svms.get(entry['name'])
+        if not svm:
+            report["error"] = "SVM not found"
+            return report
+
+        def step(kind, name, action, started, **extra):
+            report["steps"].append({"type": kind, "name": name, "action": action,
+                                    "seconds": round(time.monotonic() - started, 3), **extra})
+
+        journal = self.journal
+        if svm['uuid'] not in self.servers:
+            started = time.monotonic()
+            common_name = entry['certificate_common_name']
+            checkpoint = f"{svm['uuid']}:certificate:{common_name}"
+            certificate = journal.get(checkpoint) or self.planner.find(svm['uuid'], common_name)
+            if journal.done(checkpoint):
+                step("certificate", common_name, "resumed", started, uuid=certificate.get('uuid'))
+            elif certificate:
+                step("certificate", common_name, "reused", started, uuid=certificate.get('uuid'))
+                journal.record(checkpoint, uuid=certificate.get('uuid'))
+            else:
+                certificate = self.s3.create_s3_certificate(svm['uuid'], common_name)
+                if not certificate:
+                    step("certificate", common_name, "failed", started)
+                    return report
+                step("certificate", common_name, "created", started, uuid=certificate.get('uuid'))
+                journal.record(checkpoint, uuid=certificate.get('uuid'))
+
+            started = time.monotonic()
+            server = self.s3.create_object_server(entry['object_server'], certificate.get('uuid'), svm['uuid'])
+            if not server:
+                step("object_server", entry['object_server'], "failed", started)
+                return report
+            step("object_server", entry['object_server'], "created", started)
+            journal.record(f"{svm['uuid']}:object_server", name=entry['object_server'])
+            existing = set()
+        else:
+            existing = {bucket.get('name') for bucket in self.servers[svm['uuid']].get('buckets', [])}
+
+        for bucket in entry.get('buckets', []):
+            started = time.monotonic()
+            checkpoint = f"{svm['uuid']}:bucket:{bucket['name']}"
+            if bucket['name'] in existing:
+                step("bucket", bucket['name'], "exists", started)
+                continue
+            if journal.done(checkpoint):
+                # Accepted by a previous run; its job may still be finishing
+                step("bucket", bucket['name'], "resumed", started)
+                continue
+            row = self.volume_rows.get((svm['uuid'], bucket['volume']))
+            volume = self.volumes.to_rest(row) if row is not None else None
+            if not volume or not volume.get('nas', {}).get('path'):
+                step("bucket", bucket['name'], "failed", started, error=f"volume '{bucket['volume']}' has no junction path")
+                continue
+            created = self.s3.create_bucket(volume, bucket['name'])
+            step("bucket", bucket['name'], "created" if created else "failed", started)
+            if created:
+                journal.record(checkpoint, volume=volume.get('uuid'))
+        return report
+
+    def run(self, plan_only=False):
+        """Read state, then plan or apply every manifest entry; returns the report"""
+        started = time.monotonic()
+        self.read_state()
+        report = {"read_seconds": round(time.monotonic() - started, 3), "svms": []}
+
+        entries = self.manifest['svms']
+        if plan_only:
+            report["svms"] = [{"svm": entry['name'], "actions": [{"type": kind, "name": name}
+                                                                  for kind, name in self.plan(entry)]}
+                              for entry in entries]
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+                report["svms"] = list(pool.map(self.apply, entries))
+
+        report["total_seconds"] = round(time.monotonic() - started, 3)
+        return report
+
+
+class LazyPicker:
+    """
+    Paginated picker that fetches pages only when the user reaches them
+
+    Searching sends a server-side name=*term* query instead of filtering a full list.
+    Pages already fetched are cached per search term, so paging back and forth or
+    repeating a search does not hit the API again.
+    """
+
+    NEXT = "» Next page"
+    PREVIOUS = "« Previous page"
+    SEARCH = "🔍 Search by name"
+    CLEAR = "✖ Clear search"
+
+    def __init__(self, s3, display, first_page_url):
+        self.s3 = s3
+        self.display = display
+        self.first_page_url = first_page_url
+        self.cache = {}   # term -> {"pages": [records, ...], "next": url}
+
+    def page(self, term, index):
+        """Return page `index` for a search term, fetching pages up to it as needed"""
+        entry = self.cache.setdefault(term, {"pages": [], "next": self.first_page_url(term)})
+        while len(entry["pages"]) <= index and entry["next"]:
+            records, entry["next"] = self.s3.get_page(entry["next"])
+            entry["pages"].append(records)
+        return entry["pages"][index] if index < len(entry["pages"]) else []
+
+    def has_next(self, term, index):
+        entry = self.cache.get(term, {})
+        return index + 1 < len(entry.get("pages", [])) or bool(entry.get("next"))
+
+    def is_empty(self):
+        return not self.page(None, 0)
+
+    def pick(self, prompt):
+        """Prompt until a record is selected and return it"""
+        term, index = None, 0
+        while True:
+            records = self.page(term, index)
+            labels = {f"{rec['uuid']} ({rec['name']})": rec for rec in records}
+            choices = list(labels)
+            if not records:
+                console.print(Panel(f"[yellow]No matches for '{term}'[/yellow]", title="Empty Result"))
+            if self.has_next(term, index):
+                choices.append(self.NEXT)
+            if index > 0:
+                choices.append(self.PREVIOUS)
+            choices.append(self.SEARCH)
+            if term:
+                choices.append(self.CLEAR)
+
+            title = f"{prompt} (page {index + 1}{f', search: {term}' if term else ''})"
+            selected = self.display.prompt_options(title, choices)
+            if selected == self.NEXT:
+                index += 1
+            elif selected == self.PREVIOUS:
+                index -= 1
+            elif selected == self.SEARCH:
+                term, index = self.display.prompt("[?] Name contains:") or None, 0
+            elif selected == self.CLEAR:
+                term, index = None, 0
+            else:
+                return labels[selected]
+
+
+class DashboardState:
+    """SVM and object server data shared between the fetch thread and the renderer"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.svms = []
+        self.servers = {}
+        self.version = 0
+        self.fetched_at = None
+        self.fetch_seconds = 0.0
+        self.error = None
+
+    def refresh(self, s3):
+        """Fetch SVMs and object servers concurrently and publish them atomically"""
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                svms = pool.submit(lambda: list(s3.get_all_records(s3.svm_page_url(page_size=PAGE_SIZE))))
+                servers = pool.submit(s3.get_s3_object_servers)
+                svms, servers = svms.result(), servers.result()
+        except requests.RequestException as err:
+            with self.lock:
+                self.error = str(err)
+            return
+        with self.lock:
+            self.svms = svms
+            self.servers = {server['svm']['uuid']: server for server in servers}
+            self.version += 1
+            self.fetched_at = datetime.now()
+            self.fetch_seconds = time.monotonic() - started
+            self.error = None
 
 
 class Display:
@@ -183,34 +886,121 @@ class Display:
         detail_table.add_row(
             "Https Enabled:", f"{object_server.get('is_http_enabled', 'N/A')}")
 
-        panels = []
-        if not (object_server.get('buckets', [])):
-            bucket_table = Table.grid(padding=1)
-            bucket_table.add_row("[blue]No buckets found[/blue]")
-            panels.append(bucket_table)
-
-        for bucket in object_server.get('buckets', []):
-            bucket_table = Table.grid(padding=1)
-            bucket_table.add_column(style="bold cyan")
-            bucket_table.add_column(style="bold green")
-            bucket_table.add_row("NAS Path:", bucket.get('nas_path', 'N/A'))
-            bucket_table.add_row("Volume:", bucket.get(
-                'volume', {}).get('name', 'N/A'))
-            bucket_table.add_row("Volume UUID:", bucket.get(
-                'volume', {}).get('uuid', 'N/A'))
-            bucket_table.add_row("Comment:", bucket.get('comment', 'N/A'))
-            panels.append(Panel.fit(bucket_table,
-                                    title=f"[bold]Bucket - {bucket.get('name', 'N/A')}[/bold]",
-                                    border_style="bright_yellow"))
-
         detail_table.add_row("Buckets:", "")
-        for panel in panels:
-            detail_table.add_row("", panel)
+        detail_table.add_row("", self.bucket_table(object_server.get('buckets', [])))
 
         console.print(Panel.fit(detail_table,
                                 title="[bold]Object Server Details[/bold]",
                                 border_style="bright_yellow"))
 
+    def bucket_table(self, buckets, page=0, page_size=BUCKET_PAGE_SIZE, show_svm=False):
+        """Render one page of buckets as a single table instead of one Panel per bucket"""
+        if not buckets:
+            empty = Table.grid(padding=0)
+            empty.add_row("[blue]No buckets found[/blue]")
+            return empty
+
+        pages = max(1, (len(buckets) + page_size - 1) // page_size)
+        page = page % pages
+        table = Table(border_style="purple3", header_style="bold purple3", show_edge=True,
+                      caption=f"Buckets {page * page_size + 1}-{min(len(buckets), (page + 1) * page_size)}"
+                              f" of {len(buckets)} (page {page + 1}/{pages})" if pages > 1 else None)
+        if show_svm:
+            table.add_column("SVM")
+        table.add_column("Bucket", style="bold dodger_blue3")
+        table.add_column("Type")
+        table.add_column("NAS Path")
+        table.add_column("Volume")
+        table.add_column("Volume UUID")
+        table.add_column("Comment")
+        for bucket in buckets[page * page_size:(page + 1) * page_size]:
+            cells = [bucket.get('svm_name', 'N/A')] if show_svm else []
+            table.add_row(*cells, bucket.get('name', 'N/A'), bucket.get('type', 'N/A'), bucket.get('nas_path', 'N/A'),
+                          bucket.get('volume', {}).get('name', 'N/A'), bucket.get('volume', {}).get('uuid', 'N/A'),
+                          bucket.get('comment', 'N/A'))
+        return table
+
+    def dashboard_view(self, state, bucket_page, max_rows):
+        """Build the dashboard renderable from a consistent snapshot of the state"""
+        with state.lock:
+            svms, servers = list(state.svms), dict(state.servers)
+            fetched_at, fetch_seconds, error = state.fetched_at, state.fetch_seconds, state.error
+
+        summary = Table(title="Storage Virtual Machines", border_style="bright_blue",
+                        header_style="bold bright_blue", expand=True)
+        summary.add_column("SVM", style="bold dodger_blue3")
+        summary.add_column("CIFS")
+        summary.add_column("Object Server")
+        summary.add_column("Enabled")
+        summary.add_column("HTTP/HTTPS")
+        summary.add_column("Buckets", justify="right")
+        for svm in svms[:max_rows]:
+            server = servers.get(svm.get('uuid'))
+            cifs = svm.get('cifs', {})
+            summary.add_row(
+                svm.get('name', 'N/A'),
+                cifs.get('ad_domain', {}).get('fqdn', '-') if cifs.get('enabled') else '-',
+                server.get('name', 'N/A') if server else '[yellow]none[/yellow]',
+                str(server.get('enabled', 'N/A')) if server else '-',
+                f"{server.get('port', '-')}/{server.get('secure_port', '-')}" if server else '-',
+                str(len(server.get('buckets', []))) if server else '0')
+        if len(svms) > max_rows:
+            summary.caption = f"Showing {max_rows} of {len(svms)} SVMs"
+
+        # Page through all buckets across object servers, one table page per refresh cycle
+        buckets = [dict(bucket, svm_name=server.get('svm', {}).get('name', 'N/A'))
+                   for server in servers.values() for bucket in server.get('buckets', [])]
+        status = (f"Updated {fetched_at:%H:%M:%S} in {fetch_seconds:.2f}s" if fetched_at else "Loading...")
+        if error:
+            status += f" [red]({error})[/red]"
+
+        grid = Table.grid(expand=True)
+        grid.add_row(summary)
+        grid.add_row(self.bucket_table(buckets, page=bucket_page, page_size=max_rows, show_svm=True))
+        return Panel(grid, title="[reverse] FSx for ONTAP S3 Dashboard [/]", subtitle=status,
+                     border_style="bright_blue")
+
+    def dashboard(self, s3, interval=30, page_seconds=5):
+        """
+        Live dashboard of SVMs, object servers and buckets
+
+        Data is refreshed by a background thread every `interval` seconds; the view is only
+        rebuilt when new data arrives or the bucket page advances. If building a frame
+        exceeds FRAME_BUDGET the number of rows rendered per table is reduced.
+        """
+        state = DashboardState()
+        stop = threading.Event()
+
+        def fetch():
+            while not stop.is_set():
+                state.refresh(s3)
+                stop.wait(interval)
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+        max_rows = BUCKET_PAGE_SIZE
+        bucket_page = 0
+        rendered = (None, None)
+        page_started = time.monotonic()
+        with Live(console=console, refresh_per_second=4, screen=False) as live:
+            try:
+                while True:
+                    if time.monotonic() - page_started >= page_seconds:
+                        bucket_page += 1
+                        page_started = time.monotonic()
+                    if rendered != (state.version, bucket_page):
+                        started = time.monotonic()
+                        live.update(self.dashboard_view(state, bucket_page, max_rows), refresh=True)
+                        frame = time.monotonic() - started
+                        if frame > FRAME_BUDGET and max_rows > 5:
+                            max_rows = max(5, max_rows // 2)
+                        elif frame < FRAME_BUDGET / 4 and max_rows < BUCKET_PAGE_SIZE:
+                            max_rows = min(BUCKET_PAGE_SIZE, max_rows * 2)
+                        rendered = (state.version, bucket_page)
+                    time.sleep(0.25)
+            except KeyboardInterrupt:
+                stop.set()
+
     def volume_details(self, volume):
         """Display volume details in a rich panel"""
         detail_table = Table.grid(padding=1)
@@ -266,32 +1056,8 @@ class Display:
             detail_table.add_row(
                 "Https Enabled:", f"{object_server.get('is_http_enabled', 'N/A')}")
 
-            panels = []
-            if not (object_server.get('buckets', [])):
-                bucket_table = Table.grid(padding=0)
-                bucket_table.add_row("[blue]No buckets found[/blue]")
-                panels.append(bucket_table)
-
-            for bucket in object_server.get('buckets', []):
-                bucket_table = Table.grid(
-                    pad_edge=True, padding=(0, 0))
-                bucket_table.add_column(style="bold purple3")
-                bucket_table.add_column(style="bold dodger_blue3")
-                bucket_table.add_row(
-                    "NAS Path:", bucket.get('nas_path', 'N/A'))
-                bucket_table.add_row("Type:", bucket.get('type', 'N/A'))
-                bucket_table.add_row("Volume:", bucket.get(
-                    'volume', {}).get('name', 'N/A'))
-                bucket_table.add_row("Volume UUID:", bucket.get(
-                    'volume', {}).get('uuid', 'N/A'))
-                bucket_table.add_row("Comment:", bucket.get('comment', 'N/A'))
-                panels.append(Panel.fit(bucket_table,
-                                        title=f"[bold]\_/ Bucket - {bucket.get('name', 'N/A')}[/bold]",
-                                        border_style="purple3"))
-
             detail_table.add_row("Buckets ==>>", "")
-            for panel in panels:
-                detail_table.add_row("", panel)
+            detail_table.add_row("", self.bucket_table(object_server.get('buckets', [])))
 
             svm_table.add_row(Panel.fit(detail_table,
                                         title="[bold]Object Server Details[/bold]",
@@ -338,6 +1104,15 @@ class Display:
             amark="➤"
         ).execute()
 
+    def prompt_multi_options(self, prompt, choices):
+        return inquirer.checkbox(
+            message=prompt,
+            choices=choices,
+            qmark="📦",
+            amark="➤",
+            pointer="👉"
+        ).execute()
+
     def prompt_options(self, prompt, choices):
         return inquirer.select(
             message=prompt,
@@ -348,7 +1123,110 @@ class Display:
         ).execute()
 
 
+def connect(args):
+    """Build the API client from --host/--user and ONTAP_PASSWORD (or a prompt)"""
+    password = os.environ.get("ONTAP_PASSWORD") or Display().secure_prompt("[?] Enter the ONTAP Password:")
+    return ONTAPS3(f'https://{args.host}/api', HTTPBasicAuth(args.user, password))
+
+
+def run_manifest(args):
+    """Non-interactive mode driven by a JSON manifest"""
+    s3 = connect(args)
+
+    with open(args.manifest, encoding="utf-8") as handle:
+        manifest = json.load(handle)
+
+    journal = None if args.plan_only else CheckpointJournal(args.checkpoint, fresh=args.fresh)
+    try:
+        report = ManifestRunner(s3, manifest, journal).run(plan_only=args.plan_only)
+    except requests.exceptions.RequestException as err:
+        console.print(Panel.fit(f"Cannot read the current S3 configuration: {err}", title="Operation Status"))
+        sys.exit(1)
+    output = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as handle:
+            handle.write(output)
+    else:
+        print(output)
+
+    failed = any(step['action'] == 'failed' for svm in report['svms'] for step in svm.get('steps', []))
+    failed = failed or any('error' in svm for svm in report['svms'])
+    if journal and not failed:
+        journal.complete()
+    sys.exit(1 if failed else 0)
+
+
+def key_store_passphrase():
+    return os.environ.get("S3_KEYS_PASSPHRASE") or Display().secure_prompt(
+        "[?] Enter the passphrase protecting the S3 key file:")
+
+
+def run_identities(args):
+    """Create S3 users and bucket policies from a manifest"""
+    s3 = connect(args)
+    with open(args.identities, encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    report = IdentityProvisioner(s3, manifest, KeyStore(args.key_file, key_store_passphrase())).run()
+    if report is None:
+        sys.exit(1)
+    console.print_json(json.dumps(report))
+    failed = report["users_failed"] or report["policies_failed"]
+    sys.exit(1 if failed else 0)
+
+
+def run_inventory(args):
+    """Write the bucket inventory and usage report"""
+    started = time.monotonic()
+    rows = bucket_inventory(connect(args))
+    try:
+        count = write_inventory(rows, args.inventory, args.output)
+    except requests.exceptions.RequestException as err:
+        # The report would silently miss buckets, volumes or users
+        console.print(Panel.fit(f"Inventory incomplete, reading from ONTAP failed: {err}",
+                                title="Operation Status"))
+        sys.exit(1)
+    if args.output:
+        console.print(f"[green]{count} bucket(s) written in {time.monotonic() - started:.2f}s[/green]")
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Enable S3 Protocol on NAS volumes')
+    parser.add_argument('--manifest', help='JSON manifest for non-interactive mode')
+    parser.add_argument('--identities', help='JSON manifest of S3 users and bucket policies to provision')
+    parser.add_argument('--key-file', default='s3-keys.enc', help='Encrypted file receiving new S3 access keys')
+    parser.add_argument('--show-keys', action='store_true', help='Decrypt and print the key file')
+    parser.add_argument('--inventory', choices=['csv', 'jsonl'],
+                        help='Write a bucket inventory and usage report in this format')
+    parser.add_argument('--output', help='Inventory output file (default: stdout)')
+    parser.add_argument('--dashboard', action='store_true', help='Show a live dashboard of SVMs, object servers and buckets')
+    parser.add_argument('--refresh', type=int, default=30, help='Dashboard data refresh interval in seconds')
+    parser.add_argument('--host', help='FSxN management endpoint (non-interactive modes)')
+    parser.add_argument('--user', default='fsxadmin', help='ONTAP username (non-interactive modes)')
+    parser.add_argument('--report', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--plan-only', action='store_true', help='Only report the objects that would be created')
+    parser.add_argument('--checkpoint', default='s3-setup.checkpoint',
+                        help='Checkpoint journal used to resume an interrupted manifest run or wizard')
+    parser.add_argument('--fresh', action='store_true', help='Ignore any existing checkpoint and start over')
+    args = parser.parse_args()
+
+    if args.show_keys:
+        console.print_json(json.dumps(KeyStore(args.key_file, key_store_passphrase()).load()))
+        return
+    if (args.manifest or args.dashboard or args.inventory or args.identities) and not args.host:
+        parser.error("--host is required with --manifest, --identities, --dashboard or --inventory")
+    if args.manifest:
+        run_manifest(args)
+        return
+    if args.dashboard:
+        Display().dashboard(connect(args), interval=args.refresh)
+        return
+    if args.inventory:
+        run_inventory(args)
+        return
+    if args.identities:
+        run_identities(args)
+        return
+
     display = Display()
 
     # Welcome screen
@@ -368,18 +1246,21 @@ def main():
 
     # Initialize ONTAP S3 API
     s3 = ONTAPS3(BASE_URL, AUTH)
+    journal = CheckpointJournal(args.checkpoint, fresh=args.fresh)
 
     # Get and display SVMs
-    if not (svms := s3.get_svms()):
+    svm_picker = LazyPicker(s3, display, s3.svm_page_url)
+    if svm_picker.is_empty():
         console.print(Panel("[yellow]No SVMs found[/yellow]",
                             title="Empty Result"))
         return
 
-    while True:
-        selected_svm = display.prompt_options(
-            "[?] Select a SVM:", [f"{svm['uuid']} ({svm['name']})" for svm in svms]).split(" ")[0]
+    if display.prompt("[?] Enable S3 on multiple SVMs at once?").lower() == "y":
+        enable_s3_bulk(s3, display, s3.get_svms(), s3.get_s3_object_servers())
 
-        svm = next(v for v in svms if v['uuid'] == selected_svm)
+    while True:
+        svm = svm_picker.pick("[?] Select a SVM:")
+        selected_svm = svm['uuid']
 
         # Get Domain Info
         cifs_info = None
@@ -393,7 +1274,12 @@ def main():
 
         display.svm_info_table(svm, cifs_info, object_server)
 
-        if not object_server:
+        if not object_server and journal.done(f"{selected_svm}:certificate"):
+            # Certificate created before the previous run was interrupted
+            certificate = journal.get(f"{selected_svm}:certificate")
+            console.print(Panel.fit(f"Reusing certificate {certificate['uuid']} from the checkpoint",
+                                    title="Resumed"))
+        elif not object_server:
             certificates = s3.get_s3_certificates(selected_svm)
             if not (certificates):
                 console.print(Panel("[yellow]No certificates found[/yellow]",
@@ -420,11 +1306,12 @@ def main():
                         "[?] Enter Common Name:")
 
                 # Create certificate
-                created_cert = s3.create_s3_certificate(
+                certificate = s3.create_s3_certificate(
                     selected_svm, cert_common_name)
-                certificate = s3.get_s3_certificate(created_cert.get('uuid'))
                 display.cert_table(certificate)
+            journal.record(f"{selected_svm}:certificate", uuid=certificate.get('uuid'))
 
+        if not object_server:
             while True:
                 object_server_name = display.prompt("[?] Enter the Object Server Name (Note: that the object-store-server name"
                                                     " must not begin with a bucket name. For virtual hosted style (VHS) API access,"
@@ -441,31 +1328,33 @@ def main():
 
                 break
 
-        # Get and display volumes
-        if not (volumes := s3.get_volumes_by_svm(selected_svm)):
+        # Get and display volumes, one page at a time
+        volume_picker = LazyPicker(
+            s3, display, lambda term, svm_uuid=selected_svm: s3.volume_page_url(svm_uuid, term))
+        if volume_picker.is_empty():
             console.print(Panel("[yellow]No volumes found[/yellow]",
                                 title="Empty Result"))
             return
 
-        selected_volume = display.prompt_options(
-            "[?] Select a volume to create a bucket:", (f"{vol['uuid']} ({vol['name']})" for vol in volumes)).split(" ")[0]
-
-        # Find full volume details
-        volume = next(v for v in volumes if v['uuid'] == selected_volume)
+        volume = volume_picker.pick("[?] Select a volume to create a bucket:")
         display.volume_details(volume)
 
         bucket_name = display.prompt(
             "[?] Enter the Bucket Name:")
 
-        # Create bucket
-        bucket = s3.create_bucket(volume, bucket_name)
-        if bucket:
+        # Create bucket, unless a previous run already did
+        if journal.done(f"{selected_svm}:bucket:{bucket_name}"):
+            console.print(Panel.fit(
+                f"[yellow]Bucket '{bucket_name}' was created by the interrupted run[/yellow]", title="Resumed"))
+        elif s3.create_bucket(volume, bucket_name):
+            journal.record(f"{selected_svm}:bucket:{bucket_name}", volume=volume.get('uuid'))
             console.print(Panel.fit(
                 "[green]Operation completed successfully![/green]", title="Bucket Created"))
 
         if not display.prompt("[?] Select another SVM?"):
             break
 
+    journal.complete()
     console.print(Panel(
         "[green]Operation completed successfully![/green]", title="Completion Status"))
 
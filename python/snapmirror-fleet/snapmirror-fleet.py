@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+SnapMirror fleet tools for FSx for ONTAP
+
+scan: pages every SnapMirror relationship with one collection query per interval
+(state, health, lag and transfer fields only), keeps lag and transfer throughput
+samples per relationship in a fixed-size ring buffer and reports the worst
+relationships.
+
+update/resync: runs transfers for a set of relationships through a fixed number of
+transfer slots, largest estimated transfer first, tracking every running transfer
+with one batched status query per polling interval.
+"""
+
+import argparse
+import getpass
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+
+from netapp_ontap import config, HostConnection, NetAppRestError
+from netapp_ontap.resources import SnapmirrorRelationship, SnapmirrorTransfer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_ring import SampleRing, window_arg  # pylint: disable=wrong-import-position
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Only what the scanner needs, so one paged query covers hundreds of relationships
+RELATIONSHIP_FIELDS = ("uuid,source.path,destination.path,state,healthy,unhealthy_reason,lag_time,"
+                       "transfer.uuid,transfer.state,transfer.bytes_transferred,transfer.total_duration,"
+                       "transfer.end_time")
+
+# Layout of one sample slot in the ring buffer
+SAMPLE_COLUMNS = ("timestamp", "lag", "bytes_transferred", "throughput")
+SAMPLE_WIDTH = len(SAMPLE_COLUMNS)
+
+# Fields polled for running transfers
+TRANSFER_FIELDS = ("uuid,state,healthy,unhealthy_reason,transfer.uuid,transfer.state,"
+                   "transfer.bytes_transferred,transfer.end_time")
+TERMINAL_TRANSFER_STATES = {"success", "failed", "aborted", "hard_aborted"}
+RUNNING_TRANSFER_STATES = {"queued", "transferring"}
+
+ISO_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$")
+
+
+def parse_duration(value):
+    """Convert an ISO-8601 duration (e.g., P1DT2H3M4S) into seconds; NaN if absent"""
+    match = ISO_DURATION.match(value or "")
+    if not value or not match:
+        return math.nan
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60
+            + float(seconds or 0))
+
+
+class RelationshipBuffer(SampleRing):
+    """
+    Ring buffer of lag and throughput samples for every relationship, keyed by UUID
+
+    Samples are ordered as SAMPLE_COLUMNS; see SampleRing for the memory layout.
+    """
+
+    def __init__(self, capacity=30):
+        super().__init__(SAMPLE_WIDTH, capacity)
+        self.records = {}      # relationship uuid -> latest raw record
+        self.transfers = {}    # relationship uuid -> uuid of the transfer last seen
+
+    def record(self, data, now):
+        """
+        Store one raw relationship record as a sample
+
+        Throughput comes from the growth of bytes_transferred between two samples of the
+        same running transfer; for a transfer that finished in between, from its total
+        bytes over its total duration. Otherwise it is NaN.
+        """
+        uuid = data["uuid"]
+        transfer = data.get("transfer", {})
+        nbytes = float(transfer.get("bytes_transferred", math.nan))
+
+        throughput = math.nan
+        previous = self.last(uuid)
+        same_transfer = transfer.get("uuid") and self.transfers.get(uuid) == transfer.get("uuid")
+        if transfer.get("state") == "transferring" and same_transfer and previous:
+            elapsed = now - previous[0]
+            if elapsed > 0 and nbytes >= previous[2]:
+                throughput = (nbytes - previous[2]) / elapsed
+        elif transfer.get("uuid") and not same_transfer and transfer.get("state") == "success":
+            duration = parse_duration(transfer.get("total_duration"))
+            if duration > 0 and not math.isnan(nbytes):
+                throughput = nbytes / duration
+        if transfer.get("uuid"):
+            self.transfers[uuid] = transfer["uuid"]
+
+        sample = (now, parse_duration(data.get("lag_time")), nbytes, throughput)
+        self.add(uuid, sample)
+        self.records[uuid] = data
+        return sample
+
+    def summary(self, uuid):
+        """Return lag and throughput statistics for one relationship over the window"""
+        history = self.history(uuid)
+        lags = [s[1] for s in history if not math.isnan(s[1])]
+        rates = [s[3] for s in history if not math.isnan(s[3])]
+        lag_growth = math.nan
+        if len(lags) >= 2 and history[-1][0] > history[0][0]:
+            # Seconds of lag gained per second; > 0 means the relationship is falling behind
+            lag_growth = (lags[-1] - lags[0]) / (history[-1][0] - history[0][0])
+        return {
+            "lag": lags[-1] if lags else math.nan,
+            "max_lag": max(lags) if lags else math.nan,
+            "lag_growth": lag_growth,
+            "throughput": rates[-1] if rates else math.nan,
+            "avg_throughput": sum(rates) / len(rates) if rates else math.nan,
+        }
+
+    def worst(self, top):
+        """Return the top-N worst relationships: unhealthy first, then by lag"""
+        rows = []
+        for uuid, data in self.records.items():
+            stats = self.summary(uuid)
+            rows.append((data.get("healthy", True), -(0 if math.isnan(stats["lag"]) else stats["lag"]),
+                         uuid, data, stats))
+        rows.sort(key=lambda row: row[:3])
+        return [(data, stats) for _, _, _, data, stats in rows[:top]]
+
+
+class SnapmirrorFleet:
+    """Operations across every SnapMirror relationship visible to the cluster"""
+
+    def __init__(self, hostname, username, password):
+        # Configure connection, throttled by the shared per-host limiter and circuit breaker
+        config.CONNECTION = throttle_connection(HostConnection(
+            hostname, username=username, password=password, verify=False
+        ))
+
+    @staticmethod
+    def relationships(query=None, fields=RELATIONSHIP_FIELDS, page_size=1000):
+        """Stream raw relationship records with a single paged collection query"""
+        return (record.resource_data for record in SnapmirrorRelationship.fast_get_collection(
+            **(query or {}), fields=fields, max_records=page_size))
+
+    def scan(self, buffer, query=None, page_size=1000):
+        """Sample every relationship once into the buffer; returns the number scanned"""
+        now = time.time()
+        scanned = 0
+        for data in self.relationships(query, page_size=page_size):
+            buffer.record(data, now)
+            scanned += 1
+        return scanned
+
+    def run_scan(self, top=20, interval=60, count=1, window=30, query=None, output_format="table",
+                 page_size=1000):
+        """
+        Scan the fleet periodically and report the worst relationships after each pass
+
+        Args:
+            top: Relationships reported per pass
+            interval: Seconds between scans
+            count: Number of scans (0 = until interrupted)
+            window: Samples kept per relationship
+            query: Extra collection query (e.g., {"destination.path": "svm1:*"})
+            output_format: table or json
+            page_size: Records requested per page
+        """
+        buffer = RelationshipBuffer(capacity=window)
+        scans = 0
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    scanned = self.scan(buffer, query, page_size)
+                except NetAppRestError as err:
+                    logger.error(f"Error scanning SnapMirror relationships: {err}")
+                else:
+                    elapsed = time.monotonic() - started
+                    unhealthy = sum(1 for data in buffer.records.values() if not data.get("healthy", True))
+                    logger.info(f"Scanned {scanned} relationship(s) in {elapsed:.2f}s, {unhealthy} unhealthy")
+                    report_worst(buffer.worst(top), output_format)
+                scans += 1
+                if count and scans >= count:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logger.info("Scan stopped")
+        return buffer
+
+
+class TransferScheduler:
+    """
+    Runs SnapMirror update or resync transfers through a fixed number of transfer slots
+
+    Relationships are started largest estimated transfer first (the size of their last
+    transfer, then their lag), which keeps the longest transfers from starting last and
+    stretching the window. Transfers are started without waiting on their jobs; all
+    running transfers are then polled together with one collection query per interval
+    and a slot is refilled as soon as a transfer finishes.
+
+    A transfer that finishes between two polls may never be seen running, and a
+    relationship whose transfer could not start may never report a new one. So a
+    relationship that is unhealthy, or idle for idle_polls polls in a row, is settled
+    from its transfer.end_time: a newer end time means the transfer ran and ended in
+    its reported state, an unchanged one means it failed to run.
+    """
+
+    def __init__(self, max_transfers=4, poll_interval=15, transfer_timeout=14400, chunk_size=100,
+                 idle_polls=4):
+        self.max_transfers = max_transfers
+        self.poll_interval = poll_interval
+        self.transfer_timeout = transfer_timeout
+        self.chunk_size = chunk_size
+        self.idle_polls = idle_polls
+
+    @staticmethod
+    def estimate(data):
+        """Sort key estimating how much a relationship has to transfer"""
+        transfer = data.get("transfer", {})
+        lag = parse_duration(data.get("lag_time"))
+        return (transfer.get("bytes_transferred", 0), 0 if math.isnan(lag) else lag)
+
+    @staticmethod
+    def start(data, action):
+        """Start one transfer without waiting for its job"""
+        if action == "resync":
+            SnapmirrorRelationship(uuid=data["uuid"], state="snapmirrored").patch(poll=False)
+        else:
+            SnapmirrorTransfer(data["uuid"]).post(poll=False)
+
+    def poll(self, uuids):
+        """Return the current status of many relationships, one query per chunk of UUIDs"""
+        status = {}
+        uuids = list(uuids)
+        for i in range(0, len(uuids), self.chunk_size):
+            for record in SnapmirrorRelationship.fast_get_collection(
+                    uuid="|".join(uuids[i:i + self.chunk_size]), fields=TRANSFER_FIELDS):
+                status[record.resource_data["uuid"]] = record.resource_data
+        return status
+
+    def run(self, relationships, action="update", dry_run=False):
+        """
+        Transfer every relationship and return per-relationship results
+
+        Args:
+            relationships: Raw relationship records (uuid, destination.path, lag_time,
+                transfer.uuid, transfer.bytes_transferred and transfer.end_time are used)
+            action: update or resync
+            dry_run: Only log the order in which transfers would start
+        """
+        pending = sorted(relationships, key=self.estimate, reverse=True)
+        for position, data in enumerate(pending, 1):
+            logger.info(f"{'[dry-run] ' if dry_run else ''}{position:>4}. {data.get('destination', {}).get('path')} "
+                        f"(last transfer {self.estimate(data)[0] / 1024**3:.2f} GB, "
+                        f"lag {_format_seconds(self.estimate(data)[1])})")
+        if dry_run or not pending:
+            return []
+
+        started = time.monotonic()
+        active = {}      # uuid -> (record, previous transfer uuid, previous end time, start time)
+        idle = {}        # uuid -> consecutive polls without a running transfer
+        results = []
+        while pending or active:
+            while pending and len(active) < self.max_transfers:
+                data = pending.pop(0)
+                path = data.get("destination", {}).get("path")
+                try:
+                    self.start(data, action)
+                except NetAppRestError as err:
+                    logger.error(f"Error starting {action} of {path}: {err}")
+                    results.append({"destination": path, "result": "failed", "error": str(err)})
+                    continue
+                previous = data.get("transfer", {})
+                active[data["uuid"]] = (data, previous.get("uuid"), previous.get("end_time"), time.monotonic())
+                idle[data["uuid"]] = 0
+                logger.info(f"Started {action} of {path} ({len(active)}/{self.max_transfers} slots busy)")
+            if not active:
+                continue
+
+            time.sleep(self.poll_interval)
+            try:
+                status = self.poll(active)
+            except NetAppRestError as err:
+                logger.warning(f"Error polling transfer status: {err}")
+                continue
+
+            now = time.monotonic()
+            for uuid, (data, previous_transfer, previous_end, transfer_started) in list(active.items()):
+                current = status.get(uuid, {})
+                transfer = current.get("transfer", {})
+                path = data.get("destination", {}).get("path")
+                idle[uuid] = 0 if transfer.get("state") in RUNNING_TRANSFER_STATES else idle[uuid] + 1
+                ended = transfer.get("end_time") and transfer.get("end_time") != previous_end
+                # The relationship reports its last transfer until the new one shows up
+                finished = (transfer.get("state") in TERMINAL_TRANSFER_STATES
+                            and (transfer.get("uuid") and transfer.get("uuid") != previous_transfer or ended))
+                error = None
+                if finished:
+                    result = "success" if transfer["state"] == "success" else transfer["state"]
+                elif current and not current.get("healthy", True) and idle[uuid] >= min(2, self.idle_polls):
+                    result = "failed"
+                    error = "; ".join(reason.get("message", "") for reason in current.get("unhealthy_reason", []))
+                elif idle[uuid] >= self.idle_polls:
+                    result = "failed"
+                    error = f"no transfer ran within {idle[uuid]} polls"
+                elif now - transfer_started > self.transfer_timeout:
+                    result = "timeout"
+                else:
+                    continue
+                del active[uuid]
+                del idle[uuid]
+                results.append({"destination": path, "result": result,
+                                "bytes": transfer.get("bytes_transferred", 0) if finished else 0,
+                                "seconds": round(now - transfer_started, 1)})
+                if error:
+                    results[-1]["error"] = error
+                logger.info(f"{'✓' if result == 'success' else '✗'} {action} of {path}: {result} "
+                            f"in {now - transfer_started:.0f}s{f' ({error})' if error else ''}")
+
+        elapsed = time.monotonic() - started
+        total = sum(result.get("bytes", 0) for result in results)
+        succeeded = sum(1 for result in results if result["result"] == "success")
+        logger.info(f"{succeeded}/{len(results)} transfer(s) succeeded in {elapsed:.0f}s, "
+                    f"{total / 1024**3:.2f} GB at {_format_rate(total / elapsed if elapsed else math.nan)} aggregate")
+        return results
+
+
+def select_relationships(fleet, destination=None, paths_file=None, action="update", page_size=1000):
+    """
+    Read the relationships to transfer with one query (per 100 paths from a file)
+
+    Relationships that cannot take the action (update needs snapmirrored, resync needs
+    broken_off) are skipped.
+    """
+    fields = "uuid,destination.path,state,lag_time,transfer.uuid,transfer.bytes_transferred,transfer.end_time"
+    if paths_file:
+        with open(paths_file, encoding="utf-8") as handle:
+            paths = [line.strip() for line in handle if line.strip()]
+        queries = [{"destination.path": "|".join(paths[i:i + 100])} for i in range(0, len(paths), 100)]
+    else:
+        queries = [{"destination.path": destination} if destination else {}]
+
+    wanted_state = "broken_off" if action == "resync" else "snapmirrored"
+    selected = []
+    for query in queries:
+        for data in fleet.relationships(query, fields=fields, page_size=page_size):
+            if data.get("state") == wanted_state:
+                selected.append(data)
+            else:
+                logger.info(f"Skipping {data.get('destination', {}).get('path')}: state {data.get('state')}")
+    return selected
+
+
+def _format_seconds(value):
+    if math.isnan(value):
+        return "-"
+    value = int(value)
+    return f"{value // 3600}h{value % 3600 // 60:02d}m{value % 60:02d}s"
+
+
+def _format_rate(value):
+    return "-" if math.isnan(value) else f"{value / 1024**2:.1f} MB/s"
+
+
+def report_worst(rows, output_format="table"):
+    """Print the worst relationships as a table or as JSON lines"""
+    if output_format == "json":
+        for data, stats in rows:
+            print(json.dumps({
+                "uuid": data["uuid"],
+                "source": data.get("source", {}).get("path"),
+                "destination": data.get("destination", {}).get("path"),
+                "state": data.get("state"),
+                "healthy": data.get("healthy"),
+                "unhealthy_reason": [r.get("message") for r in data.get("unhealthy_reason", [])],
+                "transfer_state": data.get("transfer", {}).get("state"),
+                **{key: None if math.isnan(value) else round(value, 3) for key, value in stats.items()}
+            }))
+        sys.stdout.flush()
+        return
+
+    print(f"{'DESTINATION':<40} {'STATE':<14} {'HEALTHY':<8} {'LAG':>12} {'MAX LAG':>12} "
+          f"{'THROUGHPUT':>12} {'TRANSFER':<12}")
+    for data, stats in rows:
+        print(f"{data.get('destination', {}).get('path', ''):<40} {data.get('state', ''):<14} "
+              f"{str(data.get('healthy', '')):<8} {_format_seconds(stats['lag']):>12} "
+              f"{_format_seconds(stats['max_lag']):>12} {_format_rate(stats['throughput']):>12} "
+              f"{data.get('transfer', {}).get('state', '-'):<12}")
+        for reason in data.get("unhealthy_reason", []):
+            print(f"    {reason.get('message', '')}")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SnapMirror fleet health and transfer tools')
+    parser.add_argument('--host', required=True, help='ONTAP management hostname or IP')
+    parser.add_argument('--user', default='fsxadmin', help='ONTAP username')
+    parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
+
+    subparsers = parser.add_subparsers(dest='command', required=True, help='Command to execute')
+
+    # Scan command
+    scan_parser = subparsers.add_parser('scan', help='Report lag, health and throughput of all relationships')
+    scan_parser.add_argument('--top', type=int, default=20, help='Worst relationships to report')
+    scan_parser.add_argument('--interval', type=int, default=60, help='Seconds between scans')
+    scan_parser.add_argument('--count', type=int, default=1, help='Number of scans (0 = until interrupted)')
+    scan_parser.add_argument('--window', type=window_arg, default=30, help='Samples kept per relationship')
+    scan_parser.add_argument('--destination', help='Only destinations matching this path pattern (e.g., svm1:*)')
+    scan_parser.add_argument('--format', default='table', choices=['table', 'json'], help='Output format')
+
+    # Update and resync commands
+    for name, help_text in (('update', 'Run SnapMirror updates on many relationships'),
+                            ('resync', 'Resync many broken-off relationships')):
+        transfer_parser = subparsers.add_parser(name, help=help_text)
+        selection = transfer_parser.add_mutually_exclusive_group(required=True)
+        selection.add_argument('--destination', help='Destination path pattern (e.g., svm1:*)')
+        selection.add_argument('--relationships', help='File with one destination path per line')
+        transfer_parser.add_argument('--max-transfers', type=int, default=4, help='Concurrent transfers')
+        transfer_parser.add_argument('--poll-interval', type=int, default=15, help='Seconds between status polls')
+        transfer_parser.add_argument('--transfer-timeout', type=int, default=14400,
+                                     help='Seconds before a transfer is reported as timed out')
+        transfer_parser.add_argument('--idle-polls', type=int, default=4,
+                                     help='Polls without a running transfer before a relationship is settled')
+        transfer_parser.add_argument('--dry-run', action='store_true', help='Only show the transfer order')
+
+    args = parser.parse_args()
+
+    password = os.environ.get("ONTAP_PASSWORD") or getpass.getpass(f"Enter the password for {args.user}: ")
+    fleet = SnapmirrorFleet(args.host, args.user, password)
+
+    if args.command == 'scan':
+        fleet.run_scan(
+            top=args.top,
+            interval=args.interval,
+            count=args.count,
+            window=args.window,
+            query={"destination.path": args.destination} if args.destination else None,
+            output_format=args.format,
+            page_size=args.page_size
+        )
+
+    elif args.command in ('update', 'resync'):
+        try:
+            relationships = select_relationships(fleet, args.destination, args.relationships,
+                                                 args.command, args.page_size)
+        except NetAppRestError as err:
+            logger.error(f"Error reading SnapMirror relationships: {err}")
+            sys.exit(1)
+        scheduler = TransferScheduler(
+            max_transfers=args.max_transfers,
+            poll_interval=args.poll_interval,
+            transfer_timeout=args.transfer_timeout,
+            idle_polls=args.idle_polls
+        )
+        results = scheduler.run(relationships, action=args.command, dry_run=args.dry_run)
+        sys.exit(0 if all(result["result"] == "success" for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
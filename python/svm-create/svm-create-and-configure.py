@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Create and configure many FSx for ONTAP SVMs concurrently
+
+Python replacement for shell/svm-create-and-configure.sh: SVMs are created in parallel,
+waited on with one batched describe call per polling interval (exponential backoff with
+a deadline) and then configured over a pooled HTTPS session:
+  - preferred domain controllers
+  - DC discovery mode
+  - File System Administrators group added to BUILTIN\\Administrators
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import getpass
+import json
+import logging
+import os
+import sys
+import time
+
+import boto3
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_throttle import throttle_session  # pylint: disable=wrong-import-position
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+REQUEST_TIMEOUT = 60
+TERMINAL_STATES = {"CREATED", "FAILED", "MISCONFIGURED"}
+# Most SVM ids DescribeStorageVirtualMachines accepts in one call
+DESCRIBE_BATCH_SIZE = 50
+
+
+def make_fsx_client(region, endpoint_url=None):
+    """Create a boto3 FSx client; endpoint_url allows pointing at a local stub"""
+    return boto3.client("fsx", region_name=region, endpoint_url=endpoint_url)
+
+
+class SvmProvisioner:
+    def __init__(self, fsx_client, file_system_id, management_ip, fsx_password, domain_name,
+                 ou, service_account, service_password, dns_ips, file_admin_group, workers=8):
+        """
+        Args:
+            fsx_client: boto3-compatible FSx client (create_storage_virtual_machine and
+                describe_storage_virtual_machines are used)
+            file_system_id: FSx for ONTAP file system ID
+            management_ip: File system management endpoint
+            fsx_password: Password for fsxadmin
+            domain_name: Active Directory domain
+            ou: Organizational unit distinguished name
+            service_account: AD service account used to join the SVMs
+            service_password: Password for the service account
+            dns_ips: AD DNS server IPs, also used as preferred domain controllers
+            file_admin_group: AD group added to BUILTIN\\Administrators
+            workers: Concurrent create and configure operations
+        """
+        self.fsx = fsx_client
+        self.file_system_id = file_system_id
+        self.base_url = f"https://{management_ip}/api"
+        self.domain_name = domain_name
+        self.ou = ou
+        self.service_account = service_account
+        self.service_password = service_password
+        self.dns_ips = dns_ips
+        self.file_admin_group = file_admin_group
+        self.workers = workers
+        self.timings = {}
+
+        # One pooled session shared by all configuration threads
+        self.session = requests.Session()
+        self.session.auth = ("fsxadmin", fsx_password)
+        self.session.verify = False
+        self.session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        throttle_session(self.session)
+
+    def _timing(self, svm_name, phase, seconds):
+        self.timings.setdefault(svm_name, {})[phase] = seconds
+
+    def create_svm(self, svm):
+        """Request creation of one SVM and return its ID"""
+        started = time.monotonic()
+        response = self.fsx.create_storage_virtual_machine(
+            FileSystemId=self.file_system_id,
+            Name=svm["name"],
+            ActiveDirectoryConfiguration={
+                "NetBiosName": svm.get("netbios_name", svm["name"]),
+                "SelfManagedActiveDirectoryConfiguration": {
+                    "DomainName": self.domain_name,
+                    "OrganizationalUnitDistinguishedName": self.ou,
+                    "UserName": self.service_account,
+                    "Password": self.service_password,
+                    "DnsIps": self.dns_ips
+                }
+            }
+        )
+        self._timing(svm["name"], "create", time.monotonic() - started)
+        return response["StorageVirtualMachine"]["StorageVirtualMachineId"]
+
+    def create_svms(self, svms):
+        """Create all SVMs concurrently, returning {svm id: svm name}"""
+        created = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.create_svm, svm): svm["name"] for svm in svms}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    svm_id = future.result()
+                    created[svm_id] = name
+                    logger.info(f"✓ SVM '{name}' creation started ({svm_id})")
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error(f"Error creating SVM '{name}': {err}")
+        return created
+
+    def describe_lifecycles(self, svm_ids):
+        """
+        Return {svm id: lifecycle} for the given SVMs
+
+        DescribeStorageVirtualMachines takes at most DESCRIBE_BATCH_SIZE ids, so one
+        paginated describe call is made per batch of ids.
+        """
+        lifecycles = {}
+        svm_ids = list(svm_ids)
+        for i in range(0, len(svm_ids), DESCRIBE_BATCH_SIZE):
+            kwargs = {"StorageVirtualMachineIds": svm_ids[i:i + DESCRIBE_BATCH_SIZE]}
+            while True:
+                response = self.fsx.describe_storage_virtual_machines(**kwargs)
+                for svm in response.get("StorageVirtualMachines", []):
+                    lifecycles[svm["StorageVirtualMachineId"]] = svm.get("Lifecycle")
+                if not response.get("NextToken"):
+                    break
+                kwargs["NextToken"] = response["NextToken"]
+        return lifecycles
+
+    def wait_for_svms(self, svm_ids, initial_interval=5, max_interval=60, timeout=3600):
+        """
+        Wait until every SVM reaches a terminal lifecycle state
+
+        Only SVMs still pending are described on each poll, and the interval doubles up to
+        max_interval between polls. Returns {svm id: lifecycle}; SVMs that did not finish
+        before the timeout are reported as TIMEOUT.
+        """
+        started = time.monotonic()
+        pending = dict(svm_ids)
+        states = {}
+        interval = initial_interval
+        while pending:
+            try:
+                lifecycles = self.describe_lifecycles(pending)
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning(f"Error describing SVMs, retrying: {err}")
+                lifecycles = {}
+
+            for svm_id, lifecycle in lifecycles.items():
+                if lifecycle in TERMINAL_STATES and svm_id in pending:
+                    name = pending.pop(svm_id)
+                    states[svm_id] = lifecycle
+                    self._timing(name, "wait", time.monotonic() - started)
+                    logger.info(f"SVM '{name}' is {lifecycle}")
+
+            if not pending:
+                break
+            if time.monotonic() - started + interval > timeout:
+                for svm_id, name in pending.items():
+                    states[svm_id] = "TIMEOUT"
+                    logger.error(f"Timed out waiting for SVM '{name}'")
+                break
+            logger.info(f"{len(pending)} SVM(s) still being created, next check in {interval}s")
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+        return states
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def configure_svm(self, svm_name):
+        """Configure preferred DCs, discovery mode and the administrators group on one SVM"""
+        started = time.monotonic()
+        records = self._request(
+            "GET", "/protocols/cifs/local-groups",
+            params={"svm.name": svm_name, "name": "BUILTIN\\Administrators", "fields": "svm.uuid,sid"}
+        ).json().get("records", [])
+        if not records:
+            raise RuntimeError("BUILTIN\\Administrators group not found")
+        svm_uuid = records[0]["svm"]["uuid"]
+        group_sid = records[0]["sid"]
+
+        for server_ip in self.dns_ips:
+            self._request("POST", f"/protocols/active-directory/{svm_uuid}/preferred-domain-controllers",
+                          json={"fqdn": self.domain_name, "server_ip": server_ip})
+        self._request("PATCH", f"/protocols/cifs/domains/{svm_uuid}",
+                      json={"server_discovery_mode": "none"})
+        self._request("POST", f"/protocols/cifs/local-groups/{svm_uuid}/{group_sid}/members",
+                      json={"name": f"{self.domain_name}\\{self.file_admin_group}"})
+        self._timing(svm_name, "configure", time.monotonic() - started)
+
+    def configure_svms(self, svm_names):
+        """Configure the given SVMs concurrently"""
+        configured = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.configure_svm, name): name for name in svm_names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    configured.append(name)
+                    logger.info(f"✓ SVM '{name}' configured")
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error(f"Error configuring SVM '{name}': {err}")
+        return configured
+
+    def provision(self, svms, timeout=3600):
+        """Run create, wait and configure for all SVMs and log per-SVM phase timings"""
+        started = time.monotonic()
+        created = self.create_svms(svms)
+        states = self.wait_for_svms(created, timeout=timeout)
+        ready = [created[svm_id] for svm_id, state in states.items() if state == "CREATED"]
+        configured = self.configure_svms(ready)
+
+        logger.info(f"Provisioned {len(configured)} of {len(svms)} SVM(s) in {time.monotonic() - started:.1f}s")
+        logger.info(f"{'SVM':<24}{'create':>10}{'wait':>10}{'configure':>12}")
+        for svm in svms:
+            phases = self.timings.get(svm["name"], {})
+            columns = "".join(f"{phases[p]:>{w}.1f}" if p in phases else f"{'-':>{w}}"
+                              for p, w in (("create", 10), ("wait", 10), ("configure", 12)))
+            logger.info(f"{svm['name']:<24}{columns}")
+        return configured
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and configure FSx for ONTAP SVMs')
+    parser.add_argument('--manifest', required=True, help='JSON manifest describing the file system and SVMs')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent create/configure operations')
+    parser.add_argument('--timeout', type=int, default=3600, help='Seconds to wait for SVM creation')
+    parser.add_argument('--endpoint-url', help='Alternative FSx API endpoint (e.g., a local stub)')
+    args = parser.parse_args()
+
+    with open(args.manifest, encoding="utf-8") as handle:
+        manifest = json.load(handle)
+
+    service_password = os.environ.get("SVM_SERVICE_PASSWORD") or getpass.getpass(
+        f"Enter the password for {manifest['service_account']}: ")
+    fsx_password = os.environ.get("FSXADMIN_PASSWORD") or getpass.getpass(
+        "Enter the password for FileSystem Admin 'fsxadmin': ")
+
+    provisioner = SvmProvisioner(
+        fsx_client=make_fsx_client(manifest["region"], args.endpoint_url),
+        file_system_id=manifest["file_system_id"],
+        management_ip=manifest["management_ip"],
+        fsx_password=fsx_password,
+        domain_name=manifest["domain_name"],
+        ou=manifest["ou"],
+        service_account=manifest["service_account"],
+        service_password=service_password,
+        dns_ips=manifest["dns_ips"],
+        file_admin_group=manifest["file_admin_group"],
+        workers=args.workers
+    )
+    configured = provisioner.provision(manifest["svms"], timeout=args.timeout)
+    sys.exit(0 if len(configured) == len(manifest["svms"]) else 1)
+
+
+if __name__ == "__main__":
+    main()
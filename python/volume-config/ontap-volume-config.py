@@ -1,25 +1,627 @@
 #!/usr/bin/env python3
 
 from netapp_ontap import config, HostConnection, NetAppRestError
-from netapp_ontap.resources import Volume
+from netapp_ontap.resources import ExportPolicy, ExportRule, Qtree, QuotaReport, QuotaRule, Snapshot, Volume
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 import argparse
+import csv
+import fnmatch
+import ipaddress
+import json
 import logging
+import math
+import os
+import re
 import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from ontap_inventory import VolumeTable  # pylint: disable=wrong-import-position
+from ontap_ring import SampleRing, window_arg  # pylint: disable=wrong-import-position
+from ontap_throttle import throttle_connection  # pylint: disable=wrong-import-position
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Fields sampled on every collection tick; kept minimal so one paged query covers all volumes
+VOLUME_METRIC_FIELDS = ("uuid,name,svm.name,space.size,space.used,space.available,"
+                        "statistics.timestamp,statistics.iops_raw.total,"
+                        "statistics.throughput_raw.total,statistics.latency_raw.total")
+
+# NAS attributes read when comparing volumes against a desired configuration
+VOLUME_NAS_FIELDS = ("uuid,name,svm.name,nas.path,nas.security_style,nas.unix_permissions,"
+                     "nas.uid,nas.gid,nas.export_policy.name")
+
+# Snapshot fields read when listing and pruning across many volumes
+SNAPSHOT_FIELDS = "uuid,name,create_time,size,owners,volume.uuid,volume.name,svm.name"
+
+# Qtree attributes read when checking existing qtrees against a manifest
+QTREE_FIELDS = ("id,name,volume.uuid,volume.name,security_style,unix_permissions,user.id,group.id,"
+                "export_policy.name")
+
+# Export rule attributes that identify a rule when diffing against a manifest, with the
+# value ONTAP uses when a rule does not set them
+EXPORT_RULE_KEYS = {"protocols": "any", "ro_rule": "any", "rw_rule": "any", "superuser": "none"}
+
+# Quota rule fields read when reconciling, and quota report fields exported
+QUOTA_RULE_FIELDS = "uuid,type,volume.name,qtree.name,users.name,group.name,space,files"
+QUOTA_REPORT_FIELDS = ("type,svm.name,volume.name,qtree.name,users.name,group.name,"
+                       "space.used.total,space.used.hard_limit_percent,space.hard_limit,space.soft_limit,"
+                       "files.used.total,files.hard_limit,files.soft_limit")
+QUOTA_REPORT_COLUMNS = ("svm", "volume", "type", "qtree", "user", "group", "space_used",
+                        "space_hard_limit", "space_soft_limit", "space_used_percent",
+                        "files_used", "files_hard_limit", "files_soft_limit")
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "PB": 1024**5}
+
+# Layout of one sample slot in the ring buffer
+SAMPLE_COLUMNS = ("timestamp", "used", "available", "iops", "throughput", "latency")
+SAMPLE_WIDTH = len(SAMPLE_COLUMNS)
+
+
+class VolumeMetricsBuffer(SampleRing):
+    """
+    Ring buffer holding the most recent samples for every volume, keyed by volume UUID
+
+    Samples are ordered as SAMPLE_COLUMNS; see SampleRing for the memory layout.
+    """
+
+    def __init__(self, capacity=60):
+        super().__init__(SAMPLE_WIDTH, capacity)
+        self.labels = {}     # volume uuid -> (svm name, volume name)
+        self.last_raw = {}   # volume uuid -> (stat timestamp, ops, bytes, latency)
+
+    def latest(self):
+        """Yield (uuid, svm name, volume name, latest sample) for every volume"""
+        for uuid in self.slots:
+            sample = self.last(uuid)
+            if sample is not None:
+                svm_name, volume_name = self.labels[uuid]
+                yield uuid, svm_name, volume_name, sample
+
+    def record(self, data, now):
+        """
+        Convert one raw volume record into a sample and store it
+
+        Rates are derived from the difference between this record's raw counters and the
+        previous ones; the first sample of a volume (or a counter reset) yields NaN rates.
+        """
+        space = data.get('space', {})
+        stats = data.get('statistics', {})
+        ops = stats.get('iops_raw', {}).get('total')
+        nbytes = stats.get('throughput_raw', {}).get('total')
+        latency = stats.get('latency_raw', {}).get('total')
+        stat_ts = _parse_timestamp(stats.get('timestamp')) or now
+
+        iops = throughput = avg_latency = math.nan
+        previous = self.last_raw.get(data['uuid'])
+        if previous and None not in (ops, nbytes, latency):
+            elapsed = stat_ts - previous[0]
+            delta_ops = ops - previous[1]
+            delta_bytes = nbytes - previous[2]
+            delta_latency = latency - previous[3]
+            if elapsed > 0 and delta_ops >= 0 and delta_bytes >= 0 and delta_latency >= 0:
+                iops = delta_ops / elapsed
+                throughput = delta_bytes / elapsed
+                avg_latency = delta_latency / delta_ops if delta_ops else 0.0
+        if None not in (ops, nbytes, latency):
+            self.last_raw[data['uuid']] = (stat_ts, ops, nbytes, latency)
+
+        sample = (now, float(space.get('used', math.nan)), float(space.get('available', math.nan)),
+                  iops, throughput, avg_latency)
+        self.labels[data['uuid']] = (data.get('svm', {}).get('name', ''), data.get('name', ''))
+        self.add(data['uuid'], sample)
+        return sample
+
+
+class UnixPermissionCodec:
+    """
+    Converts UNIX permissions between symbolic and octal form with precomputed tables
+
+    Accepted input forms, all resolved with a single dictionary lookup:
+      - octal: 755, "755", "0755", "4755"
+      - 9-char symbolic: "rwxr-x---", with ls-style s/S/t/T for setuid, setgid and sticky
+      - 12-char ONTAP symbolic: "---rwxrwx---", where the first three characters are the
+        setuid, setgid and sticky bits ("s", "s", "t" or "-")
+
+    The REST API takes the octal digits as an integer (e.g., 0o755 is sent as 755).
+    """
+
+    TRIADS = [("r" if b & 4 else "-") + ("w" if b & 2 else "-") + ("x" if b & 1 else "-")
+              for b in range(8)]
+
+    def __init__(self):
+        self.to_mode = {}
+        self.to_symbolic = []
+        for mode in range(0o10000):
+            special, user, group, other = mode >> 9, (mode >> 6) & 7, (mode >> 3) & 7, mode & 7
+            nine = self._ls_style(special, user, group, other)
+            twelve = (("s" if special & 4 else "-") + ("s" if special & 2 else "-")
+                      + ("t" if special & 1 else "-")
+                      + self.TRIADS[user] + self.TRIADS[group] + self.TRIADS[other])
+            self.to_symbolic.append(twelve)
+            for key in (twelve, nine, f"{mode:o}", f"{mode:03o}", f"{mode:04o}"):
+                self.to_mode[key] = mode
+
+    def _ls_style(self, special, user, group, other):
+        """Render a mode as the 9-character form used by ls -l"""
+        chars = list(self.TRIADS[user] + self.TRIADS[group] + self.TRIADS[other])
+        for bit, position, letter in ((4, 2, "s"), (2, 5, "s"), (1, 8, "t")):
+            if special & bit:
+                chars[position] = letter if chars[position] == "x" else letter.upper()
+        return "".join(chars)
+
+    def parse(self, value):
+        """Return the numeric mode for a permission value, raising ValueError if invalid"""
+        mode = self.to_mode.get(str(value).strip())
+        if mode is None:
+            raise ValueError(f"Invalid UNIX permissions '{value}'")
+        return mode
+
+    def to_rest(self, value):
+        """Return the value expected by the REST API (octal digits as an integer)"""
+        return int(f"{self.parse(value):o}")
+
+    def symbolic(self, value):
+        """Return the 12-character ONTAP symbolic form"""
+        return self.to_symbolic[self.parse(value)]
+
+
+UNIX_PERMISSIONS = UnixPermissionCodec()
+
+SECURITY_STYLES = ("unix", "ntfs", "mixed")
+
+
+def _unix_permissions_arg(value):
+    """argparse type converting a permission string to its REST value"""
+    try:
+        return UNIX_PERMISSIONS.to_rest(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err)) from err
+
+
+def load_manifest(path):
+    """
+    Load manifest rows from a CSV, JSON (list of objects) or JSON lines file
+
+    Returns a list of dictionaries, one per row.
+    """
+    with open(path, encoding="utf-8", newline="") as handle:
+        if path.endswith(".csv"):
+            return [{k: v for k, v in row.items() if v not in (None, "")} for row in csv.DictReader(handle)]
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in handle if line.strip()]
+        data = json.load(handle)
+        return data["rows"] if isinstance(data, dict) else data
+
+
+def validate_manifest_rows(rows, required=("name",)):
+    """
+    Validate manifest rows locally before any request is sent
+
+    Yields (row number, field, message) for every problem found. Valid permission values
+    are rewritten in place to their REST form.
+    """
+    parse_permissions = UNIX_PERMISSIONS.to_mode.get
+    for number, row in enumerate(rows, start=1):
+        for field in required:
+            if not row.get(field):
+                yield number, field, "missing"
+
+        permissions = row.get("unix_permissions")
+        if permissions is not None:
+            mode = parse_permissions(str(permissions).strip())
+            if mode is None:
+                yield number, "unix_permissions", f"invalid value '{permissions}'"
+            else:
+                row["unix_permissions"] = int(f"{mode:o}")
+
+        for field in ("uid", "gid", "size"):
+            value = row.get(field)
+            if value is not None:
+                try:
+                    row[field] = int(value)
+                    if row[field] < 0:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    yield number, field, f"not a non-negative integer '{value}'"
+
+        style = row.get("security_style")
+        if style is not None and style not in SECURITY_STYLES:
+            yield number, "security_style", f"must be one of {', '.join(SECURITY_STYLES)}"
+
+        path = row.get("junction_path")
+        if path is not None and not str(path).startswith("/"):
+            yield number, "junction_path", f"must start with '/' ('{path}')"
+
+
+def benchmark_manifest_validation(rows=100000):
+    """Time local validation of a synthetic manifest and report rows per second"""
+    samples = ["rwxr-x---", "---rwxrwx---", "755", "0770", "rwsr-sr-t", "rwxrwxrwz", "8888", "sst------rwx"]
+    manifest = [{"name": f"vol{i}", "unix_permissions": samples[i % len(samples)],
+                 "uid": i % 65536, "gid": "1000", "security_style": SECURITY_STYLES[i % 3],
+                 "junction_path": f"/vol{i}"} for i in range(rows)]
+
+    started = time.perf_counter()
+    errors = sum(1 for _ in validate_manifest_rows(manifest))
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(rows):
+        UNIX_PERMISSIONS.to_mode.get(samples[i % len(samples)])
+    lookup = time.perf_counter() - started
+
+    logger.info(f"Validated {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/s), {errors} error(s)")
+    logger.info(f"Permission lookups: {lookup / rows * 1e9:.0f} ns/row")
+    return elapsed
+
+
+def synthetic_volume_pages(volumes, page_size=1000):
+    """Yield JSON pages of synthetic volume records shaped like /storage/volumes responses"""
+    styles = SECURITY_STYLES
+    for start in range(0, volumes, page_size):
+        yield json.dumps({"records": [{
+            "uuid": f"{i:08x}-41bd-11e9-81d5-00a0986138f7", "name": f"vol_{i:06d}",
+            "svm": {"name": f"svm{i % 40}", "uuid": f"{i % 40:08x}-41bd-11e9-81d5-00a0986138f8"},
+            "state": "online", "size": (i % 1024 + 1) * 1024 ** 3, "space": {"used": (i * 7919) % 1024 ** 3},
+            "nas": {"path": f"/projects/p{i % 500}/vol_{i:06d}", "security_style": styles[i % 3],
+                    "unix_permissions": 755, "uid": i % 1000, "gid": 1000,
+                    "export_policy": {"name": f"policy{i % 25}"}}}
+            for i in range(start, min(volumes, start + page_size))]})
+
+
+def benchmark_volume_inventory(volumes=50000, object_sample=500):
+    """
+    Compare memory and speed of the volume models for a synthetic inventory
+
+    netapp_ontap Volume objects (the previous list_volumes model) are built for a sample
+    only, as they take milliseconds each, and extrapolated to the full inventory.
+    """
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+
+    def measure(build):
+        # Timed and traced separately, as tracing slows allocation-heavy code several times over
+        started = time.perf_counter()
+        build()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        result = build()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, elapsed, retained
+
+    sample = min(volumes, object_sample)
+    _, object_seconds, object_bytes = measure(lambda: [
+        Volume.from_dict(record) for page in synthetic_volume_pages(sample)
+        for record in json.loads(page)["records"]])
+    scale = volumes / sample
+    dicts, dict_seconds, dict_bytes = measure(lambda: [
+        record for page in synthetic_volume_pages(volumes) for record in json.loads(page)["records"]])
+    table, table_seconds, table_bytes = measure(lambda: VolumeTable().extend(
+        record for page in synthetic_volume_pages(volumes) for record in json.loads(page)["records"]))
+
+    logger.info(f"Decoding {volumes:,} volumes (time includes generating the JSON pages):")
+    for label, seconds, size in (("netapp_ontap Volume", object_seconds * scale, object_bytes * scale),
+                                 ("JSON dicts", dict_seconds, dict_bytes),
+                                 ("VolumeTable", table_seconds, table_bytes)):
+        logger.info(f"  {label:20} {size / 1024 ** 2:10,.1f} MB {size / volumes:8,.0f} B/volume "
+                    f"{seconds:8.2f}s {volumes / seconds:12,.0f} volumes/s")
+    if scale > 1:
+        logger.info(f"  (Volume objects extrapolated from a sample of {sample})")
+
+    started = time.perf_counter()
+    ntfs = [d for d in dicts if d["nas"]["security_style"] == "ntfs"]
+    by_used = sorted(dicts, key=lambda d: d["space"]["used"])
+    groups = {}
+    for d in dicts:
+        groups.setdefault(d["nas"]["export_policy"]["name"], []).append(d)
+    dict_ops = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table_ntfs = table.filter(security_style="ntfs")
+    table.sort("used")
+    table_groups = table.group("export_policy")
+    table_ops = time.perf_counter() - started
+
+    # Both models must agree, or the timings compare different work
+    for check, expected, actual in (("ntfs volumes", len(ntfs), len(table_ntfs)),
+                                    ("export policy groups", len(groups), len(table_groups)),
+                                    ("volumes", len(by_used), len(table))):
+        if expected != actual:
+            raise RuntimeError(f"Benchmark mismatch in {check}: JSON dicts {expected}, VolumeTable {actual}")
+    logger.info(f"Filter + sort + group: JSON dicts {dict_ops:.3f}s, VolumeTable {table_ops:.3f}s")
+    return table_bytes, dict_bytes, object_bytes * scale
+
+
+def build_nas_body(unix_permissions=None, uid=None, gid=None, security_style=None,
+                   export_policy=None):
+    """Build a partial nas body containing only the attributes that were given"""
+    body = {}
+    if unix_permissions is not None:
+        body["unix_permissions"] = UNIX_PERMISSIONS.to_rest(unix_permissions)
+    if uid is not None:
+        body["uid"] = uid
+    if gid is not None:
+        body["gid"] = gid
+    if security_style is not None:
+        body["security_style"] = security_style
+    if export_policy is not None:
+        body["export_policy"] = {"name": export_policy}
+    return body
+
+
+def qtree_body(nas_body):
+    """
+    Translate a build_nas_body result into qtree attributes
+
+    uid/gid become user/group ids, and the permissions move from the volume's octal
+    digits (755) to the integer mode (493) the qtree endpoint expects.
+    """
+    body = {key: value for key, value in nas_body.items() if key not in ("uid", "gid")}
+    if "unix_permissions" in nas_body:
+        body["unix_permissions"] = int(str(nas_body["unix_permissions"]), 8)
+    if "uid" in nas_body:
+        body["user"] = {"id": str(nas_body["uid"])}
+    if "gid" in nas_body:
+        body["group"] = {"id": str(nas_body["gid"])}
+    return body
+
+
+def qtree_nas(record):
+    """Express a qtree record with the attribute names used by build_nas_body"""
+    permissions = record.get("unix_permissions")
+    return {"unix_permissions": int(f"{permissions:o}") if permissions is not None else None,
+            "uid": record.get("user", {}).get("id"),
+            "gid": record.get("group", {}).get("id"),
+            "security_style": record.get("security_style"),
+            "export_policy": record.get("export_policy", {})}
+
+
+def nas_changes(current, desired):
+    """
+    Return the part of a desired nas body that differs from a volume's current nas record
+
+    Args:
+        current: The volume's nas record as returned by the REST API
+        desired: A body produced by build_nas_body
+    """
+    changes = {}
+    for key, value in desired.items():
+        if key == "export_policy":
+            if current.get("export_policy", {}).get("name") != value["name"]:
+                changes[key] = value
+        elif str(current.get(key)) != str(value):
+            changes[key] = value
+    return changes
+
+
+class DriftRules:
+    """
+    Baseline NAS configuration loaded from a JSON rules file
+
+    The file holds a list of rules; each rule has an optional "match" on volume "name"
+    and/or "junction_path" (shell-style patterns) and an "expect" block using the same
+    attribute names as build_nas_body. Every matching rule applies, later rules
+    overriding earlier ones, e.g.:
+
+        {"rules": [
+            {"expect": {"security_style": "unix", "export_policy": "default"}},
+            {"match": {"junction_path": "/projects/*"},
+             "expect": {"unix_permissions": 770, "uid": 0, "gid": 5000}}
+        ]}
+    """
+
+    MATCH_KEYS = ("name", "junction_path")
+
+    def __init__(self, rules):
+        self.rules = []
+        for index, rule in enumerate(rules):
+            matchers = []
+            for key, pattern in rule.get("match", {}).items():
+                if key not in self.MATCH_KEYS:
+                    raise ValueError(f"Rule {index}: unknown match key '{key}'")
+                matchers.append((key, re.compile(fnmatch.translate(pattern)).match))
+            self.rules.append((rule.get("name", f"rule{index}"), matchers, build_nas_body(**rule["expect"])))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle)["rules"])
+
+    def expected(self, volume_name, junction_path):
+        """Return the merged expectations and names of the rules matching a volume"""
+        values = {"name": volume_name or "", "junction_path": junction_path or ""}
+        expected = {}
+        matched = []
+        for name, matchers, body in self.rules:
+            if all(match(values[key]) for key, match in matchers):
+                expected.update(body)
+                matched.append(name)
+        return expected, matched
+
+
+class SnapshotRetention:
+    """
+    Rules deciding which snapshots are pruned
+
+    Only snapshots whose name starts with the prefix are considered, and snapshots with
+    owners (SnapMirror, clones, ...) are never deleted. Per volume, snapshots beyond the
+    newest `keep` and snapshots older than `max_age_days` are deleted.
+    """
+
+    def __init__(self, prefix, keep=None, max_age_days=None):
+        if keep is None and max_age_days is None:
+            raise ValueError("A retention count or maximum age is required")
+        self.prefix = prefix
+        self.keep = keep
+        self.max_age = max_age_days * 86400 if max_age_days is not None else None
+
+    def expired(self, snapshots, now):
+        """Return the snapshots of one volume that fall outside the retention rules"""
+        candidates = sorted(
+            (snap for snap in snapshots if snap.get("name", "").startswith(self.prefix) and not snap.get("owners")),
+            key=lambda snap: _parse_timestamp(snap.get("create_time")) or 0, reverse=True)
+        expired = []
+        for rank, snap in enumerate(candidates):
+            created = _parse_timestamp(snap.get("create_time"))
+            too_many = self.keep is not None and rank >= self.keep
+            too_old = self.max_age is not None and created is not None and now - created > self.max_age
+            if too_many or too_old:
+                expired.append(snap)
+        return expired
+
+
+def normalise_client(match):
+    """Canonical form of an export rule client match (CIDR, address, host or netgroup)"""
+    match = match.strip()
+    try:
+        return str(ipaddress.ip_network(match, strict=False))
+    except ValueError:
+        return match.lower()
+
+
+def _as_list(value):
+    """Export rule attributes may be given as one string ("sys") or a list (["sys"])"""
+    return [value] if isinstance(value, str) else list(value or [])
+
+
+def export_rule_key(clients, rule):
+    """Index key of an export rule: its client matches plus protocols, ro/rw and superuser rules"""
+    key = [frozenset(normalise_client(client) for client in clients)]
+    for name, default in EXPORT_RULE_KEYS.items():
+        key.append(frozenset(value.lower() for value in _as_list(rule.get(name)) or [default]))
+    return tuple(key)
+
+
+def desired_export_rules(policy):
+    """
+    Expand a manifest policy into {key: rule body}, one rule per client match
+
+    One rule per client keeps adding or removing a subnet to a single rule POST or DELETE.
+    """
+    desired = {}
+    for rule in policy.get("rules", []):
+        for name in ("clients", "ro_rule", "rw_rule"):
+            if not rule.get(name):
+                raise ValueError(f"Policy '{policy['name']}': every rule needs '{name}'")
+        rule = {key: _as_list(value) if key in EXPORT_RULE_KEYS or key == "clients" else value
+                for key, value in rule.items()}
+        for client in rule["clients"]:
+            body = {key: value for key, value in rule.items() if key != "clients"}
+            body["clients"] = [{"match": normalise_client(client)}]
+            desired[export_rule_key([client], rule)] = body
+    return desired
+
+
+def parse_size(value):
+    """Convert a size such as 500GB, 1.5TB or a byte count into bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGTP]?B?)\s*", str(value).upper())
+    if not match or match.group(2) not in SIZE_UNITS:
+        raise ValueError(f"invalid size '{value}'")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def quota_rule_key(rule):
+    """Identify a quota rule by volume, type, qtree and target user or group"""
+    users = rule.get("users") or [{}]
+    target = users[0].get("name") if rule.get("type") == "user" else rule.get("group", {}).get("name")
+    return (rule.get("volume", {}).get("name"), rule.get("type"),
+            rule.get("qtree", {}).get("name") or "", target or "")
+
+
+def desired_quota_rule(entry):
+    """
+    Convert a manifest entry into a quota rule body
+
+        {"volume": "vol1", "type": "tree", "qtree": "proj1", "space_hard_limit": "1TB",
+         "space_soft_limit": "900GB", "files_hard_limit": 1000000}
+        {"volume": "vol1", "type": "user", "user": "alice", "qtree": "proj1", "space_hard_limit": "100GB"}
+    """
+    if entry.get("type") not in ("user", "group", "tree"):
+        raise ValueError(f"quota rule for '{entry.get('volume')}': type must be user, group or tree")
+    body = {"volume": {"name": entry["volume"]}, "type": entry["type"]}
+    if entry.get("qtree") is not None:
+        body["qtree"] = {"name": entry["qtree"]}
+    if entry["type"] == "user":
+        body["users"] = [{"name": entry.get("user", "")}]
+    elif entry["type"] == "group":
+        body["group"] = {"name": entry.get("group", "")}
+    for resource in ("space", "files"):
+        for limit in ("hard_limit", "soft_limit"):
+            value = entry.get(f"{resource}_{limit}")
+            if value is not None:
+                body.setdefault(resource, {})[limit] = parse_size(value) if resource == "space" else int(value)
+    return body
+
+
+def quota_limit_changes(current, desired):
+    """Return the space/files limits of desired that differ from the current rule"""
+    changes = {}
+    for resource in ("space", "files"):
+        for limit, value in desired.get(resource, {}).items():
+            if current.get(resource, {}).get(limit) != value:
+                changes.setdefault(resource, {})[limit] = value
+    return changes
+
+
+def _parse_timestamp(value):
+    """Parse an ONTAP ISO-8601 timestamp into epoch seconds"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_metrics(buffer, path):
+    """Write the latest sample of every volume in Prometheus text exposition format"""
+    metrics = (
+        ("used", "ontap_volume_space_used_bytes", "Logical space used"),
+        ("available", "ontap_volume_space_available_bytes", "Space available"),
+        ("iops", "ontap_volume_iops", "Operations per second"),
+        ("throughput", "ontap_volume_throughput_bytes_per_second", "Throughput"),
+        ("latency", "ontap_volume_latency_microseconds", "Average latency per operation"),
+    )
+    latest = list(buffer.latest())
+    lines = []
+    for column, name, help_text in metrics:
+        index = SAMPLE_COLUMNS.index(column)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for _, svm_name, volume_name, sample in latest:
+            value = sample[index]
+            lines.append(f'{name}{{svm="{_escape_label(svm_name)}",volume="{_escape_label(volume_name)}"}} '
+                         f'{"NaN" if math.isnan(value) else repr(value)}')
+    text = "\n".join(lines) + "\n"
+
+    if path in (None, "-"):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    # Write then rename so textfile collectors never read a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(tmp_path, path)
+
 
 class OntapVolumeManager:
     def __init__(self, hostname, username, password, vserver_name):
         self.hostname = hostname
         self.vserver_name = vserver_name
         
-        # Configure connection
-        config.CONNECTION = HostConnection(
+        # Configure connection, throttled by the shared per-host limiter and circuit breaker
+        config.CONNECTION = throttle_connection(HostConnection(
             hostname, username=username, password=password, verify=False
-        )
+        ))
     
     def create_volume(self, volume_name, aggregate_name, size_mb, junction_path=None,
                      security_style="unix", unix_permissions=755, uid=0, gid=0,
@@ -221,38 +823,996 @@ class OntapVolumeManager:
             logger.error(f"Error retrieving volume information: {err}")
             return None
     
-    def list_volumes(self):
-        """List all volumes in the SVM"""
+    def list_volumes(self, svm_names=None, where=None, sort=None, reverse=False, group_by=None,
+                     page_size=1000):
+        """
+        List the volumes of one or more SVMs
+
+        Pages are decoded straight into a compact VolumeTable, so tens of thousands of
+        volumes can be listed, filtered, sorted and grouped without per-volume objects.
+
+        Args:
+            svm_names: SVMs to list (defaults to the manager's SVM)
+            where: {column: value or glob} conditions (see VolumeTable.filter)
+            sort: Column to order the volumes by
+            reverse: Sort in descending order
+            group_by: Column to group the volumes by
+            page_size: Records requested per page
+        """
+        table = VolumeTable()
         try:
-            logger.info(f"Listing volumes for SVM '{self.vserver_name}'...")
-            
-            volumes = list(Volume.get_collection(
-                **{"svm.name": self.vserver_name},
-                fields="name,size,state,nas.path,nas.security_style,nas.unix_permissions,nas.uid,nas.gid"
-            ))
-            
-            if not volumes:
-                logger.info("No volumes found")
-                return []
-            
-            logger.info(f"Found {len(volumes)} volume(s):")
-            for vol in volumes:
-                vol.get()
-                size_gb = vol.size / (1024**3) if hasattr(vol, 'size') else 0
-                logger.info(f"  - {vol.name} ({size_gb:.2f} GB)")
-                
-                if hasattr(vol, 'nas') and vol.nas:
-                    logger.info(f"    Path: {getattr(vol.nas, 'path', 'N/A')}, "
-                              f"Style: {getattr(vol.nas, 'security_style', 'N/A')}, "
-                              f"Perms: {getattr(vol.nas, 'unix_permissions', 'N/A')}, "
-                              f"GID: {getattr(vol.nas, 'gid', 'N/A')}")
-            
-            return volumes
-            
+            for svm_name in svm_names or [self.vserver_name]:
+                logger.info(f"Listing volumes for SVM '{svm_name}'...")
+                table.extend(record.resource_data for record in Volume.fast_get_collection(
+                    **{"svm.name": svm_name}, fields=VolumeTable.FIELDS, max_records=page_size))
         except NetAppRestError as err:
             logger.error(f"Error listing volumes: {err}")
+            return table
+
+        rows = table.filter(**where) if where else None
+        if sort:
+            rows = table.sort(sort, rows, reverse=reverse)
+        groups = table.group(group_by, rows) if group_by else {None: rows}
+
+        count = len(table) if rows is None else len(rows)
+        if not count:
+            logger.info("No volumes found")
+            return table
+
+        logger.info(f"Found {count} volume(s):")
+        for group, members in groups.items():
+            if group_by:
+                logger.info(f"{group_by} = {group if group is not None else 'N/A'} ({len(members)} volume(s))")
+            for vol in table.records(members):
+                size_gb = vol.size / (1024**3) if vol.size is not None else 0
+                logger.info(f"  - {vol.name} ({size_gb:.2f} GB)")
+                logger.info(f"    Path: {vol.junction_path or 'N/A'}, "
+                            f"Style: {vol.security_style or 'N/A'}, "
+                            f"Perms: {vol.unix_permissions if vol.unix_permissions is not None else 'N/A'}, "
+                            f"UID: {vol.uid if vol.uid is not None else 'N/A'}, "
+                            f"GID: {vol.gid if vol.gid is not None else 'N/A'}, "
+                            f"Export Policy: {vol.export_policy or 'N/A'}")
+
+        return table
+
+    def select_volumes(self, name_glob=None, junction_prefix=None, export_policy=None,
+                       fields=VOLUME_NAS_FIELDS, page_size=1000, svm_name=None):
+        """
+        Stream the volumes matching a server-side query
+
+        Args:
+            name_glob: Volume name pattern (e.g., proj_*)
+            junction_prefix: Junction path prefix (e.g., /projects/)
+            export_policy: Export policy name currently assigned
+            fields: Volume fields to request
+            page_size: Records requested per page
+            svm_name: SVM to query (defaults to the manager's SVM)
+        """
+        query = {"svm.name": svm_name or self.vserver_name, "is_constituent": False, "is_svm_root": False}
+        if name_glob:
+            query["name"] = name_glob
+        if junction_prefix:
+            query["nas.path"] = f"{junction_prefix}*"
+        if export_policy:
+            query["nas.export_policy.name"] = export_policy
+        return Volume.fast_get_collection(**query, fields=fields, max_records=page_size)
+
+    def update_volumes_nas_batch(self, nas_body, name_glob=None, junction_prefix=None,
+                                 export_policy_filter=None, mode="auto", workers=8,
+                                 chunk_size=100, dry_run=False):
+        """
+        Update NAS configuration on every volume matching a query
+
+        Only the attributes that differ are patched. Volumes needing the same change are
+        patched together with one collection PATCH per chunk of UUIDs; with mode "pool",
+        or if a collection PATCH fails, volumes are patched individually in a thread pool.
+
+        Args:
+            nas_body: Desired NAS attributes (see build_nas_body)
+            name_glob: Volume name pattern
+            junction_prefix: Junction path prefix
+            export_policy_filter: Only volumes currently using this export policy
+            mode: auto, collection or pool
+            workers: Thread pool size for per-volume PATCH requests
+            chunk_size: Volumes per collection PATCH
+            dry_run: Only report what would change
+        """
+        if not nas_body:
+            logger.warning("No updates specified")
+            return None
+
+        started = time.monotonic()
+        matched = 0
+        groups = {}   # frozen change -> (change, [(uuid, name)])
+        try:
+            for record in self.select_volumes(name_glob, junction_prefix, export_policy_filter):
+                data = record.resource_data
+                matched += 1
+                change = nas_changes(data.get("nas", {}), nas_body)
+                if change:
+                    key = repr(sorted(change.items()))
+                    groups.setdefault(key, (change, []))[1].append((data["uuid"], data.get("name")))
+        except NetAppRestError as err:
+            logger.error(f"Error selecting volumes: {err}")
+            return None
+
+        pending = sum(len(volumes) for _, volumes in groups.values())
+        logger.info(f"{matched} volume(s) matched, {pending} need changes, "
+                    f"{matched - pending} already compliant")
+
+        succeeded = failed = 0
+        for change, volumes in groups.values():
+            logger.info(f"{'[dry-run] ' if dry_run else ''}Applying {change} to {len(volumes)} volume(s)")
+            if dry_run:
+                for _, name in volumes:
+                    logger.info(f"  {name}")
+                continue
+
+            remaining = volumes
+            if mode in ("auto", "collection"):
+                remaining = []
+                for i in range(0, len(volumes), chunk_size):
+                    chunk = volumes[i:i + chunk_size]
+                    try:
+                        Volume.patch_collection({"nas": change}, uuid="|".join(u for u, _ in chunk),
+                                                **{"svm.name": self.vserver_name})
+                        succeeded += len(chunk)
+                    except NetAppRestError as err:
+                        if mode == "collection":
+                            logger.error(f"Error patching {len(chunk)} volume(s): {err}")
+                            failed += len(chunk)
+                        else:
+                            logger.warning(f"Collection PATCH failed ({err}), patching individually")
+                            remaining.extend(chunk)
+
+            if remaining:
+                ok, errors = self._patch_volumes_individually(remaining, change, workers)
+                succeeded += ok
+                failed += errors
+
+        elapsed = time.monotonic() - started
+        logger.info(f"✓ Batch update finished in {elapsed:.2f}s: {succeeded} updated, "
+                    f"{failed} failed, {matched - pending} unchanged")
+        return {"matched": matched, "updated": succeeded, "failed": failed,
+                "unchanged": matched - pending, "seconds": elapsed}
+
+    @staticmethod
+    def _patch_volumes_individually(volumes, change, workers):
+        """PATCH each volume's changed NAS attributes concurrently"""
+        def patch(uuid):
+            Volume(uuid=uuid, nas=change).patch()
+
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(patch, uuid): name for uuid, name in volumes}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    succeeded += 1
+                except NetAppRestError as err:
+                    logger.error(f"Error updating volume '{futures[future]}': {err}")
+                    failed += 1
+        return succeeded, failed
+
+    def detect_drift(self, rules, svm_names=None, output=None, page_size=1000):
+        """
+        Stream volume NAS configuration and report attributes that differ from the rules
+
+        Each SVM is scanned in a single paged pass and violations are written as JSON
+        lines as soon as they are found, so memory use does not grow with fleet size.
+
+        Args:
+            rules: DriftRules instance
+            svm_names: List of SVM names to scan (defaults to the manager's SVM)
+            output: Output file path (default: stdout)
+            page_size: Records requested per page
+        """
+        svm_names = svm_names or [self.vserver_name]
+        handle = open(output, "w", encoding="utf-8") if output else sys.stdout
+        scanned = drifted = 0
+        started = time.monotonic()
+        try:
+            for svm_name in svm_names:
+                logger.info(f"Scanning volumes in SVM '{svm_name}' for drift...")
+                try:
+                    for record in self.select_volumes(fields=VOLUME_NAS_FIELDS, page_size=page_size,
+                                                      svm_name=svm_name):
+                        data = record.resource_data
+                        nas = data.get("nas", {})
+                        scanned += 1
+                        expected, matched = rules.expected(data.get("name"), nas.get("path"))
+                        changes = nas_changes(nas, expected)
+                        if not changes:
+                            continue
+                        drifted += 1
+                        violations = {}
+                        for key, value in changes.items():
+                            if key == "export_policy":
+                                violations[key] = {"expected": value["name"],
+                                                   "actual": nas.get("export_policy", {}).get("name")}
+                            else:
+                                violations[key] = {"expected": value, "actual": nas.get(key)}
+                        handle.write(json.dumps({
+                            "svm": svm_name,
+                            "volume": data.get("name"),
+                            "uuid": data.get("uuid"),
+                            "junction_path": nas.get("path"),
+                            "rules": matched,
+                            "violations": violations
+                        }) + "\n")
+                        handle.flush()
+                except NetAppRestError as err:
+                    logger.error(f"Error scanning SVM '{svm_name}': {err}")
+        finally:
+            if handle is not sys.stdout:
+                handle.close()
+
+        logger.info(f"Scanned {scanned} volume(s) in {time.monotonic() - started:.2f}s, "
+                    f"{drifted} drifted from baseline")
+        return drifted
+
+    def sample_volume_metrics(self, svm_names, page_size=1000, fields=VOLUME_METRIC_FIELDS):
+        """
+        Fetch capacity and raw performance counters for all volumes on the given SVMs
+
+        A single paged collection query is issued; records are returned raw so no
+        Volume resource objects are built per record.
+
+        Args:
+            svm_names: List of SVM names to sample
+            page_size: Records requested per page
+            fields: Volume fields to request
+        """
+        return Volume.fast_get_collection(
+            **{"svm.name": "|".join(svm_names), "is_constituent": False},
+            fields=fields,
+            max_records=page_size
+        )
+
+    def collect_volume_metrics(self, svm_names, interval=60, count=0, window=60,
+                               output_format="prometheus", output=None, page_size=1000):
+        """
+        Periodically sample volume capacity and performance metrics
+
+        Args:
+            svm_names: List of SVM names to sample (defaults to the manager's SVM)
+            interval: Seconds between samples
+            count: Number of samples to take (0 = until interrupted)
+            window: Samples kept per volume in the ring buffer
+            output_format: prometheus or csv
+            output: Output file path (default: stdout)
+            page_size: Records requested per page
+        """
+        svm_names = svm_names or [self.vserver_name]
+        buffer = VolumeMetricsBuffer(capacity=window)
+        csv_handle = None
+        csv_writer = None
+
+        if output_format == "csv":
+            csv_handle = open(output, "a", newline="", encoding="utf-8") if output else sys.stdout
+            csv_writer = csv.writer(csv_handle)
+            if not output or csv_handle.tell() == 0:
+                csv_writer.writerow(("svm", "volume") + SAMPLE_COLUMNS)
+
+        logger.info(f"Collecting metrics for SVM(s) {', '.join(svm_names)} every {interval}s...")
+        ticks = 0
+        try:
+            while True:
+                started = time.monotonic()
+                now = time.time()
+                volumes = 0
+                try:
+                    for record in self.sample_volume_metrics(svm_names, page_size):
+                        data = record.resource_data
+                        sample = buffer.record(data, now)
+                        volumes += 1
+                        if csv_writer:
+                            csv_writer.writerow((data.get('svm', {}).get('name', ''), data.get('name', ''))
+                                                + tuple("" if math.isnan(v) else v for v in sample))
+                except NetAppRestError as err:
+                    logger.error(f"Error sampling volume metrics: {err}")
+
+                if csv_handle:
+                    csv_handle.flush()
+                elif output_format == "prometheus":
+                    write_prometheus_metrics(buffer, output)
+
+                ticks += 1
+                elapsed = time.monotonic() - started
+                logger.info(f"Sampled {volumes} volume(s) in {elapsed:.2f}s")
+                if count and ticks >= count:
+                    break
+                time.sleep(max(0.0, interval - elapsed))
+        except KeyboardInterrupt:
+            logger.info("Collection stopped")
+        finally:
+            if csv_handle and csv_handle is not sys.stdout:
+                csv_handle.close()
+
+        return buffer
+
+    def create_snapshots(self, snapshot_name, name_glob=None, junction_prefix=None, svm_names=None,
+                         comment=None, snapmirror_label=None, workers=8):
+        """
+        Create a snapshot with the same name on every matching volume concurrently
+
+        All POST requests are issued together so the snapshots are taken within a few
+        seconds of each other; the spread between the first request and the last
+        completion is reported. ONTAP consistency groups are needed for write-order
+        consistency across volumes.
+
+        Args:
+            snapshot_name: Name given to every snapshot
+            name_glob: Volume name pattern (e.g., proj_*)
+            junction_prefix: Junction path prefix
+            svm_names: List of SVM names (defaults to the manager's SVM)
+            comment: Snapshot comment
+            snapmirror_label: SnapMirror label, so the snapshots are replicated by label-based policies
+            workers: Concurrent snapshot POST requests
+        """
+        volumes = []
+        try:
+            for svm_name in svm_names or [self.vserver_name]:
+                for record in self.select_volumes(name_glob, junction_prefix, fields="uuid,name,svm.name",
+                                                  svm_name=svm_name):
+                    volumes.append((record.resource_data["uuid"], f"{svm_name}:{record.resource_data['name']}"))
+        except NetAppRestError as err:
+            logger.error(f"Error selecting volumes: {err}")
+            return None
+
+        if not volumes:
+            logger.info("No volumes matched")
+            return {"created": 0, "failed": 0, "seconds": 0.0}
+
+        body = {"name": snapshot_name}
+        if comment:
+            body["comment"] = comment
+        if snapmirror_label:
+            body["snapmirror_label"] = snapmirror_label
+
+        def create(uuid):
+            Snapshot(uuid, **body).post(poll=True)
+
+        logger.info(f"Creating snapshot '{snapshot_name}' on {len(volumes)} volume(s)...")
+        started = time.monotonic()
+        created = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(create, uuid): name for uuid, name in volumes}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    created += 1
+                except NetAppRestError as err:
+                    logger.error(f"Error creating snapshot on '{futures[future]}': {err}")
+                    failed += 1
+
+        elapsed = time.monotonic() - started
+        logger.info(f"✓ {created} snapshot(s) created, {failed} failed, spread {elapsed:.2f}s")
+        return {"created": created, "failed": failed, "seconds": elapsed}
+
+    def list_snapshots(self, svm_names=None, prefix=None, page_size=1000):
+        """
+        Stream the snapshots of every volume with one paged query per SVM
+
+        Args:
+            svm_names: List of SVM names (defaults to the manager's SVM)
+            prefix: Only snapshots whose name starts with this prefix
+            page_size: Records requested per page
+        """
+        for svm_name in svm_names or [self.vserver_name]:
+            query = {"svm.name": svm_name}
+            if prefix:
+                query["name"] = f"{prefix}*"
+            for record in Snapshot.fast_get_collection("*", **query, fields=SNAPSHOT_FIELDS,
+                                                       max_records=page_size):
+                yield record.resource_data
+
+    def show_snapshots(self, svm_names=None, prefix=None, page_size=1000):
+        """Log the snapshots of every volume, grouped by volume"""
+        try:
+            snapshots = sorted(self.list_snapshots(svm_names, prefix, page_size),
+                               key=lambda snap: (snap.get("svm", {}).get("name", ""),
+                                                 snap.get("volume", {}).get("name", ""),
+                                                 snap.get("create_time", "")))
+        except NetAppRestError as err:
+            logger.error(f"Error listing snapshots: {err}")
             return []
 
+        logger.info(f"Found {len(snapshots)} snapshot(s):")
+        current = None
+        for snap in snapshots:
+            volume = f"{snap.get('svm', {}).get('name')}:{snap.get('volume', {}).get('name')}"
+            if volume != current:
+                logger.info(f"  - {volume}")
+                current = volume
+            owners = f" (owners: {', '.join(snap['owners'])})" if snap.get("owners") else ""
+            logger.info(f"    {snap.get('name')}  {snap.get('create_time')}  "
+                        f"{snap.get('size', 0) / 1024**2:.1f} MB{owners}")
+        return snapshots
+
+    def prune_snapshots(self, retention, svm_names=None, name_glob=None, dry_run=False,
+                        workers=8, chunk_size=100, page_size=1000):
+        """
+        Delete snapshots outside the retention rules
+
+        Candidates are found with one paged query per SVM. Each volume's expired
+        snapshots are removed with one collection DELETE per chunk of snapshot UUIDs,
+        volumes being processed concurrently. Reclaimed space is reported from the size
+        of the deleted snapshots.
+
+        Args:
+            retention: SnapshotRetention instance
+            svm_names: List of SVM names (defaults to the manager's SVM)
+            name_glob: Only volumes matching this name pattern
+            dry_run: Only report what would be deleted
+            workers: Concurrent DELETE requests
+            chunk_size: Snapshots per collection DELETE
+            page_size: Records requested per page
+        """
+        started = time.monotonic()
+        by_volume = {}
+        try:
+            for snap in self.list_snapshots(svm_names, retention.prefix, page_size):
+                volume = snap.get("volume", {})
+                if name_glob and not fnmatch.fnmatchcase(volume.get("name", ""), name_glob):
+                    continue
+                key = (volume.get("uuid"), f"{snap.get('svm', {}).get('name')}:{volume.get('name')}")
+                by_volume.setdefault(key, []).append(snap)
+        except NetAppRestError as err:
+            logger.error(f"Error listing snapshots: {err}")
+            return None
+
+        now = time.time()
+        batches = []
+        for (volume_uuid, volume_name), snapshots in by_volume.items():
+            expired = retention.expired(snapshots, now)
+            for snap in expired:
+                logger.info(f"{'[dry-run] ' if dry_run else ''}Delete {volume_name} {snap['name']} "
+                            f"({snap.get('create_time')}, {snap.get('size', 0) / 1024**2:.1f} MB)")
+            for i in range(0, len(expired), chunk_size):
+                batches.append((volume_uuid, volume_name, expired[i:i + chunk_size]))
+
+        planned = sum(len(batch) for _, _, batch in batches)
+        if dry_run:
+            reclaimable = sum(snap.get("size", 0) for _, _, batch in batches for snap in batch)
+            logger.info(f"[dry-run] {planned} snapshot(s) would be deleted, "
+                        f"{reclaimable / 1024**3:.2f} GB reclaimed")
+            return {"deleted": 0, "failed": 0, "reclaimed_bytes": 0, "planned": planned}
+
+        def delete(volume_uuid, batch):
+            Snapshot.delete_collection(volume_uuid, uuid="|".join(snap["uuid"] for snap in batch))
+
+        deleted = failed = reclaimed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(delete, volume_uuid, batch): (volume_name, batch)
+                       for volume_uuid, volume_name, batch in batches}
+            for future in as_completed(futures):
+                volume_name, batch = futures[future]
+                try:
+                    future.result()
+                    deleted += len(batch)
+                    reclaimed += sum(snap.get("size", 0) for snap in batch)
+                except NetAppRestError as err:
+                    logger.error(f"Error deleting {len(batch)} snapshot(s) on '{volume_name}': {err}")
+                    failed += len(batch)
+
+        logger.info(f"✓ Pruned {deleted} snapshot(s) across {len(by_volume)} volume(s) in "
+                    f"{time.monotonic() - started:.2f}s, {failed} failed, "
+                    f"{reclaimed / 1024**3:.2f} GB reclaimed")
+        return {"deleted": deleted, "failed": failed, "reclaimed_bytes": reclaimed, "planned": planned}
+
+    def reconcile_export_policies(self, manifest, dry_run=False, workers=8):
+        """
+        Create export policies and add or delete rules so they match a manifest
+
+        All policies of the SVMs involved are read with their rules in one collection
+        query, indexed per client match by normalised client, protocols, ro/rw and
+        superuser rules, and only the differing rules are added or deleted, concurrently.
+        An existing rule listing several clients covers each of them; if any of its
+        clients is not in the manifest it is deleted and its other clients are re-added
+        as rules of their own. Missing policies are created with all their rules in a
+        single POST. Policies not in the manifest are left alone; rules not in the
+        manifest are deleted unless the policy sets "prune": false.
+
+            {"policies": [{"name": "hpc", "svm": "fsx",
+                           "rules": [{"clients": ["10.1.0.0/16", "10.2.0.0/16"],
+                                      "protocols": ["nfs3", "nfs4"],
+                                      "ro_rule": ["sys"], "rw_rule": ["sys"],
+                                      "superuser": ["none"]}]}]}
+
+        Args:
+            manifest: Parsed manifest
+            dry_run: Only report the changes
+            workers: Concurrent rule requests
+        """
+        started = time.monotonic()
+        policies = manifest["policies"]
+        svm_names = sorted({policy.get("svm", self.vserver_name) for policy in policies})
+        try:
+            existing = {(record.resource_data.get("svm", {}).get("name"), record.resource_data["name"]):
+                        record.resource_data
+                        for record in ExportPolicy.fast_get_collection(
+                            **{"svm.name": "|".join(svm_names)}, fields="id,name,svm.name,rules")}
+        except NetAppRestError as err:
+            logger.error(f"Error reading export policies: {err}")
+            return None
+
+        creates, adds, deletes = [], [], []
+        unchanged = 0
+        for policy in policies:
+            svm_name = policy.get("svm", self.vserver_name)
+            desired = desired_export_rules(policy)
+            current = existing.get((svm_name, policy["name"]))
+            if current is None:
+                creates.append((svm_name, policy["name"], list(desired.values())))
+                continue
+            prune = policy.get("prune", True)
+            covered = set()
+            for rule in current.get("rules", []):
+                clients = [client.get("match", "") for client in rule.get("clients", [])] or [""]
+                keys = [export_rule_key([client], rule) for client in clients]
+                if prune and (any(key not in desired for key in keys) or covered.issuperset(keys)):
+                    # Has clients the manifest does not list, or duplicates earlier rules
+                    deletes.append((current["id"], policy["name"], rule["index"], sorted(clients)))
+                else:
+                    covered.update(keys)
+            for key, body in desired.items():
+                if key in covered:
+                    unchanged += 1
+                else:
+                    adds.append((current["id"], policy["name"], body))
+
+        prefix = "[dry-run] " if dry_run else ""
+        for svm_name, name, rules in creates:
+            logger.info(f"{prefix}Create policy {svm_name}:{name} with {len(rules)} rule(s)")
+        for _, name, body in adds:
+            logger.info(f"{prefix}Add rule to {name}: {body['clients'][0]['match']}")
+        for _, name, index, clients in deletes:
+            logger.info(f"{prefix}Delete rule {index} from {name}: {', '.join(clients)}")
+        summary = {"policies_created": 0, "rules_added": 0, "rules_deleted": 0, "failed": 0,
+                   "unchanged": unchanged}
+        if dry_run:
+            return summary
+
+        tasks = []
+        for svm_name, name, rules in creates:
+            tasks.append(("policies_created", lambda svm_name=svm_name, name=name, rules=rules:
+                          ExportPolicy(svm={"name": svm_name}, name=name, rules=rules).post()))
+        for policy_id, _, body in adds:
+            tasks.append(("rules_added", lambda policy_id=policy_id, body=body: ExportRule(policy_id, **body).post()))
+        for policy_id, _, index, _ in deletes:
+            tasks.append(("rules_deleted", lambda policy_id=policy_id, index=index:
+                          ExportRule(policy_id, index=index).delete()))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(action): summary_key for summary_key, action in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    summary[futures[future]] += 1
+                except NetAppRestError as err:
+                    logger.error(f"Error applying export policy change: {err}")
+                    summary["failed"] += 1
+
+        logger.info(f"✓ Export policies reconciled in {time.monotonic() - started:.2f}s: "
+                    f"{summary['policies_created']} policies created, {summary['rules_added']} rules added, "
+                    f"{summary['rules_deleted']} deleted, {unchanged} unchanged, {summary['failed']} failed")
+        return summary
+
+    def reconcile_quota_rules(self, entries, prune=False, dry_run=False, workers=8):
+        """
+        Create, update and optionally delete quota rules so they match a manifest
+
+        All quota rules of the SVM are read in one paged query and diffed locally; only
+        missing rules are created and only differing limits are patched, concurrently.
+
+        Args:
+            entries: Manifest entries (see desired_quota_rule)
+            prune: Delete rules on the manifest's volumes that the manifest does not list
+            dry_run: Only report the changes
+            workers: Concurrent quota rule requests
+        """
+        started = time.monotonic()
+        desired = {}
+        for entry in entries:
+            body = desired_quota_rule(entry)
+            desired[quota_rule_key(body)] = body
+        volumes = {key[0] for key in desired}
+
+        try:
+            current = {}
+            for record in QuotaRule.fast_get_collection(**{"svm.name": self.vserver_name},
+                                                        fields=QUOTA_RULE_FIELDS):
+                data = record.resource_data
+                current[quota_rule_key(data)] = data
+        except NetAppRestError as err:
+            logger.error(f"Error reading quota rules: {err}")
+            return None
+
+        prefix = "[dry-run] " if dry_run else ""
+        tasks = []
+        unchanged = 0
+        for key, body in desired.items():
+            label = "/".join(part for part in key if part)
+            rule = current.get(key)
+            if rule is None:
+                logger.info(f"{prefix}Create quota rule {label}")
+                tasks.append(("created", lambda body=body: QuotaRule(svm={"name": self.vserver_name}, **body).post()))
+                continue
+            changes = quota_limit_changes(rule, body)
+            if changes:
+                logger.info(f"{prefix}Update quota rule {label}: {changes}")
+                tasks.append(("updated", lambda uuid=rule["uuid"], changes=changes: QuotaRule(uuid=uuid, **changes).patch()))
+            else:
+                unchanged += 1
+        if prune:
+            for key, rule in current.items():
+                if key[0] in volumes and key not in desired:
+                    logger.info(f"{prefix}Delete quota rule {'/'.join(part for part in key if part)}")
+                    tasks.append(("deleted", lambda uuid=rule["uuid"]: QuotaRule(uuid=uuid).delete()))
+
+        summary = {"created": 0, "updated": 0, "deleted": 0, "failed": 0, "unchanged": unchanged}
+        if dry_run:
+            return summary
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(action): kind for kind, action in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    summary[futures[future]] += 1
+                except NetAppRestError as err:
+                    logger.error(f"Error applying quota rule change: {err}")
+                    summary["failed"] += 1
+
+        logger.info(f"✓ Quota rules reconciled in {time.monotonic() - started:.2f}s: {summary['created']} created, "
+                    f"{summary['updated']} updated, {summary['deleted']} deleted, {unchanged} unchanged, "
+                    f"{summary['failed']} failed")
+        return summary
+
+    def export_quota_report(self, svm_names=None, volume_glob=None, output_format="csv", output=None,
+                            page_size=1000):
+        """
+        Stream the quota report of every volume to CSV or JSON lines
+
+        Records are read with one paged, field-limited query and written as they arrive,
+        so tens of thousands of qtrees take a handful of pages and constant memory.
+
+        Args:
+            svm_names: List of SVM names (defaults to the manager's SVM)
+            volume_glob: Only volumes matching this name pattern
+            output_format: csv or jsonl
+            output: Output file path (default: stdout)
+            page_size: Records requested per page
+        """
+        query = {"svm.name": "|".join(svm_names or [self.vserver_name])}
+        if volume_glob:
+            query["volume.name"] = volume_glob
+        handle = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+        writer = csv.writer(handle) if output_format == "csv" else None
+        if writer:
+            writer.writerow(QUOTA_REPORT_COLUMNS)
+        started = time.monotonic()
+        rows = 0
+        try:
+            for record in QuotaReport.fast_get_collection(**query, fields=QUOTA_REPORT_FIELDS,
+                                                          max_records=page_size):
+                data = record.resource_data
+                space = data.get("space", {})
+                files = data.get("files", {})
+                users = data.get("users") or [{}]
+                row = (data.get("svm", {}).get("name"), data.get("volume", {}).get("name"), data.get("type"),
+                       data.get("qtree", {}).get("name"), users[0].get("name"), data.get("group", {}).get("name"),
+                       space.get("used", {}).get("total"), space.get("hard_limit"), space.get("soft_limit"),
+                       space.get("used", {}).get("hard_limit_percent"), files.get("used", {}).get("total"),
+                       files.get("hard_limit"), files.get("soft_limit"))
+                if writer:
+                    writer.writerow("" if value is None else value for value in row)
+                else:
+                    handle.write(json.dumps(dict(zip(QUOTA_REPORT_COLUMNS, row))) + "\n")
+                rows += 1
+        except NetAppRestError as err:
+            logger.error(f"Error reading quota report: {err}")
+            return None
+        finally:
+            if handle is not sys.stdout:
+                handle.close()
+            else:
+                handle.flush()
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Exported {rows} quota report record(s) in {elapsed:.2f}s "
+                    f"({rows / elapsed if elapsed else 0:.0f} records/s)")
+        return rows
+
+    def provision_qtrees(self, rows, default_volume=None, workers=8, dry_run=False):
+        """
+        Create or update qtrees from manifest rows
+
+        Rows carry volume, name and the same NAS attributes as create_volume
+        (security_style, unix_permissions, uid, gid, export_policy) and are validated
+        locally first. Existing qtrees are read with one collection query per volume;
+        missing qtrees are created and differing ones patched with at most `workers`
+        requests in flight.
+
+        Args:
+            rows: Manifest rows (see load_manifest)
+            default_volume: Volume used for rows without one
+            workers: Concurrent qtree requests
+            dry_run: Only report the changes
+        """
+        for row in rows:
+            if default_volume and not row.get("volume"):
+                row["volume"] = default_volume
+        errors = list(validate_manifest_rows(rows, required=("volume", "name")))
+        for number, field, message in errors:
+            logger.error(f"Row {number}: {field} {message}")
+        if errors:
+            return None
+
+        by_volume = {}
+        for row in rows:
+            by_volume.setdefault(row["volume"], []).append(row)
+
+        def existing_qtrees(volume_name):
+            return {record.resource_data["name"]: record.resource_data
+                    for record in Qtree.fast_get_collection(
+                        **{"svm.name": self.vserver_name, "volume.name": volume_name}, fields=QTREE_FIELDS)}
+
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                existing = dict(zip(by_volume, pool.map(existing_qtrees, by_volume)))
+        except NetAppRestError as err:
+            logger.error(f"Error reading qtrees: {err}")
+            return None
+        read_seconds = time.monotonic() - started
+
+        prefix = "[dry-run] " if dry_run else ""
+        tasks = []
+        unchanged = 0
+        for volume_name, volume_rows in by_volume.items():
+            for row in volume_rows:
+                nas_body = build_nas_body(
+                    unix_permissions=row.get("unix_permissions"),
+                    uid=row.get("uid"),
+                    gid=row.get("gid"),
+                    security_style=row.get("security_style"),
+                    export_policy=row.get("export_policy")
+                )
+                label = f"{volume_name}/{row['name']}"
+                current = existing[volume_name].get(row["name"])
+                if current is None:
+                    logger.info(f"{prefix}Create qtree {label}")
+                    tasks.append(("created", label, lambda volume_name=volume_name, name=row["name"],
+                                  body=qtree_body(nas_body): Qtree(
+                                      svm={"name": self.vserver_name}, volume={"name": volume_name},
+                                      name=name, **body).post(poll=True)))
+                    continue
+                change = nas_changes(qtree_nas(current), nas_body)
+                if change:
+                    logger.info(f"{prefix}Update qtree {label}: {change}")
+                    tasks.append(("updated", label, lambda current=current, body=qtree_body(change): Qtree(
+                        volume={"uuid": current["volume"]["uuid"]}, id=current["id"], **body).patch(poll=True)))
+                else:
+                    unchanged += 1
+
+        summary = {"created": 0, "updated": 0, "failed": 0, "unchanged": unchanged}
+        if dry_run:
+            return summary
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(action): (kind, label) for kind, label, action in tasks}
+            for future in as_completed(futures):
+                kind, label = futures[future]
+                try:
+                    future.result()
+                    summary[kind] += 1
+                except NetAppRestError as err:
+                    logger.error(f"Error provisioning qtree '{label}': {err}")
+                    summary["failed"] += 1
+
+        elapsed = time.monotonic() - started
+        logger.info(f"✓ Qtrees provisioned: {summary['created']} created, {summary['updated']} updated, "
+                    f"{unchanged} unchanged, {summary['failed']} failed; read {len(by_volume)} volume(s) in "
+                    f"{read_seconds:.2f}s, applied {len(tasks)} change(s) in {elapsed:.2f}s "
+                    f"({len(tasks) / elapsed if elapsed else 0:.1f} qtrees/s)")
+        return summary
+
+
+class AutosizePolicy:
+    """Thresholds deciding when and by how much a volume is grown"""
+
+    def __init__(self, used_threshold=85.0, horizon_hours=24.0, grow_percent=20.0,
+                 max_size_gb=None, size_step_gb=1, min_samples=3, cooldown=3600, tier_percent=10.0):
+        self.used_threshold = used_threshold
+        self.horizon = horizon_hours * 3600
+        self.grow_percent = grow_percent
+        self.max_size = max_size_gb * 1024**3 if max_size_gb else None
+        self.size_step = max(1, size_step_gb) * 1024**3
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.tier_ratio = 1 + max(0.0, tier_percent) / 100
+
+    def tier(self, size):
+        """
+        Round a size up to the next tier: multiples of size_step spaced tier_percent apart
+
+        Targets of volumes of similar size land on the same tier, so they can be
+        resized with one collection PATCH.
+        """
+        step = self.size_step
+        tier = step
+        while tier < size:
+            tier = max(tier + step, int(math.ceil(tier * self.tier_ratio / step) * step))
+        return tier
+
+    def target_size(self, size):
+        """Grow a size by grow_percent, rounded up to a tier and capped at max_size"""
+        target = self.tier(size * (1 + self.grow_percent / 100))
+        if self.max_size:
+            target = min(target, self.max_size)
+        return target
+
+
+def fill_rate(history):
+    """
+    Least-squares slope of space used over time, in bytes per second
+
+    Args:
+        history: Samples ordered as SAMPLE_COLUMNS, oldest first
+    """
+    points = [(s[0], s[1]) for s in history if not math.isnan(s[1])]
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_u = sum(u for _, u in points) / len(points)
+    denominator = sum((t - mean_t) ** 2 for t, _ in points)
+    if not denominator:
+        return 0.0
+    return sum((t - mean_t) * (u - mean_u) for t, u in points) / denominator
+
+
+class OntapVolumeAutosizer(OntapVolumeManager):
+    """Grows volumes whose space usage or fill-rate trend crosses an AutosizePolicy"""
+
+    AUTOSIZE_FIELDS = "uuid,name,svm.name,space.size,space.used,space.available"
+
+    def __init__(self, hostname, username, password, vserver_name, policy=None):
+        super().__init__(hostname, username, password, vserver_name)
+        self.policy = policy or AutosizePolicy()
+        self.sizes = {}        # volume uuid -> current size in bytes
+        self.resized_at = {}   # volume uuid -> time of last resize
+
+    def evaluate_autosize(self, buffer, now):
+        """
+        Decide which volumes need to grow
+
+        Returns a list of (uuid, svm name, volume name, current size, target size, reason,
+        urgency); a lower urgency is more pressing: volumes over the used threshold come
+        first (fullest first), then trending volumes by time to full.
+        """
+        policy = self.policy
+        decisions = []
+        for uuid, svm_name, volume_name, sample in buffer.latest():
+            size = self.sizes.get(uuid)
+            used, available = sample[1], sample[2]
+            if not size or math.isnan(used) or math.isnan(available):
+                continue
+            if uuid in self.resized_at and now - self.resized_at[uuid] < policy.cooldown:
+                continue
+
+            reason = urgency = None
+            used_percent = used * 100 / (used + available) if used + available else 0
+            if used_percent >= policy.used_threshold:
+                reason = f"{used_percent:.1f}% used"
+                urgency = (0, -used_percent)
+            else:
+                history = buffer.history(uuid)
+                if len(history) >= policy.min_samples:
+                    rate = fill_rate(history)
+                    if rate > 0 and available / rate <= policy.horizon:
+                        reason = f"full in {available / rate / 3600:.1f}h at {rate * 3600 / 1024**3:.2f} GB/h"
+                        urgency = (1, available / rate)
+
+            if reason:
+                target = policy.target_size(size)
+                if target > size:
+                    decisions.append((uuid, svm_name, volume_name, size, target, reason, urgency))
+                else:
+                    logger.warning(f"Volume '{volume_name}' needs to grow ({reason}) but is at the maximum size")
+        return decisions
+
+    def apply_autosize(self, decisions, dry_run=False, max_patches=10, patch_interval=1.0):
+        """
+        Resize volumes, batching those with the same target size into one collection PATCH
+
+        Batches are issued most urgent first (by their most urgent volume), so when
+        max_patches is reached the volumes deferred to the next round are the least urgent.
+
+        Args:
+            decisions: Output of evaluate_autosize
+            dry_run: Log the planned resizes without applying them
+            max_patches: Maximum PATCH requests issued per call
+            patch_interval: Minimum seconds between PATCH requests
+        """
+        batches = {}
+        for decision in decisions:
+            batches.setdefault(decision[4], []).append(decision)
+
+        ordered = sorted(batches.items(), key=lambda item: min(d[6] for d in item[1]))
+
+        resized = 0
+        last_patch = 0.0
+        for patches, (target, batch) in enumerate(ordered):
+            names = ", ".join(f"{d[1]}:{d[2]}" for d in batch)
+            for _, _, volume_name, size, _, reason, _ in batch:
+                logger.info(f"{'[dry-run] ' if dry_run else ''}Volume '{volume_name}': "
+                            f"{size / 1024**3:.2f} GB -> {target / 1024**3:.2f} GB ({reason})")
+            if dry_run:
+                continue
+            if patches >= max_patches:
+                logger.warning(f"PATCH limit reached, deferring resize of {names}")
+                continue
+
+            wait = patch_interval - (time.monotonic() - last_patch)
+            if wait > 0:
+                time.sleep(wait)
+            last_patch = time.monotonic()
+            try:
+                Volume.patch_collection({"size": target}, uuid="|".join(d[0] for d in batch))
+                now = time.time()
+                for decision in batch:
+                    self.sizes[decision[0]] = target
+                    self.resized_at[decision[0]] = now
+                resized += len(batch)
+                logger.info(f"✓ Resized {len(batch)} volume(s) to {target / 1024**3:.2f} GB")
+            except NetAppRestError as err:
+                logger.error(f"Error resizing {names}: {err}")
+        return resized
+
+    def run_autosize(self, svm_names=None, interval=300, count=0, window=60, dry_run=False,
+                     max_patches=10, patch_interval=1.0, page_size=1000):
+        """
+        Sample volume space periodically and grow volumes that cross the policy
+
+        Args:
+            svm_names: List of SVM names to evaluate (defaults to the manager's SVM)
+            interval: Seconds between samples
+            count: Number of evaluation rounds (0 = until interrupted)
+            window: Samples kept per volume for the fill-rate trend
+            dry_run: Log the planned resizes without applying them
+            max_patches: Maximum PATCH requests per round
+            patch_interval: Minimum seconds between PATCH requests
+            page_size: Records requested per page
+        """
+        svm_names = svm_names or [self.vserver_name]
+        buffer = VolumeMetricsBuffer(capacity=window)
+        logger.info(f"Evaluating autosize for SVM(s) {', '.join(svm_names)} every {interval}s...")
+        rounds = 0
+        try:
+            while True:
+                started = time.monotonic()
+                now = time.time()
+                try:
+                    for record in self.sample_volume_metrics(svm_names, page_size, self.AUTOSIZE_FIELDS):
+                        data = record.resource_data
+                        buffer.record(data, now)
+                        self.sizes[data['uuid']] = data.get('space', {}).get('size')
+                except NetAppRestError as err:
+                    logger.error(f"Error sampling volume space: {err}")
+                else:
+                    decisions = self.evaluate_autosize(buffer, now)
+                    logger.info(f"{len(decisions)} of {len(buffer.slots)} volume(s) need to grow")
+                    if decisions:
+                        self.apply_autosize(decisions, dry_run, max_patches, patch_interval)
+
+                rounds += 1
+                if count and rounds >= count:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logger.info("Autosize stopped")
+
 
 def main():
     parser = argparse.ArgumentParser(description='ONTAP Volume Configuration Manager')
@@ -271,28 +1831,157 @@ def main():
     create_parser.add_argument('--junction-path', help='Junction path (default: /volume_name)')
     create_parser.add_argument('--security-style', default='unix', 
                               choices=['unix', 'ntfs', 'mixed'], help='Security style')
-    create_parser.add_argument('--unix-permissions', help='UNIX permissions (e.g., ---rwxrwx---). Use = for symbolic: --unix-permissions=rwxrwxr--')
+    create_parser.add_argument('--unix-permissions', type=_unix_permissions_arg, default='755', help='UNIX permissions (e.g., ---rwxrwx---). Use = for symbolic: --unix-permissions=rwxrwxr--')
     create_parser.add_argument('--uid', type=int, default=0, help='User ID')
     create_parser.add_argument('--gid', type=int, default=0, help='Group ID')
     create_parser.add_argument('--export-policy', default='default', help='Export policy name')
     create_parser.add_argument('--snapshot-policy', default='default', help='Snapshot policy name')
+    create_parser.add_argument('--qtrees', help='Qtree manifest to provision in the new volume (.csv, .json or .jsonl)')
     
     # Update volume command
     update_parser = subparsers.add_parser('update', help='Update volume NAS configuration')
     update_parser.add_argument('--name', required=True, help='Volume name')
-    update_parser.add_argument('--unix-permissions', help='New UNIX permissions (e.g., ---rwxrwx---). Use = for symbolic: --unix-permissions=rwxrwxr--')
+    update_parser.add_argument('--unix-permissions', type=_unix_permissions_arg, help='New UNIX permissions (e.g., ---rwxrwx---). Use = for symbolic: --unix-permissions=rwxrwxr--')
     update_parser.add_argument('--uid', type=int, help='New User ID')
     update_parser.add_argument('--gid', type=int, help='New Group ID')
     update_parser.add_argument('--security-style', choices=['unix', 'ntfs', 'mixed'], 
                               help='New security style')
     update_parser.add_argument('--export-policy', help='New export policy name')
     
+    # Validate command
+    validate_parser = subparsers.add_parser('validate', help='Validate a manifest locally without contacting ONTAP')
+    validate_group = validate_parser.add_mutually_exclusive_group(required=True)
+    validate_group.add_argument('--manifest', help='Manifest file (.csv, .json or .jsonl)')
+    validate_group.add_argument('--benchmark', type=int, metavar='ROWS',
+                                help='Time validation of a synthetic manifest with this many rows')
+    
     # Info command
     info_parser = subparsers.add_parser('info', help='Get volume information')
     info_parser.add_argument('--name', required=True, help='Volume name')
     
+    # Update batch command
+    batch_parser = subparsers.add_parser('update-batch', help='Update NAS configuration on all matching volumes')
+    batch_parser.add_argument('--name-glob', help='Select volumes by name pattern (e.g., proj_*)')
+    batch_parser.add_argument('--junction-prefix', help='Select volumes by junction path prefix')
+    batch_parser.add_argument('--filter-export-policy', help='Select volumes currently using this export policy')
+    batch_parser.add_argument('--unix-permissions', type=_unix_permissions_arg, help='New UNIX permissions. Use = for symbolic: --unix-permissions=rwxrwxr--')
+    batch_parser.add_argument('--uid', type=int, help='New User ID')
+    batch_parser.add_argument('--gid', type=int, help='New Group ID')
+    batch_parser.add_argument('--security-style', choices=['unix', 'ntfs', 'mixed'],
+                              help='New security style')
+    batch_parser.add_argument('--export-policy', help='New export policy name')
+    batch_parser.add_argument('--mode', default='auto', choices=['auto', 'collection', 'pool'],
+                              help='Collection PATCH, per-volume thread pool, or collection with pool fallback')
+    batch_parser.add_argument('--workers', type=int, default=8, help='Concurrent per-volume PATCH requests')
+    batch_parser.add_argument('--chunk-size', type=int, default=100, help='Volumes per collection PATCH')
+    batch_parser.add_argument('--dry-run', action='store_true', help='Show what would change')
+    
     # List command
-    subparsers.add_parser('list', help='List all volumes')
+    list_parser = subparsers.add_parser('list', help='List all volumes')
+    list_parser.add_argument('--svms', help='Comma-separated SVM names to list (default: --svm)')
+    list_parser.add_argument('--where', action='append', default=[], metavar='COLUMN=VALUE',
+                             help='Only volumes whose column matches (repeatable, globs allowed for name and '
+                                  'junction_path), e.g. security_style=ntfs')
+    list_parser.add_argument('--sort', choices=VolumeTable.POOLED + VolumeTable.NUMERIC + VolumeTable.TEXT,
+                             help='Column to sort by')
+    list_parser.add_argument('--reverse', action='store_true', help='Sort in descending order')
+    list_parser.add_argument('--group-by', choices=VolumeTable.POOLED, help='Column to group by')
+    list_parser.add_argument('--page-size', type=int, default=1000, help='Volumes requested per page')
+    list_parser.add_argument('--benchmark', type=int, metavar='VOLUMES',
+                             help='Compare memory and speed of the volume models on a synthetic inventory '
+                                  'instead of listing (no connection needed)')
+    
+    # Drift command
+    drift_parser = subparsers.add_parser('drift', help='Report volumes whose NAS configuration differs from a baseline')
+    drift_parser.add_argument('--rules', required=True, help='JSON rules file describing the baseline')
+    drift_parser.add_argument('--svms', help='Comma-separated SVM names (default: --svm)')
+    drift_parser.add_argument('--output', help='JSON lines output file (default: stdout)')
+    drift_parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
+    
+    # Collect command
+    collect_parser = subparsers.add_parser('collect', aliases=['watch'],
+                                           help='Sample capacity and performance metrics for all volumes')
+    collect_parser.add_argument('--svms', help='Comma-separated SVM names (default: --svm)')
+    collect_parser.add_argument('--interval', type=int, default=60, help='Seconds between samples')
+    collect_parser.add_argument('--count', type=int, default=0, help='Number of samples (default: until interrupted)')
+    collect_parser.add_argument('--window', type=window_arg, default=60, help='Samples kept per volume')
+    collect_parser.add_argument('--format', default='prometheus', choices=['prometheus', 'csv'],
+                                help='Output format')
+    collect_parser.add_argument('--output', help='Output file (default: stdout)')
+    collect_parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
+    
+    # Snapshot command
+    snapshot_parser = subparsers.add_parser('snapshot', help='Create, list and prune snapshots across many volumes')
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest='snapshot_command', required=True)
+    snap_create_parser = snapshot_subparsers.add_parser('create', help='Snapshot every matching volume concurrently')
+    snap_create_parser.add_argument('--snapshot', required=True, help='Snapshot name')
+    snap_create_parser.add_argument('--name-glob', help='Select volumes by name pattern (e.g., proj_*)')
+    snap_create_parser.add_argument('--junction-prefix', help='Select volumes by junction path prefix')
+    snap_create_parser.add_argument('--comment', help='Snapshot comment')
+    snap_create_parser.add_argument('--snapmirror-label', help='SnapMirror label')
+    snap_list_parser = snapshot_subparsers.add_parser('list', help='List snapshots of all volumes')
+    snap_list_parser.add_argument('--prefix', help='Only snapshots whose name starts with this prefix')
+    snap_prune_parser = snapshot_subparsers.add_parser('prune', help='Delete snapshots outside the retention rules')
+    snap_prune_parser.add_argument('--prefix', required=True, help='Only prune snapshots whose name starts with this prefix')
+    snap_prune_parser.add_argument('--keep', type=int, help='Snapshots to keep per volume (newest first)')
+    snap_prune_parser.add_argument('--max-age-days', type=float, help='Delete snapshots older than this')
+    snap_prune_parser.add_argument('--name-glob', help='Only volumes matching this name pattern')
+    snap_prune_parser.add_argument('--chunk-size', type=int, default=100, help='Snapshots per collection DELETE')
+    snap_prune_parser.add_argument('--dry-run', action='store_true', help='Show what would be deleted')
+    for snap_parser in (snap_create_parser, snap_list_parser, snap_prune_parser):
+        snap_parser.add_argument('--svms', help='Comma-separated SVM names (default: --svm)')
+    for snap_parser in (snap_create_parser, snap_prune_parser):
+        snap_parser.add_argument('--workers', type=int, default=8, help='Concurrent requests')
+    
+    # Export policy command
+    export_parser = subparsers.add_parser('export-policy', help='Reconcile export policies and rules from a manifest')
+    export_parser.add_argument('--manifest', required=True, help='JSON manifest of policies and rules')
+    export_parser.add_argument('--workers', type=int, default=8, help='Concurrent rule requests')
+    export_parser.add_argument('--dry-run', action='store_true', help='Show the rule changes without applying them')
+    
+    # Quota command
+    quota_parser = subparsers.add_parser('quota', help='Reconcile quota rules and export quota reports')
+    quota_subparsers = quota_parser.add_subparsers(dest='quota_command', required=True)
+    quota_apply_parser = quota_subparsers.add_parser('apply', help='Reconcile quota rules from a manifest')
+    quota_apply_parser.add_argument('--manifest', required=True, help='Quota rules (.csv, .json or .jsonl)')
+    quota_apply_parser.add_argument('--prune', action='store_true',
+                                    help='Delete rules on the manifest volumes that the manifest does not list')
+    quota_apply_parser.add_argument('--workers', type=int, default=8, help='Concurrent quota rule requests')
+    quota_apply_parser.add_argument('--dry-run', action='store_true', help='Show the changes without applying them')
+    quota_report_parser = quota_subparsers.add_parser('report', help='Export the quota report of all volumes')
+    quota_report_parser.add_argument('--svms', help='Comma-separated SVM names (default: --svm)')
+    quota_report_parser.add_argument('--volume-glob', help='Only volumes matching this name pattern')
+    quota_report_parser.add_argument('--format', default='csv', choices=['csv', 'jsonl'], help='Output format')
+    quota_report_parser.add_argument('--output', help='Output file (default: stdout)')
+    quota_report_parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
+    
+    # Qtrees command
+    qtrees_parser = subparsers.add_parser('qtrees', help='Create or update qtrees from a manifest')
+    qtrees_parser.add_argument('--manifest', required=True, help='Qtree manifest (.csv, .json or .jsonl)')
+    qtrees_parser.add_argument('--workers', type=int, default=8, help='Concurrent qtree requests')
+    qtrees_parser.add_argument('--dry-run', action='store_true', help='Show the changes without applying them')
+    
+    # Autosize command
+    autosize_parser = subparsers.add_parser('autosize', help='Grow volumes based on usage and fill-rate policy')
+    autosize_parser.add_argument('--svms', help='Comma-separated SVM names (default: --svm)')
+    autosize_parser.add_argument('--interval', type=int, default=300, help='Seconds between samples')
+    autosize_parser.add_argument('--count', type=int, default=0, help='Number of rounds (default: until interrupted)')
+    autosize_parser.add_argument('--window', type=window_arg, default=60, help='Samples kept per volume for the trend')
+    autosize_parser.add_argument('--used-threshold', type=float, default=85.0, help='Grow when used percent reaches this')
+    autosize_parser.add_argument('--horizon-hours', type=float, default=24.0,
+                                 help='Grow when projected to be full within this many hours')
+    autosize_parser.add_argument('--grow-percent', type=float, default=20.0, help='Percent to grow by')
+    autosize_parser.add_argument('--max-size-gb', type=int, help='Never grow beyond this size')
+    autosize_parser.add_argument('--size-step-gb', type=int, default=1, help='Round new sizes up to this step')
+    autosize_parser.add_argument('--tier-percent', type=float, default=10.0,
+                                 help='Spacing of the size tiers new sizes are rounded up to, so that '
+                                      'similar volumes share one PATCH (0 = every size step)')
+    autosize_parser.add_argument('--min-samples', type=int, default=3, help='Samples needed before trending')
+    autosize_parser.add_argument('--cooldown', type=int, default=3600, help='Seconds before a volume is resized again')
+    autosize_parser.add_argument('--max-patches', type=int, default=10, help='Maximum PATCH requests per round')
+    autosize_parser.add_argument('--patch-interval', type=float, default=1.0, help='Minimum seconds between PATCH requests')
+    autosize_parser.add_argument('--dry-run', action='store_true', help='Show planned resizes without applying them')
+    autosize_parser.add_argument('--page-size', type=int, default=1000, help='Records per page')
     
     args = parser.parse_args()
     
@@ -300,18 +1989,55 @@ def main():
         parser.print_help()
         sys.exit(1)
     
+    if args.command == 'list' and args.benchmark:
+        benchmark_volume_inventory(args.benchmark)
+        return
+    
+    # Validation runs locally, no connection needed
+    if args.command == 'validate':
+        if args.benchmark:
+            benchmark_manifest_validation(args.benchmark)
+            return
+        errors = list(validate_manifest_rows(load_manifest(args.manifest)))
+        for row, field, message in errors:
+            logger.error(f"Row {row}: {field} {message}")
+        logger.info(f"{len(errors)} error(s) found")
+        sys.exit(1 if errors else 0)
+    
+    if args.command == 'snapshot' and args.snapshot_command == 'prune' and args.keep is None \
+            and args.max_age_days is None:
+        parser.error("snapshot prune requires --keep and/or --max-age-days")
+    
     # Create volume manager
-    manager = OntapVolumeManager(
-        hostname=args.host,
-        username=args.user,
-        password=args.password,
-        vserver_name=args.svm
-    )
+    if args.command == 'autosize':
+        manager = OntapVolumeAutosizer(
+            hostname=args.host,
+            username=args.user,
+            password=args.password,
+            vserver_name=args.svm,
+            policy=AutosizePolicy(
+                used_threshold=args.used_threshold,
+                horizon_hours=args.horizon_hours,
+                grow_percent=args.grow_percent,
+                max_size_gb=args.max_size_gb,
+                size_step_gb=args.size_step_gb,
+                min_samples=args.min_samples,
+                cooldown=args.cooldown,
+                tier_percent=args.tier_percent
+            )
+        )
+    else:
+        manager = OntapVolumeManager(
+            hostname=args.host,
+            username=args.user,
+            password=args.password,
+            vserver_name=args.svm
+        )
     
     # Execute command
     if args.command == 'create':
         unix_perms = args.unix_permissions
-        manager.create_volume(
+        volume = manager.create_volume(
             volume_name=args.name,
             aggregate_name=args.aggregate,
             size_mb=args.size,
@@ -323,6 +2049,8 @@ def main():
             export_policy=args.export_policy,
             snapshot_policy=args.snapshot_policy
         )
+        if args.qtrees and volume:
+            manager.provision_qtrees(load_manifest(args.qtrees), default_volume=args.name)
     
     elif args.command == 'update':
         unix_perms = args.unix_permissions
@@ -335,11 +2063,142 @@ def main():
             export_policy=args.export_policy
         )
     
+    elif args.command == 'update-batch':
+        manager.update_volumes_nas_batch(
+            nas_body=build_nas_body(
+                unix_permissions=args.unix_permissions,
+                uid=args.uid,
+                gid=args.gid,
+                security_style=args.security_style,
+                export_policy=args.export_policy
+            ),
+            name_glob=args.name_glob,
+            junction_prefix=args.junction_prefix,
+            export_policy_filter=args.filter_export_policy,
+            mode=args.mode,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run
+        )
+    
     elif args.command == 'info':
         manager.get_volume_info(args.name)
     
     elif args.command == 'list':
-        manager.list_volumes()
+        where = {}
+        for condition in args.where:
+            column, _, value = condition.partition('=')
+            if column not in VolumeTable.POOLED + VolumeTable.NUMERIC + VolumeTable.TEXT:
+                parser.error(f"unknown column '{column}' in --where")
+            if column in ("size", "used"):
+                try:
+                    value = parse_size(value)
+                except ValueError:
+                    parser.error(f"--where {column} needs a size such as 500GB, got '{value}'")
+            elif column in VolumeTable.NUMERIC:
+                try:
+                    value = int(value)
+                except ValueError:
+                    parser.error(f"--where {column} needs an integer, got '{value}'")
+            where[column] = value
+        manager.list_volumes(
+            svm_names=args.svms.split(',') if args.svms else None,
+            where=where,
+            sort=args.sort,
+            reverse=args.reverse,
+            group_by=args.group_by,
+            page_size=args.page_size
+        )
+    
+    elif args.command == 'drift':
+        drifted = manager.detect_drift(
+            rules=DriftRules.load(args.rules),
+            svm_names=args.svms.split(',') if args.svms else None,
+            output=args.output,
+            page_size=args.page_size
+        )
+        sys.exit(1 if drifted else 0)
+    
+    elif args.command in ('collect', 'watch'):
+        manager.collect_volume_metrics(
+            svm_names=args.svms.split(',') if args.svms else None,
+            interval=args.interval,
+            count=args.count,
+            window=args.window,
+            output_format=args.format,
+            output=args.output,
+            page_size=args.page_size
+        )
+    
+    elif args.command == 'snapshot':
+        svm_names = args.svms.split(',') if args.svms else None
+        if args.snapshot_command == 'create':
+            result = manager.create_snapshots(
+                snapshot_name=args.snapshot,
+                name_glob=args.name_glob,
+                junction_prefix=args.junction_prefix,
+                svm_names=svm_names,
+                comment=args.comment,
+                snapmirror_label=args.snapmirror_label,
+                workers=args.workers
+            )
+        elif args.snapshot_command == 'list':
+            result = manager.show_snapshots(svm_names=svm_names, prefix=args.prefix)
+        else:
+            result = manager.prune_snapshots(
+                retention=SnapshotRetention(args.prefix, keep=args.keep, max_age_days=args.max_age_days),
+                svm_names=svm_names,
+                name_glob=args.name_glob,
+                dry_run=args.dry_run,
+                workers=args.workers,
+                chunk_size=args.chunk_size
+            )
+        sys.exit(1 if result is None or (isinstance(result, dict) and result.get("failed")) else 0)
+    
+    elif args.command == 'export-policy':
+        with open(args.manifest, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        try:
+            summary = manager.reconcile_export_policies(manifest, dry_run=args.dry_run, workers=args.workers)
+        except ValueError as err:
+            logger.error(f"Invalid manifest: {err}")
+            sys.exit(1)
+        sys.exit(1 if summary is None or summary["failed"] else 0)
+    
+    elif args.command == 'qtrees':
+        summary = manager.provision_qtrees(load_manifest(args.manifest), workers=args.workers,
+                                           dry_run=args.dry_run)
+        sys.exit(1 if summary is None or summary["failed"] else 0)
+    
+    elif args.command == 'quota':
+        if args.quota_command == 'apply':
+            try:
+                summary = manager.reconcile_quota_rules(load_manifest(args.manifest), prune=args.prune,
+                                                        dry_run=args.dry_run, workers=args.workers)
+            except (ValueError, KeyError) as err:
+                logger.error(f"Invalid manifest: {err}")
+                sys.exit(1)
+            sys.exit(1 if summary is None or summary["failed"] else 0)
+        rows = manager.export_quota_report(
+            svm_names=args.svms.split(',') if args.svms else None,
+            volume_glob=args.volume_glob,
+            output_format=args.format,
+            output=args.output,
+            page_size=args.page_size
+        )
+        sys.exit(1 if rows is None else 0)
+    
+    elif args.command == 'autosize':
+        manager.run_autosize(
+            svm_names=args.svms.split(',') if args.svms else None,
+            interval=args.interval,
+            count=args.count,
+            window=args.window,
+            dry_run=args.dry_run,
+            max_patches=args.max_patches,
+            patch_interval=args.patch_interval,
+            page_size=args.page_size
+        )
 
 
 if __name__ == "__main__":